@@ -8,6 +8,10 @@ app.jinja_env.globals.update(slugify=slugify)            #make slugify available
 import controllers.config
 
 import models.dbmodel
+import models.setup                                      #flask init-db / create-admin / seed, nothing runs on import
+
+from controllers.metrics import init_request_metrics
+init_request_metrics(app)                                #per endpoint timing/sql counts, served at /admin/metrics
 
 import controllers.routes
 
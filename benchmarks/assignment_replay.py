@@ -0,0 +1,95 @@
+"""
+Replays the booking stream of booking_history against every spot assignment strategy and reports how many
+bookings each one accepts. Run it against a database filled by benchmarks.generate_data:
+
+    python -m benchmarks.assignment_replay --lots 20 --capacity 0.25 --lead-days 3
+
+Each booking is requested some random time (up to --lead-days) before its parking_time, in that order,
+against an empty copy of its lot shrunk to --capacity of its spots so the lots are actually contended.
+Nothing is written to the database.
+"""
+import argparse
+import os
+import random
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+os.environ.setdefault('BOOKING_SCHEDULER', 'worker')   # keep background work out of the measurements
+
+from sqlalchemy import func
+
+from app import app
+from models.dbmodel import db, ParkingSpot, UserHistory
+from controllers.availability import LotAvailability
+from controllers.spot_assignment import STRATEGIES
+
+
+def load_streams(lot_count, capacity, lead_days, seed):
+    """
+    {lot_id: (spot_ids, [(requested_at, parking_time, leaving_time), ...] in request order)} of the lots with
+    most history"""
+    rng = random.Random(seed)
+    with app.app_context():
+        busiest = db.session.execute(
+            db.select(ParkingSpot.lot_id)
+            .join(UserHistory, UserHistory.spot_id == ParkingSpot.spot_id)
+            .group_by(ParkingSpot.lot_id).order_by(func.count(UserHistory.id).desc()).limit(lot_count)
+        ).scalars().all()
+        spots = defaultdict(list)
+        for lot_id, spot_id in db.session.execute(
+                db.select(ParkingSpot.lot_id, ParkingSpot.spot_id).where(ParkingSpot.lot_id.in_(busiest))):
+            spots[lot_id].append(spot_id)
+        requests = defaultdict(list)
+        for lot_id, parking_time, leaving_time in db.session.execute(
+                db.select(ParkingSpot.lot_id, UserHistory.booking_time, UserHistory.leaving_time)
+                .join(ParkingSpot, ParkingSpot.spot_id == UserHistory.spot_id)
+                .where(ParkingSpot.lot_id.in_(busiest))
+                .order_by(UserHistory.id)):
+            requested_at = parking_time - timedelta(seconds=rng.uniform(0, lead_days * 86400))
+            requests[lot_id].append((requested_at, parking_time, leaving_time))
+
+    streams = {}
+    for lot_id in busiest:
+        spot_ids = sorted(spots[lot_id])[:max(1, round(len(spots[lot_id]) * capacity))]
+        streams[lot_id] = (spot_ids, sorted(requests[lot_id]))
+    return streams
+
+
+def replay(strategy, spot_ids, stream):
+    lot = LotAvailability(None, spot_ids, [])
+    accepted = 0
+    for requested_at, parking_time, leaving_time in stream:
+        lot.prune(requested_at)
+        free_spot_ids, _ = lot.lookup(parking_time, leaving_time, strategy)
+        if free_spot_ids:
+            lot.add_booking(free_spot_ids[0], None, parking_time, leaving_time)
+            accepted += 1
+    return accepted
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Spot assignment strategy replay.")
+    parser.add_argument('--lots', type=int, default=20, help="busiest lots to replay")
+    parser.add_argument('--capacity', type=float, default=0.25, help="fraction of each lot's spots to use")
+    parser.add_argument('--lead-days', type=float, default=3, help="bookings are made up to this long in advance")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    streams = load_streams(args.lots, args.capacity, args.lead_days, args.seed)
+    total = sum(len(stream) for _, stream in streams.values())
+    if not total:
+        raise SystemExit("No booking history, generate a dataset first.")
+    print(f"{len(streams)} lots, {sum(len(s) for s, _ in streams.values())} spots, {total} booking requests")
+
+    baseline = None
+    for name, strategy in STRATEGIES.items():
+        started = time.perf_counter()
+        accepted = sum(replay(strategy, spot_ids, stream) for spot_ids, stream in streams.values())
+        baseline = baseline or accepted
+        print(f"  {name:12s} accepted {accepted:8d} ({accepted / total:6.1%})   "
+              f"{accepted - baseline:+7d} vs first_free   {time.perf_counter() - started:6.2f} s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+"""
+Fires simultaneous booking confirms from many threads through the booking allocator, then checks the
+database for overlapping bookings on a spot and reports throughput. Run it against a database filled by
+benchmarks.generate_data:
+
+    python -m benchmarks.booking_stress --threads 12 --confirms 2000 --lots 8
+    python -m benchmarks.booking_stress --threads 12 --confirms 2000 --lots 8 --single-lock
+
+--single-lock serializes all lots on one lock (the behaviour of a global lock) for comparison.
+The stress bookings are removed again afterwards unless --keep is given.
+"""
+import argparse
+import os
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault('BOOKING_SCHEDULER', 'worker')   # keep background work out of the measurements
+
+from sqlalchemy import func, text
+from sqlalchemy.exc import OperationalError, TimeoutError as PoolTimeoutError
+
+from app import app
+from models.dbmodel import db, User, ParkingSpot, UserBookings, LotCounters
+from controllers.availability import availability_index
+from controllers.booking_allocator import booking_allocator
+from controllers.lot_counters import bump_lot_counters
+from benchmarks.run_routes import percentile
+
+
+MARKER = "STRESS"   # vehicle_no of the generated bookings
+
+
+def pick_targets(lot_count):
+    with app.app_context():
+        lot_ids = [row[0] for row in (
+            db.session.query(LotCounters.lot_id).filter(LotCounters.total_spots > 0)
+            .order_by(LotCounters.total_spots.desc()).limit(lot_count).all()
+        )]
+        user_id = db.session.query(func.max(User.user_id)).scalar()
+    if not lot_ids:
+        raise SystemExit("No parking lots with spots, generate a dataset first.")
+    return lot_ids, user_id
+
+
+def worker(seed, lot_ids, user_id, count, window_start, window_hours, results):
+    rng = random.Random(seed)
+    booked = full = errors = 0
+    latencies = []
+    with app.app_context():
+        for _ in range(count):
+            lot_id = rng.choice(lot_ids)
+            parking_time = window_start + timedelta(minutes=15 * rng.randrange(window_hours * 4))
+            leaving_time = parking_time + timedelta(minutes=15 * rng.randint(2, 16))
+            started = time.perf_counter()
+            try:
+                free_spot_ids, _ = availability_index.lookup(lot_id, parking_time, leaving_time)
+                booking = booking_allocator.allocate(
+                    lot_id, free_spot_ids, user_id=user_id, parking_time=parking_time,
+                    leaving_time=leaving_time, parking_cost=0.0, vehicle_no=MARKER
+                ) if free_spot_ids else None
+            except (OperationalError, PoolTimeoutError):    # database is locked / no pooled connection left
+                db.session.rollback()
+                errors += 1
+                continue
+            latencies.append((time.perf_counter() - started) * 1000)
+            if booking:
+                booked += 1
+            else:
+                full += 1
+    results.append({'booked': booked, 'full': full, 'errors': errors, 'latencies': latencies})
+
+
+def count_overlaps():
+    # every pair of bookings on the same spot with intersecting periods
+    return db.session.execute(text(
+        "SELECT COUNT(*) FROM user_bookings a JOIN user_bookings b "
+        "ON a.spot_id = b.spot_id AND a.id < b.id "
+        "AND a.parking_time < b.leaving_time AND b.parking_time < a.leaving_time"
+    )).scalar()
+
+
+def cleanup():
+    per_lot = (
+        db.session.query(ParkingSpot.lot_id, func.count(UserBookings.id))
+        .join(ParkingSpot, ParkingSpot.spot_id == UserBookings.spot_id)
+        .filter(UserBookings.vehicle_no == MARKER)
+        .group_by(ParkingSpot.lot_id).all()
+    )
+    for lot_id, count in per_lot:
+        bump_lot_counters(lot_id, booked=-count)
+    UserBookings.query.filter(UserBookings.vehicle_no == MARKER).delete(synchronize_session=False)
+    db.session.commit()
+    availability_index.invalidate()
+
+
+def run(threads, confirms, lot_count, window_hours, seed, single_lock):
+    lot_ids, user_id = pick_targets(lot_count)
+    if single_lock:
+        shared = threading.Lock()
+        booking_allocator.lock_for = lambda lot_id: shared
+
+    # far enough ahead that the stress bookings don't collide with the dataset's own bookings much
+    window_start = (datetime.now() + timedelta(days=8)).replace(minute=0, second=0, microsecond=0)
+    results = []
+    per_thread = [confirms // threads + (1 if i < confirms % threads else 0) for i in range(threads)]
+    pool = [
+        threading.Thread(target=worker, args=(seed + i, lot_ids, user_id, n, window_start, window_hours, results))
+        for i, n in enumerate(per_thread)
+    ]
+    started = time.perf_counter()
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies = [ms for r in results for ms in r['latencies']]
+    with app.app_context():
+        overlaps = count_overlaps()
+    report = {
+        'threads': threads, 'lots': len(lot_ids), 'single_lock': single_lock,
+        'confirms': confirms,
+        'booked': sum(r['booked'] for r in results),
+        'no_free_spot': sum(r['full'] for r in results),
+        'errors': sum(r['errors'] for r in results),
+        'overlaps': overlaps,
+        'seconds': round(elapsed, 2),
+        'confirms_per_second': round(confirms / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 50) or 0, 2),
+        'p95_ms': round(percentile(latencies, 95) or 0, 2),
+    }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent booking confirm stress test.")
+    parser.add_argument('--threads', type=int, default=12, help="keep below the connection pool size")
+    parser.add_argument('--confirms', type=int, default=2000)
+    parser.add_argument('--lots', type=int, default=8, help="number of (biggest) lots the confirms are spread over")
+    parser.add_argument('--window-hours', type=int, default=24, help="all bookings start inside this many hours")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--single-lock', action='store_true', help="one lock for all lots, for comparison")
+    parser.add_argument('--keep', action='store_true', help="keep the stress bookings in the database")
+    args = parser.parse_args()
+
+    report = run(args.threads, args.confirms, args.lots, args.window_hours, args.seed, args.single_lock)
+    for key, value in report.items():
+        print(f"{key:20s} {value}")
+    if not args.keep:
+        with app.app_context():
+            cleanup()
+    if report['overlaps']:
+        raise SystemExit(f"FAILED: {report['overlaps']} overlapping bookings")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,205 @@
+"""
+Reproducible synthetic dataset for benchmarking, written to the database configured in .env
+(SQLALCHEMY_DATABASE_URI). Same --seed and sizes always give the same rows.
+
+    python -m benchmarks.generate_data --reset --preset large --seed 42
+    python -m benchmarks.generate_data --reset --lots 500 --history 100000
+"""
+import argparse
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault('BOOKING_SCHEDULER', 'worker')   # no background thread while generating
+
+from sqlalchemy import insert, func
+
+from app import app
+from models.dbmodel import db, User, ParkingLot, ParkingSpot, UserBookings, UserHistory, LotCounters
+from models.setup import init_db, create_admin
+from controllers.catalog import lot_catalog
+from controllers.nearby import locate_pincode
+from controllers.rollups import rebuild_rollups
+from controllers.passwords import password_hasher
+
+
+PRESETS = {
+    'small':  dict(lots=200,  min_spots=10, max_spots=60,  users=2000,   history=50000),
+    'medium': dict(lots=1000, min_spots=20, max_spots=200, users=10000,  history=500000),
+    'large':  dict(lots=3000, min_spots=50, max_spots=150, users=50000,  history=3000000),
+}
+
+CITIES = {
+    "Mumbai": "400", "Delhi": "110", "Noida": "201", "Gurugram": "122", "Bangalore": "560", "Pune": "411",
+    "Hyderabad": "500", "Chennai": "600", "Ahmedabad": "380", "Jaipur": "302", "Kolkata": "700",
+    "Indore": "452", "Bhopal": "462", "Lucknow": "226", "Chandigarh": "160", "Kochi": "682",
+}
+PLACES = ["Market", "Plaza", "Station", "Mall", "Hub", "Tower", "Garden", "Square", "Gate", "Complex"]
+ROADS = ["MG Rd", "Station Rd", "Ring Rd", "Main Rd", "Lake Rd", "Park St", "Mall Rd", "Link Rd"]
+STATE_CODES = ["MH", "DL", "UP", "HR", "KA", "TN", "GJ", "RJ", "WB", "MP", "KL", "TS"]
+
+CHUNK = 20000
+BENCH_PASSWORD = "bench1234"
+
+
+def insert_chunked(model, rows):
+    for i in range(0, len(rows), CHUNK):
+        db.session.execute(insert(model), rows[i:i + CHUNK])
+
+
+def next_id(column):
+    return (db.session.query(func.max(column)).scalar() or 0) + 1
+
+
+def booking_hours(rng):
+    # mostly short stays, a long tail of full day parkings
+    return min(max(rng.lognormvariate(1.0, 0.7), 0.5), 24.0)
+
+
+def rush_hour_start(rng, day):
+    hour = rng.choice([8, 9, 9, 10, 13, 17, 18, 18, 19, 21])
+    return day.replace(hour=hour, minute=rng.choice([0, 15, 30, 45]), second=0, microsecond=0)
+
+
+def vehicle_no(rng):
+    return f"{rng.choice(STATE_CODES)}{rng.randint(1, 99):02d}{rng.choice('ABCDEFGHJK')}{rng.randint(1000, 9999)}"
+
+
+def generate(seed, lots, min_spots, max_spots, users, history, booked_fraction=0.35, history_days=365):
+    rng = random.Random(seed)
+    now = datetime.now().replace(second=0, microsecond=0)
+    started = time.perf_counter()
+
+    # ---- users (one shared hash, hashing each would take longer than everything else) ----
+    first_user = next_id(User.user_id)
+    passhash = password_hasher.hash(BENCH_PASSWORD)
+    insert_chunked(User, [
+        dict(user_id=first_user + i, email_id=f"user{first_user + i}@bench", pass_wd=passhash,
+             user_name=f"Bench User {first_user + i}", is_admin=False)
+        for i in range(users)
+    ])
+    user_ids = range(first_user, first_user + users)
+
+    # ---- lots and spots ----
+    first_lot, first_spot = next_id(ParkingLot.lot_id), next_id(ParkingSpot.spot_id)
+    # lots scattered around their city centre (pincode_location), own rng so the other rows stay as they were
+    geo_rng = random.Random(seed + 1)
+    centres = {city: locate_pincode(prefix) for city, prefix in CITIES.items()}
+    lot_rows, spot_rows, spots_of_lot, price_of_lot = [], [], {}, {}
+    spot_id = first_spot
+    for i in range(lots):
+        lot_id = first_lot + i
+        city = rng.choice(list(CITIES))
+        price = float(rng.randrange(20, 100, 5))
+        lot_rows.append(dict(
+            lot_id=lot_id, area_type=rng.choice(['Open', 'Covered', 'Both']), city=city,
+            primelocation_name=f"{rng.choice(ROADS).split()[0]} {rng.choice(PLACES)} {lot_id}",
+            price_per_hr=price, address=f"{lot_id} {rng.choice(ROADS)}, {city}",
+            pincode=CITIES[city] + f"{rng.randint(1, 99):03d}"
+        ))
+        latitude, longitude = centres[city] or (None, None)
+        lot_rows[-1].update(latitude=latitude and latitude + geo_rng.gauss(0, 0.05),
+                            longitude=longitude and longitude + geo_rng.gauss(0, 0.05))
+        price_of_lot[lot_id] = price
+        spots_of_lot[lot_id] = range(spot_id, spot_id + rng.randint(min_spots, max_spots))
+        for sid in spots_of_lot[lot_id]:
+            spot_rows.append(dict(spot_id=sid, lot_id=lot_id, status='A'))
+        spot_id = spots_of_lot[lot_id].stop
+    insert_chunked(ParkingLot, lot_rows)
+    insert_chunked(ParkingSpot, spot_rows)
+    lot_ids = list(spots_of_lot)
+    # popular lots get most of the traffic
+    lot_weights = [rng.paretovariate(1.2) for _ in lot_ids]
+
+    # ---- current/future bookings: non overlapping per spot, inside the 10 day booking window ----
+    booking_rows, occupied_spot_ids, counter_rows = [], [], []
+    for lot_id in lot_ids:
+        booked_before, occupied_before = len(booking_rows), len(occupied_spot_ids)
+        for sid in spots_of_lot[lot_id]:
+            if rng.random() > booked_fraction:
+                continue
+            # first booking may already have started (spot physically occupied)
+            cursor = now - timedelta(hours=rng.uniform(0, 6)) if rng.random() < 0.5 else now + timedelta(hours=rng.uniform(0.5, 24))
+            for _ in range(rng.randint(1, 4)):
+                hours = booking_hours(rng)
+                leaving = cursor + timedelta(hours=hours)
+                if leaving > now + timedelta(days=10):
+                    break
+                if leaving > now:
+                    if cursor <= now:
+                        occupied_spot_ids.append(sid)
+                    booking_rows.append(dict(
+                        user_id=rng.choice(user_ids), spot_id=sid, parking_time=cursor, leaving_time=leaving,
+                        parking_cost=round(hours * price_of_lot[lot_id], 2), vehicle_no=vehicle_no(rng)
+                    ))
+                cursor = leaving + timedelta(hours=rng.uniform(0.25, 48))
+        counter_rows.append(dict(
+            lot_id=lot_id, total_spots=len(spots_of_lot[lot_id]),
+            occupied_spots=len(occupied_spot_ids) - occupied_before, booked_spots=len(booking_rows) - booked_before
+        ))
+    insert_chunked(UserBookings, booking_rows)
+    insert_chunked(LotCounters, counter_rows)
+    for i in range(0, len(occupied_spot_ids), CHUNK):
+        ParkingSpot.query.filter(ParkingSpot.spot_id.in_(occupied_spot_ids[i:i + CHUNK])).update(
+            {'status': 'O'}, synchronize_session=False)
+
+    # ---- history: past year, weighted towards popular lots and rush hours ----
+    for start in range(0, history, CHUNK):
+        chosen_lots = rng.choices(lot_ids, weights=lot_weights, k=min(CHUNK, history - start))
+        rows = []
+        for lot_id in chosen_lots:
+            hours = booking_hours(rng)
+            booking_time = rush_hour_start(rng, now - timedelta(days=rng.randint(1, history_days)))
+            rows.append(dict(
+                user_id=rng.choice(user_ids), spot_id=rng.choice(spots_of_lot[lot_id]),
+                booking_time=booking_time, leaving_time=booking_time + timedelta(hours=hours),
+                parking_cost=round(hours * price_of_lot[lot_id], 2), vehicle_no=vehicle_no(rng)
+            ))
+        db.session.execute(insert(UserHistory), rows)
+    db.session.commit()
+
+    # history was inserted directly, summary rollups are computed from it in one go
+    rebuild_rollups()
+
+    # other workers must reload their lot catalog
+    lot_catalog.invalidate()
+    db.session.commit()
+
+    return {
+        'users': users, 'lots': lots, 'spots': len(spot_rows), 'bookings': len(booking_rows),
+        'occupied_spots': len(occupied_spot_ids), 'history': history,
+        'seconds': round(time.perf_counter() - started, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a reproducible synthetic ParkAlot dataset.")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--preset', choices=PRESETS, default='small')
+    parser.add_argument('--lots', type=int)
+    parser.add_argument('--min-spots', type=int)
+    parser.add_argument('--max-spots', type=int)
+    parser.add_argument('--users', type=int)
+    parser.add_argument('--history', type=int)
+    parser.add_argument('--reset', action='store_true', help="drop all tables first (keeps only the admin user)")
+    args = parser.parse_args()
+
+    sizes = dict(PRESETS[args.preset])
+    for key in sizes:
+        if getattr(args, key) is not None:
+            sizes[key] = getattr(args, key)
+
+    with app.app_context():
+        if args.reset:
+            db.drop_all()
+            db.session.execute(db.text("DROP TABLE IF EXISTS schema_version"))
+            db.session.commit()
+        init_db()
+        create_admin()
+        print(f"Generating {sizes} with seed {args.seed} ...")
+        print(generate(args.seed, **sizes))
+
+
+if __name__ == '__main__':
+    main()
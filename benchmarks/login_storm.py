@@ -0,0 +1,123 @@
+"""
+Simulates a login storm (shift change) and measures login throughput together with the latency of a
+non-auth route requested at the same time. Run it against a database filled by benchmarks.generate_data:
+
+    python -m benchmarks.login_storm --threads 16 --seconds 10
+    python -m benchmarks.login_storm --threads 16 --seconds 10 --hash-workers 16
+
+The user home page is first timed alone, then while --threads clients keep logging in. --hash-workers and
+--max-pending override PASSWORD_HASH_WORKERS / PASSWORD_HASH_MAX_PENDING for the run.
+"""
+import argparse
+import os
+import random
+import threading
+import time
+
+os.environ.setdefault('BOOKING_SCHEDULER', 'worker')   # keep background work out of the measurements
+
+from slugify import slugify
+
+from app import app
+from models.dbmodel import db, User
+from benchmarks.generate_data import BENCH_PASSWORD
+from benchmarks.run_routes import percentile, login
+
+
+def bench_users(limit):
+    with app.app_context():
+        users = db.session.execute(
+            db.select(User.user_id, User.email_id, User.user_name)
+            .where(User.email_id.like('%@bench')).limit(limit)
+        ).all()
+    if not users:
+        raise SystemExit("No bench users, generate a dataset first.")
+    return users
+
+
+def probe(client, url, stop, latencies):
+    while not stop.is_set():
+        started = time.perf_counter()
+        response = client.get(url)
+        latencies.append((time.perf_counter() - started) * 1000)
+        if response.status_code != 200:
+            raise SystemExit(f"{url} returned {response.status_code}")
+
+
+def storm(seed, emails, stop, results):
+    rng = random.Random(seed)
+    client = app.test_client()
+    ok = refused = 0
+    latencies = []
+    while not stop.is_set():
+        started = time.perf_counter()
+        response = client.post('/login', data={'email': rng.choice(emails), 'password': BENCH_PASSWORD})
+        latencies.append((time.perf_counter() - started) * 1000)
+        if 'login' in response.headers.get('Location', ''):
+            refused += 1     # right password, so the hasher was busy
+        else:
+            ok += 1
+        client.get('/logout')
+    results.append((ok, refused, latencies))
+
+
+def timed_probe(client, url, seconds):
+    stop, latencies = threading.Event(), []
+    thread = threading.Thread(target=probe, args=(client, url, stop, latencies))
+    thread.start()
+    time.sleep(seconds)
+    stop.set()
+    thread.join()
+    return latencies
+
+
+def describe(name, latencies):
+    print(f"  {name:24s} n {len(latencies):6d}   p50 {percentile(latencies, 50):8.2f} ms   "
+          f"p95 {percentile(latencies, 95):8.2f} ms   max {max(latencies):8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Login storm benchmark.")
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--hash-workers', type=int)
+    parser.add_argument('--max-pending', type=int)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    if args.hash_workers:
+        app.config['PASSWORD_HASH_WORKERS'] = args.hash_workers
+    if args.max_pending:
+        app.config['PASSWORD_HASH_MAX_PENDING'] = args.max_pending
+
+    users = bench_users(args.threads * 8)
+    user_id, email, name = users[0]
+    probe_client = app.test_client()
+    login(probe_client, email, BENCH_PASSWORD)
+    url = f"/{user_id}-{slugify(name)}/home"
+
+    print(f"hash workers {app.config['PASSWORD_HASH_WORKERS']}, max pending {app.config['PASSWORD_HASH_MAX_PENDING']}, "
+          f"{args.threads} login threads, {os.cpu_count()} cpus")
+    describe("user_home alone", timed_probe(probe_client, url, args.seconds / 2))
+
+    stop, results = threading.Event(), []
+    threads = [threading.Thread(target=storm, args=(args.seed + i, [u.email_id for u in users], stop, results))
+               for i in range(args.threads)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    during = timed_probe(probe_client, url, args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    ok = sum(r[0] for r in results)
+    refused = sum(r[1] for r in results)
+    describe("user_home during storm", during)
+    describe("login", [latency for r in results for latency in r[2]])
+    print(f"  logins {ok} ({ok / elapsed:.1f}/s), refused as busy {refused}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+Builds the lot text search index over synthetic lots in memory (no database writes) and reports build time,
+incremental update time and query latency for exact, prefix and misspelled queries:
+
+    python -m benchmarks.lot_search --lots 50000 --queries 2000
+"""
+import argparse
+import random
+import time
+
+from app import app      # app first, the models import it
+from controllers.catalog import LotInfo
+from controllers.lot_search import LotSearchIndex
+from benchmarks.generate_data import CITIES, PLACES, ROADS
+from benchmarks.run_routes import percentile
+
+
+def synthetic_lots(count, rng):
+    lots = []
+    for lot_id in range(1, count + 1):
+        city = rng.choice(list(CITIES))
+        lots.append(LotInfo(
+            lot_id=lot_id, area_type='Open', city=city,
+            primelocation_name=f"{rng.choice(ROADS).split()[0]} {rng.choice(PLACES)} {lot_id}",
+            price_per_hr=50.0, address=f"{lot_id} {rng.choice(ROADS)}, {city}",
+            pincode=CITIES[city] + f"{rng.randint(1, 99):03d}"
+        ))
+    return lots
+
+
+def misspell(word, rng):
+    i = rng.randrange(1, len(word) - 1)
+    return word[:i] + word[i + 1:] if rng.random() < 0.5 else word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+
+def query_kinds(lots, rng):
+    # long enough words only, words up to 3 letters must be typed exactly
+    places = [p.lower() for p in PLACES if len(p) > 4]
+    cities = [c.lower() for c in CITIES if len(c) > 4]
+    return {
+        'exact pincode': lambda: rng.choice(lots).pincode,
+        'prefix': lambda: rng.choice(list(CITIES))[:4] + " " + rng.choice(PLACES)[:3],
+        'place + number': lambda: (lambda lot: f"{lot.primelocation_name.split()[1]} {lot.lot_id}")(rng.choice(lots)),
+        'misspelled': lambda: misspell(rng.choice(cities), rng) + " " + misspell(rng.choice(places), rng),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lot text search index benchmark.")
+    parser.add_argument('--lots', type=int, default=50000)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    lots = synthetic_lots(args.lots, rng)
+    started = time.perf_counter()
+    index = LotSearchIndex(lots)
+    print(f"{args.lots} lots indexed in {time.perf_counter() - started:.2f} s")
+
+    # one edited lot, as after edit_parking
+    edited = lots[len(lots) // 2]._replace(primelocation_name="Renamed Plaza")
+    by_id = {lot.lot_id: lot for lot in lots}
+    started = time.perf_counter()
+    index.sync([edited if lot.lot_id == edited.lot_id else lot for lot in lots], by_id)
+    print(f"sync after one edit        {(time.perf_counter() - started) * 1000:8.2f} ms (compares all lots)")
+    started = time.perf_counter()
+    index.put(edited)
+    print(f"put of one lot             {(time.perf_counter() - started) * 1000:8.3f} ms")
+
+    for name, make_query in query_kinds(lots, rng).items():
+        latencies, hits = [], 0
+        for _ in range(args.queries):
+            query = make_query()
+            started = time.perf_counter()
+            hits += bool(index.search(query, limit=50))
+            latencies.append((time.perf_counter() - started) * 1000)
+        print(f"{name:16s} p50 {percentile(latencies, 50):7.3f} ms   p95 {percentile(latencies, 95):7.3f} ms   "
+              f"p99 {percentile(latencies, 99):7.3f} ms   with results {hits / args.queries:6.1%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Builds the nearest lot k-d tree over synthetic lots scattered around the cities (no database needed) and reports
+build time, incremental update time and k nearest lookup latency, checked against a brute force scan:
+
+    python -m benchmarks.nearest_lots --lots 50000 --queries 5000 --k 5
+
+Lookups only walk the tree, the free spot check of search_parking adds one counters query per batch of lots.
+"""
+import argparse
+import math
+import random
+import time
+
+from app import app      # app first, the models import it
+from controllers.catalog import LotInfo
+from controllers.nearby import LotKDTree, to_unit_vector
+from benchmarks.run_routes import percentile
+
+# rough city centres, same as the bundled pincode table
+CENTRES = [
+    (19.08, 72.88), (28.61, 77.21), (28.54, 77.39), (28.46, 77.03), (12.97, 77.59), (18.52, 73.86),
+    (17.39, 78.49), (13.08, 80.27), (23.02, 72.57), (26.91, 75.79), (22.57, 88.36), (22.72, 75.86),
+    (23.26, 77.41), (26.85, 80.95), (30.73, 76.78), (9.93, 76.27),
+]
+
+
+def synthetic_lots(count, rng):
+    lots = []
+    for lot_id in range(1, count + 1):
+        latitude, longitude = rng.choice(CENTRES)
+        lots.append(LotInfo(lot_id=lot_id, area_type='Open', city='', primelocation_name='', price_per_hr=50.0,
+                            address='', pincode='', latitude=latitude + rng.gauss(0, 0.1),
+                            longitude=longitude + rng.gauss(0, 0.1)))
+    return lots
+
+
+def brute_force(lots, latitude, longitude, k):
+    target = to_unit_vector(latitude, longitude)
+    return sorted(lots, key=lambda lot: math.dist(target, to_unit_vector(lot.latitude, lot.longitude)))[:k]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Nearest lot k-d tree benchmark.")
+    parser.add_argument('--lots', type=int, default=50000)
+    parser.add_argument('--queries', type=int, default=5000)
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--check', type=int, default=50, help="lookups compared with a brute force scan")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    lots = synthetic_lots(args.lots, rng)
+    started = time.perf_counter()
+    tree = LotKDTree(lots)
+    print(f"{args.lots} lots indexed in {time.perf_counter() - started:.2f} s")
+
+    # one lot moved and one added, as after edit_parking/add_parking
+    by_id = {lot.lot_id: lot for lot in lots}
+    moved = lots[len(lots) // 2]._replace(latitude=lots[0].latitude, longitude=lots[0].longitude)
+    added = lots[1]._replace(lot_id=args.lots + 1)
+    lots = [moved if lot.lot_id == moved.lot_id else lot for lot in lots] + [added]
+    started = time.perf_counter()
+    changed = tree.sync(lots, by_id)
+    print(f"sync after add + edit      {(time.perf_counter() - started) * 1000:8.2f} ms ({changed} lots moved, compares all lots)")
+
+    queries = [(latitude + rng.gauss(0, 0.1), longitude + rng.gauss(0, 0.1))
+               for latitude, longitude in (rng.choice(CENTRES) for _ in range(args.queries))]
+    for k in sorted({1, args.k, 4 * args.k}):
+        latencies = []
+        for latitude, longitude in queries:
+            started = time.perf_counter()
+            tree.nearest(latitude, longitude, k)
+            latencies.append((time.perf_counter() - started) * 1000)
+        print(f"k={k:<3d} p50 {percentile(latencies, 50):7.3f} ms   p95 {percentile(latencies, 95):7.3f} ms   "
+              f"p99 {percentile(latencies, 99):7.3f} ms")
+
+    mismatches = 0
+    for latitude, longitude in queries[:args.check]:
+        expected = [lot.lot_id for lot in brute_force(lots, latitude, longitude, args.k)]
+        mismatches += [lot_id for lot_id, _ in tree.nearest(latitude, longitude, args.k)] != expected
+    print(f"{args.check} lookups checked against brute force, {mismatches} differ")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+"""
+Drives the key routes through the Flask test client and reports latency percentiles and SQL statement
+counts per route. Run it against a database filled by benchmarks.generate_data:
+
+    python -m benchmarks.run_routes --iterations 50 --out bench_results.json
+
+Compare two result files with:
+
+    python -m benchmarks.run_routes --compare before.json after.json
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault('BOOKING_SCHEDULER', 'worker')   # keep background work out of the measurements
+
+from sqlalchemy import event, func
+from slugify import slugify
+
+from app import app
+from models.dbmodel import db, User, ParkingLot, ParkingSpot, UserBookings, UserHistory
+from benchmarks.generate_data import BENCH_PASSWORD
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    k = (len(ordered) - 1) * pct / 100
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+class StatementCounter:
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, 'before_cursor_execute', self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+
+def login(client, email, password):
+    response = client.post('/login', data={'email': email, 'password': password})
+    if response.status_code != 302 or 'login' in response.headers.get('Location', ''):
+        raise SystemExit(f"Could not log in as {email}")
+
+
+def build_scenarios(rng):
+    """
+    returns [(route name, client kind, fn(client) -> response)] with ids sampled from the dataset"""
+    with app.app_context():
+        # the user with most history is the worst case for the user pages
+        user_id = (
+            db.session.query(UserHistory.user_id).group_by(UserHistory.user_id)
+            .order_by(func.count(UserHistory.id).desc()).limit(1).scalar()
+        ) or db.session.query(func.max(User.user_id)).scalar()
+        user = db.session.get(User, user_id)
+        lot_ids = [row[0] for row in db.session.query(ParkingLot.lot_id).all()]
+        cities = [row[0] for row in db.session.query(ParkingLot.city).distinct().all()]
+        pincodes = [row[0] for row in db.session.query(ParkingLot.pincode).distinct().limit(200).all()]
+        # biggest lot for book_spot / parking_spots
+        big_lot = (
+            db.session.query(ParkingSpot.lot_id).group_by(ParkingSpot.lot_id)
+            .order_by(func.count(ParkingSpot.spot_id).desc()).limit(1).scalar()
+        )
+        spot_ids = [row[0] for row in db.session.query(ParkingSpot.spot_id).filter_by(lot_id=big_lot).all()]
+        user_email, user_slug = user.email_id, slugify(user.user_name)
+
+    base = f"/{user_id}-{user_slug}"
+    now = datetime.now()
+
+    def book_preview(client):
+        start = now + timedelta(hours=rng.randint(1, 200))
+        return client.post(f"{base}/book-spot/{rng.choice([big_lot] + lot_ids[:50])}", data={
+            'vehicle_no': 'BENCH01', 'action': 'preview',
+            'parking_time': start.strftime('%Y-%m-%dT%H:%M'),
+            'leaving_time': (start + timedelta(hours=rng.randint(1, 8))).strftime('%Y-%m-%dT%H:%M'),
+        })
+
+    def search_window(client):
+        start = now + timedelta(hours=rng.randint(1, 200))
+        return client.post(f"{base}/search-parking", data={
+            'city': rng.choice(cities),
+            'parking_time': start.strftime('%Y-%m-%dT%H:%M'),
+            'leaving_time': (start + timedelta(hours=rng.randint(1, 8))).strftime('%Y-%m-%dT%H:%M'),
+        })
+
+    scenarios = [
+        ('user_home', 'user', lambda c: c.get(f"{base}/home")),
+        ('search_parking', 'user', lambda c: c.post(f"{base}/search-parking", data={'city': rng.choice(cities)})),
+        ('search_parking_window', 'user', search_window),
+        ('search_parking_near', 'user', lambda c: c.post(f"{base}/search-parking", data={'near': rng.choice(pincodes)})),
+        ('book_spot_preview', 'user', book_preview),
+        ('user_history', 'user', lambda c: c.get(f"{base}/history")),
+        ('user_summary', 'user', lambda c: c.get(f"{base}/summary")),
+        ('admin_dashboard', 'admin', lambda c: c.get('/admin/dashboard')),
+        ('admin_summary', 'admin', lambda c: c.get('/admin/summary')),
+        ('admin_search', 'admin', lambda c: c.post('/admin/search', data={'submit_parking_lot_search': '1', 'city': rng.choice(cities)})),
+        ('parking_spots', 'admin', lambda c: c.get(f"/admin/parking_spots/{big_lot}")),
+        ('parking_spots_grid', 'admin', lambda c: c.get(f"/admin/parking_spots/{big_lot}/grid")),
+        ('spot_details', 'admin', lambda c: c.get(f"/admin/spot-details/{rng.choice(spot_ids)}")),
+    ]
+    return user_email, scenarios
+
+
+def dataset_size():
+    with app.app_context():
+        return {
+            'users': User.query.count(), 'lots': ParkingLot.query.count(), 'spots': ParkingSpot.query.count(),
+            'bookings': UserBookings.query.count(), 'history': UserHistory.query.count(),
+        }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(iterations, warmup, seed, routes=None):
+    rng = random.Random(seed)
+    user_email, scenarios = build_scenarios(rng)
+    if routes:
+        scenarios = [s for s in scenarios if s[0] in routes]
+
+    clients = {'user': app.test_client(), 'admin': app.test_client()}
+    login(clients['user'], user_email, BENCH_PASSWORD)
+    login(clients['admin'], 'parkalot@admin', '1234')
+
+    with app.app_context():
+        counter = StatementCounter(db.engine)
+
+    results = {}
+    for name, kind, fn in scenarios:
+        client = clients[kind]
+        for _ in range(warmup):
+            fn(client)
+        latencies, statements = [], []
+        for _ in range(iterations):
+            counter.count = 0
+            started = time.perf_counter()
+            response = fn(client)
+            latencies.append((time.perf_counter() - started) * 1000)
+            statements.append(counter.count)
+            if response.status_code >= 400:
+                raise SystemExit(f"{name} returned {response.status_code}")
+        results[name] = {
+            'p50_ms': round(percentile(latencies, 50), 2),
+            'p95_ms': round(percentile(latencies, 95), 2),
+            'p99_ms': round(percentile(latencies, 99), 2),
+            'max_ms': round(max(latencies), 2),
+            'sql_statements_mean': round(sum(statements) / len(statements), 1),
+            'sql_statements_max': max(statements),
+        }
+        print(f"{name:20s} p50 {results[name]['p50_ms']:9.2f} ms   p95 {results[name]['p95_ms']:9.2f} ms   "
+              f"p99 {results[name]['p99_ms']:9.2f} ms   sql {results[name]['sql_statements_mean']:7.1f}")
+    return results
+
+
+def compare(before_path, after_path):
+    with open(before_path) as f:
+        before = json.load(f)['routes']
+    with open(after_path) as f:
+        after = json.load(f)['routes']
+    for name in before:
+        if name not in after:
+            continue
+        b, a = before[name], after[name]
+        print(f"{name:20s} p95 {b['p95_ms']:9.2f} -> {a['p95_ms']:9.2f} ms   "
+              f"sql {b['sql_statements_mean']:7.1f} -> {a['sql_statements_mean']:7.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Route level latency and SQL statement benchmark.")
+    parser.add_argument('--iterations', type=int, default=30)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--routes', nargs='*', help="only run these routes")
+    parser.add_argument('--out', default='bench_results.json')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    results = run(args.iterations, args.warmup, args.seed, args.routes)
+    with open(args.out, 'w') as f:
+        json.dump({
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'git_revision': git_revision(),
+            'iterations': args.iterations,
+            'dataset': dataset_size(),
+            'routes': results,
+        }, f, indent=2)
+    print(f"Results written to {args.out}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""
+Opens many live spot grid streams on one lot (a wall of monitoring screens) and changes spots of that lot
+the way another worker process would, then reports how fast the changes reach every screen and how many
+SQL statements the streams cost, next to what the same screens would cost by polling the grid endpoint.
+Run it against a database filled by benchmarks.generate_data:
+
+    python -m benchmarks.spot_stream --screens 50 --changes 200 --rate 20
+
+Every change toggles a free spot between 'A' and 'O' with its counters and a spot_event row, committed in
+its own transaction. Nothing else is changed, the spots are set back to 'A' at the end.
+"""
+import argparse
+import json
+import os
+import threading
+import time
+
+os.environ.setdefault('BOOKING_SCHEDULER', 'worker')   # keep background work out of the measurements
+
+from sqlalchemy import event, func, update
+
+from app import app
+from models.dbmodel import db, ParkingSpot, UserBookings
+from controllers.lot_counters import bump_lot_counters
+from controllers.spot_events import spot_event_hub, record_spot_events, ACTIVATED, RELEASED
+from benchmarks.run_routes import percentile, login
+
+
+def pick_lot():
+    """
+    (lot_id, [spot ids with status 'A' and no booking]) of the lot with most such spots"""
+    with app.app_context():
+        booked = db.select(UserBookings.spot_id)
+        lot_id = db.session.execute(
+            db.select(ParkingSpot.lot_id).where(ParkingSpot.status == 'A', ParkingSpot.spot_id.not_in(booked))
+            .group_by(ParkingSpot.lot_id).order_by(func.count().desc()).limit(1)
+        ).scalar()
+        if lot_id is None:
+            raise SystemExit("No free spots, generate a dataset first.")
+        spot_ids = db.session.execute(
+            db.select(ParkingSpot.spot_id)
+            .where(ParkingSpot.lot_id == lot_id, ParkingSpot.status == 'A', ParkingSpot.spot_id.not_in(booked))
+        ).scalars().all()
+    return lot_id, spot_ids
+
+
+def watch(client, url, received, ready, failures):
+    response = client.get(url, buffered=False)
+    ready.release()
+    if response.status_code != 200:
+        failures.append(response.status_code)
+        return
+    for chunk in response.response:
+        chunk = chunk.decode() if isinstance(chunk, bytes) else chunk
+        for line in chunk.splitlines():
+            if line.startswith('data: '):
+                data = json.loads(line[6:])
+                if data.get('kind'):
+                    received.append((data['spot_id'], data['kind'], time.perf_counter()))
+
+
+def change_spot(spot_id, lot_id, occupied):
+    db.session.execute(update(ParkingSpot).where(ParkingSpot.spot_id == spot_id).values(status='O' if occupied else 'A'))
+    bump_lot_counters(lot_id, occupied=1 if occupied else -1)
+    record_spot_events(lot_id, ACTIVATED if occupied else RELEASED, [spot_id])
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Live spot grid stream fan-out benchmark.")
+    parser.add_argument('--screens', type=int, default=50, help="streams open on the lot")
+    parser.add_argument('--changes', type=int, default=200)
+    parser.add_argument('--rate', type=float, default=20, help="changes per second")
+    args = parser.parse_args()
+
+    lot_id, spot_ids = pick_lot()
+    app.config['SPOT_EVENTS_MAX_STREAMS'] = max(app.config['SPOT_EVENTS_MAX_STREAMS'], args.screens)
+    url = f"/admin/parking_spots/{lot_id}/events"
+    print(f"lot {lot_id}, {len(spot_ids)} free spots, {args.screens} screens")
+
+    statements = {'hub': 0}
+    with app.app_context():
+        def count(*_):
+            if threading.current_thread().name == 'spot-events':
+                statements['hub'] += 1
+        event.listen(db.engine, 'before_cursor_execute', count)
+
+    received = [[] for _ in range(args.screens)]
+    failures = []
+    ready = threading.Semaphore(0)
+    for screen in range(args.screens):
+        client = app.test_client()
+        login(client, 'parkalot@admin', '1234')
+        threading.Thread(target=watch, args=(client, url, received[screen], ready, failures), daemon=True).start()
+    for _ in range(args.screens):
+        ready.acquire()
+    if failures:
+        raise SystemExit(f"{len(failures)} streams could not be opened ({failures[0]}), run `flask init-db` first?")
+
+    sent = {}
+    occupied = set()
+    started = time.perf_counter()
+    with app.app_context():
+        for i in range(args.changes):
+            spot_id = spot_ids[i % len(spot_ids)]
+            change_spot(spot_id, lot_id, spot_id not in occupied)
+            occupied ^= {spot_id}
+            sent.setdefault(spot_id, []).append(time.perf_counter())
+            time.sleep(max(0.0, started + (i + 1) / args.rate - time.perf_counter()))
+        time.sleep(app.config['SPOT_EVENTS_POLL'] * 2 + 0.5)
+        for spot_id in occupied:
+            change_spot(spot_id, lot_id, False)
+    seconds = time.perf_counter() - started
+
+    latencies, missing = [], 0
+    for screen_events in received:
+        seen = {}
+        for spot_id, _, at in screen_events:
+            times = sent.get(spot_id, [])
+            index = seen.get(spot_id, 0)
+            if index < len(times):
+                latencies.append((at - times[index]) * 1000)
+            seen[spot_id] = index + 1
+        missing += sum(max(0, len(times) - seen.get(spot_id, 0)) for spot_id, times in sent.items())
+
+    print(f"{args.changes} changes to {args.screens} screens: {len(latencies)} deliveries, {missing} missing")
+    print(f"change -> screen  p50 {percentile(latencies, 50):7.1f} ms   p95 {percentile(latencies, 95):7.1f} ms   "
+          f"p99 {percentile(latencies, 99):7.1f} ms")
+    print(f"sql by the stream thread: {statements['hub']} statements in {seconds:.1f} s "
+          f"({statements['hub'] / args.changes:.1f} per change, whatever the number of screens)")
+    print(f"polling instead: {args.screens * seconds / 15:.0f} grid requests at 15 s, changes seen up to 15 s late")
+
+
+if __name__ == '__main__':
+    main()
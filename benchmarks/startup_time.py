@@ -0,0 +1,77 @@
+"""
+Measures how long a fresh process takes to import the app and to answer its first request. Every run is a
+new python process, so module imports, engine setup and template compilation are all counted:
+
+    python -m benchmarks.startup_time --runs 20
+
+With --init-db the one time setup (`flask init-db --demo` on an empty temporary sqlite file) is timed too,
+that is the work every process used to do on import.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+PROBE = r"""
+import json, time
+started = time.perf_counter()
+from app import app
+imported = time.perf_counter()
+with app.test_client() as client:
+    status = client.get('/login').status_code
+answered = time.perf_counter()
+print(json.dumps({'import_ms': (imported - started) * 1000, 'first_request_ms': (answered - imported) * 1000,
+                  'status': status}))
+"""
+
+
+def run_probe(env):
+    output = subprocess.run([sys.executable, '-c', PROBE], env=env, capture_output=True, text=True, check=True)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def time_init_db(env):
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(env, SQLALCHEMY_DATABASE_URI=f"sqlite:///{os.path.join(tmp, 'startup.db')}")
+        probe = (
+            "import time; started = time.perf_counter()\n"
+            "from app import app\n"
+            "from models.setup import init_db, create_admin, seed_demo_lots\n"
+            "imported = time.perf_counter()\n"
+            "with app.app_context():\n"
+            "    init_db(); create_admin(); seed_demo_lots()\n"
+            "print((time.perf_counter() - imported) * 1000)\n"
+        )
+        output = subprocess.run([sys.executable, '-c', probe], env=env, capture_output=True, text=True, check=True)
+        return float(output.stdout.strip().splitlines()[-1])
+
+
+def summarize(values):
+    ordered = sorted(values)
+    return {'min': round(ordered[0], 1), 'median': round(statistics.median(ordered), 1),
+            'max': round(ordered[-1], 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Process startup time benchmark.")
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--init-db', action='store_true', help="also time the one time database setup")
+    args = parser.parse_args()
+
+    env = dict(os.environ, BOOKING_SCHEDULER='worker')   # no scheduler thread in the probes
+    runs = [run_probe(env) for _ in range(args.runs)]
+    statuses = {run['status'] for run in runs}
+
+    print(f"{args.runs} fresh processes (first request status {', '.join(map(str, sorted(statuses)))})")
+    for key in ('import_ms', 'first_request_ms'):
+        stats = summarize([run[key] for run in runs])
+        print(f"  {key:18s} min {stats['min']:8.1f}  median {stats['median']:8.1f}  max {stats['max']:8.1f}")
+    if args.init_db:
+        print(f"  init-db --demo     {time_init_db(env):8.1f} ms (once per database, not per process)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+from collections import defaultdict
+from datetime import datetime
+import time
+
+from flask import current_app
+from sqlalchemy import select, insert, update, delete, exists
+from app import app
+from models.dbmodel import db, ParkingSpot, UserBookings, UserHistory
+from .lot_counters import bump_lot_counters
+from .rollups import add_to_rollups
+from .spot_events import record_spot_events, EXPIRED
+
+
+# --------------------------- set based archival of expired bookings into booking_history -------------------------------------
+
+# expired bookings are moved in chunks of ARCHIVE_CHUNK_SIZE, each chunk in its own short transaction, so a big
+# backlog (after an outage or a quiet night) never holds the write lock for long or loads thousands of ORM objects.
+# a chunk starts by deleting its bookings (DELETE ... RETURNING): the delete is the claim. archival runs on the
+# scheduler thread of every web process (or the worker), a booking another process deleted first is simply not
+# returned, so history rows, rollups and lot counters only ever follow rows this transaction really removed.
+# the write being the first statement also means sqlite never has to upgrade a stale read snapshot.
+# the in-memory availability index needs no update, it prunes expired intervals on every lookup.
+
+BOOKING_COLUMNS = (UserBookings.id, UserBookings.user_id, UserBookings.spot_id, UserBookings.parking_time,
+                   UserBookings.leaving_time, UserBookings.parking_cost, UserBookings.vehicle_no)
+
+
+def _claim(expired):
+    """
+    deletes the bookings whose ids the expired query selects and returns them (BOOKING_COLUMNS), rows locked
+    or already deleted by another process are skipped"""
+    expired = expired.with_for_update(skip_locked=True)    # server databases, sqlite serializes writers anyway
+    if db.engine.dialect.delete_returning:
+        return db.session.execute(
+            delete(UserBookings).where(UserBookings.id.in_(expired.scalar_subquery())).returning(*BOOKING_COLUMNS)
+        ).all()
+
+    # no DELETE ... RETURNING (mysql): lock the rows, then delete them
+    rows = db.session.execute(expired.with_only_columns(*BOOKING_COLUMNS)).all()
+    if rows:
+        db.session.execute(delete(UserBookings).where(UserBookings.id.in_([row.id for row in rows])))
+    return rows
+
+
+def _archive_chunk(expired, now):
+    rows = _claim(expired)
+    if not rows:
+        db.session.commit()
+        return 0
+
+    spot_ids = {row.spot_id for row in rows}
+    lot_of = dict(db.session.execute(
+        select(ParkingSpot.spot_id, ParkingSpot.lot_id).where(ParkingSpot.spot_id.in_(spot_ids))
+    ).all())
+
+    located = [row for row in rows if row.spot_id in lot_of]     # spot deleted meanwhile: history only
+    add_to_rollups([(row.user_id, lot_of[row.spot_id], row.parking_time, row.leaving_time, row.parking_cost)
+                    for row in located], history_rows=len(rows))
+    db.session.execute(insert(UserHistory), [
+        dict(user_id=row.user_id, spot_id=row.spot_id, booking_time=row.parking_time, leaving_time=row.leaving_time,
+             parking_cost=row.parking_cost, vehicle_no=row.vehicle_no)
+        for row in sorted(rows, key=lambda row: row.leaving_time)
+    ])
+
+    booked_per_lot = defaultdict(int)
+    spots_per_lot = defaultdict(set)
+    for row in located:
+        booked_per_lot[lot_of[row.spot_id]] += 1
+        spots_per_lot[lot_of[row.spot_id]].add(row.spot_id)
+
+    # free the occupied spots of the chunk unless a booking that is active now holds them (back to back
+    # bookings keep the spot occupied). the update is conditional, the counter follows its rowcount
+    other_active_booking = exists().where(
+        UserBookings.spot_id == ParkingSpot.spot_id,
+        UserBookings.parking_time <= now,
+        UserBookings.leaving_time > now
+    )
+    for lot_id, lot_spot_ids in spots_per_lot.items():
+        freed = db.session.execute(
+            update(ParkingSpot)
+            .where(ParkingSpot.spot_id.in_(lot_spot_ids), ParkingSpot.status == 'O', ~other_active_booking)
+            .values(status='A')
+        ).rowcount
+        bump_lot_counters(lot_id, booked=-booked_per_lot[lot_id], occupied=-freed)
+        record_spot_events(lot_id, EXPIRED, sorted(lot_spot_ids))   # the live grid shows the new state of each
+
+    db.session.commit()
+    return len(rows)
+
+
+def archive_expired_bookings(booking_ids=None, now=None):
+    """
+    moves bookings whose leaving_time has passed into booking_history, optionally only the given booking ids.
+    safe to run from several processes at once. returns {'moved': rows moved, 'chunks': transactions, 'seconds': elapsed}"""
+    now = now or datetime.now()
+    chunk_size = current_app.config.get('ARCHIVE_CHUNK_SIZE', 500)
+    started = time.perf_counter()
+    moved = chunks = 0
+
+    def expired(candidate_ids=None):
+        query = select(UserBookings.id).where(UserBookings.leaving_time <= now)
+        if candidate_ids is not None:
+            query = query.where(UserBookings.id.in_(candidate_ids))
+        return query.order_by(UserBookings.leaving_time).limit(chunk_size)
+
+    db.session.commit()     # ends the caller's read transaction, every chunk starts a fresh one with its claim
+    if booking_ids is not None:
+        booking_ids = list(booking_ids)
+        for i in range(0, len(booking_ids), chunk_size):
+            claimed = _archive_chunk(expired(booking_ids[i:i + chunk_size]), now)
+            moved += claimed
+            chunks += 1 if claimed else 0
+    else:
+        # archived rows are deleted, so claiming again takes the next chunk
+        while True:
+            claimed = _archive_chunk(expired(), now)
+            if not claimed:
+                break
+            moved += claimed
+            chunks += 1
+
+    report = {'moved': moved, 'chunks': chunks, 'seconds': round(time.perf_counter() - started, 3)}
+    if moved:
+        current_app.logger.info("archived %s expired bookings in %s chunks (%ss)", moved, chunks, report['seconds'])
+    return report
+
+
+@app.cli.command('archive-expired')
+def archive_expired_command():
+    """Move all expired bookings into booking history."""
+    report = archive_expired_bookings()
+    print(f"Moved {report['moved']} bookings in {report['chunks']} chunks, {report['seconds']}s.")
@@ -0,0 +1,82 @@
+from collections import OrderedDict, namedtuple
+import threading
+import time
+
+from flask import g, current_app
+from models.dbmodel import db, User
+
+
+# --------------------------- authenticated user lookup for the access decorators -------------------------------------
+
+# user_access_required runs on every user route and only needs the identity of the user (id, name, email,
+# admin flag). we load it at most once per request (kept in flask.g) and keep recently used identities in a
+# small bounded LRU with a short TTL shared by all requests of the process, so the check normally costs
+# no query at all. anything that changes or deletes a user must call invalidate_auth_user().
+# routes that modify the user load the full User row themselves.
+
+AuthUser = namedtuple('AuthUser', ['user_id', 'user_name', 'email_id', 'is_admin'])
+
+
+class UserIdentityCache:
+
+    def __init__(self):
+        self._entries = OrderedDict()   # user_id -> (expires_at, AuthUser), oldest used first
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return entry[1]
+
+    def put(self, auth_user):
+        ttl = current_app.config.get('AUTH_USER_CACHE_TTL', 60)
+        max_size = current_app.config.get('AUTH_USER_CACHE_SIZE', 1024)
+        with self._lock:
+            self._entries[auth_user.user_id] = (time.monotonic() + ttl, auth_user)
+            self._entries.move_to_end(auth_user.user_id)
+            while len(self._entries) > max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id=None):
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+
+user_identity_cache = UserIdentityCache()
+
+
+def load_auth_user(user_id):
+    """
+    returns the AuthUser for user_id or None if no such user"""
+    request_users = g.setdefault('auth_users', {})
+    if user_id in request_users:
+        return request_users[user_id]
+
+    auth_user = user_identity_cache.get(user_id)
+    if auth_user is None:
+        row = (
+            db.session.query(User.user_id, User.user_name, User.email_id, User.is_admin)
+            .filter(User.user_id == user_id)
+            .first()
+        )
+        if row is not None:
+            auth_user = AuthUser(*row)
+            user_identity_cache.put(auth_user)
+
+    request_users[user_id] = auth_user
+    return auth_user
+
+
+def invalidate_auth_user(user_id):
+    # after a profile edit or account deletion
+    user_identity_cache.invalidate(user_id)
+    g.get('auth_users', {}).pop(user_id, None)
@@ -0,0 +1,144 @@
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime
+import threading
+import time
+
+from flask import current_app
+from models.dbmodel import db, ParkingSpot, UserBookings
+
+
+# --------------------------- in-memory availability index per parking lot -------------------------------------
+
+# every spot keeps its bookings as a list of (parking_time, leaving_time, booking_id) tuples sorted by
+# parking_time. bookings on one spot never overlap (book_spot guarantees that) so the list is also sorted
+# by leaving_time, which lets us find the conflicting bookings of a spot with two binary searches
+# instead of one overlap query per spot.
+
+class LotAvailability:
+    """
+    availability of all spots of one lot, built from 2 queries (spots + unexpired bookings of the lot)"""
+
+    def __init__(self, lot_id, spot_ids, bookings):
+        self.lot_id = lot_id
+        self.built_at = time.monotonic()
+        self.spots = {spot_id: [] for spot_id in spot_ids}
+        for booking_id, spot_id, parking_time, leaving_time in bookings:
+            if spot_id in self.spots:
+                insort(self.spots[spot_id], (parking_time, leaving_time, booking_id))
+
+    def _conflicts_for_spot(self, intervals, parking_time, leaving_time):
+        # first booking ending after requested start upto first booking starting at/after requested end
+        lo = bisect_right(intervals, parking_time, key=lambda iv: iv[1])
+        hi = bisect_left(intervals, (leaving_time,))
+        return intervals[lo:hi]
+
+    def neighbours(self, spot_id, parking_time, leaving_time):
+        """
+        (leaving_time of the booking right before, parking_time of the booking right after) a free period
+        of the spot, None where there is no booking on that side"""
+        intervals = self.spots[spot_id]
+        after = bisect_left(intervals, (leaving_time,))
+        return (
+            intervals[after - 1][1] if after > 0 else None,
+            intervals[after][0] if after < len(intervals) else None,
+        )
+
+    def lookup(self, parking_time, leaving_time, strategy=None):
+        """
+        returns (free spot ids in id order or in the order of the assignment strategy,
+        {spot_id: [(parking_time, leaving_time, booking_id), ...]}) for the period [parking_time, leaving_time)"""
+        free_spot_ids = []
+        conflicts = {}
+        for spot_id in sorted(self.spots):
+            overlapping = self._conflicts_for_spot(self.spots[spot_id], parking_time, leaving_time)
+            if overlapping:
+                conflicts[spot_id] = overlapping
+            else:
+                free_spot_ids.append(spot_id)
+        if strategy is not None:
+            free_spot_ids = strategy(
+                free_spot_ids, lambda spot_id: self.neighbours(spot_id, parking_time, leaving_time),
+                parking_time, leaving_time
+            )
+        return free_spot_ids, conflicts
+
+    def add_booking(self, spot_id, booking_id, parking_time, leaving_time):
+        if spot_id in self.spots:
+            insort(self.spots[spot_id], (parking_time, leaving_time, booking_id))
+
+    def remove_booking(self, spot_id, booking_id):
+        intervals = self.spots.get(spot_id)
+        if intervals:
+            self.spots[spot_id] = [iv for iv in intervals if iv[2] != booking_id]
+
+    def prune(self, now):
+        # drop bookings that already ended, they can never conflict with a new (future) booking
+        for spot_id, intervals in self.spots.items():
+            if intervals and intervals[0][1] <= now:
+                self.spots[spot_id] = [iv for iv in intervals if iv[1] > now]
+
+
+class AvailabilityIndex:
+    """
+    process wide cache of LotAvailability objects. a lot is loaded lazily on first lookup and rebuilt
+    after AVAILABILITY_INDEX_TTL seconds so bookings made by other worker processes are picked up.
+    book_spot still re-checks the chosen spot in the db before inserting, so a stale index can
+    never cause a double booking, only a retry"""
+
+    def __init__(self):
+        self._lots = {}
+        self._lock = threading.Lock()
+
+    def _ttl(self):
+        return current_app.config.get('AVAILABILITY_INDEX_TTL', 30)
+
+    def _build(self, lot_id):
+        now = datetime.now()
+        spot_ids = [row[0] for row in db.session.query(ParkingSpot.spot_id).filter_by(lot_id=lot_id).all()]
+        bookings = (
+            db.session.query(UserBookings.id, UserBookings.spot_id, UserBookings.parking_time, UserBookings.leaving_time)
+            .join(ParkingSpot, ParkingSpot.spot_id == UserBookings.spot_id)
+            .filter(ParkingSpot.lot_id == lot_id, UserBookings.leaving_time > now)
+            .all()
+        )
+        return LotAvailability(lot_id, spot_ids, bookings)
+
+    def get(self, lot_id):
+        with self._lock:
+            lot_index = self._lots.get(lot_id)
+            if lot_index is not None and time.monotonic() - lot_index.built_at < self._ttl():
+                return lot_index
+        lot_index = self._build(lot_id)
+        with self._lock:
+            self._lots[lot_id] = lot_index
+        return lot_index
+
+    def lookup(self, lot_id, parking_time, leaving_time, strategy=None):
+        lot_index = self.get(lot_id)
+        with self._lock:
+            lot_index.prune(datetime.now())
+            return lot_index.lookup(parking_time, leaving_time, strategy)
+
+    def booking_created(self, lot_id, booking):
+        with self._lock:
+            lot_index = self._lots.get(lot_id)
+            if lot_index is not None:
+                lot_index.add_booking(booking.spot_id, booking.id, booking.parking_time, booking.leaving_time)
+
+    def booking_removed(self, lot_id, spot_id, booking_id):
+        # used for both release/cancel and expiry
+        with self._lock:
+            lot_index = self._lots.get(lot_id)
+            if lot_index is not None:
+                lot_index.remove_booking(spot_id, booking_id)
+
+    def invalidate(self, lot_id=None):
+        # spots added/deleted or lot deleted, next lookup rebuilds from db
+        with self._lock:
+            if lot_id is None:
+                self._lots.clear()
+            else:
+                self._lots.pop(lot_id, None)
+
+
+availability_index = AvailabilityIndex()
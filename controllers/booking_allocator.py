@@ -0,0 +1,92 @@
+from contextlib import contextmanager
+import threading
+
+from sqlalchemy import select, exists
+from sqlalchemy.exc import IntegrityError
+from models.dbmodel import db, ParkingSpot, UserBookings
+from .availability import availability_index
+from .lot_counters import bump_lot_counters
+from .spot_events import record_spot_events, BOOKED
+
+
+# --------------------------- per lot serialized allocation of booking spots -------------------------------------
+
+# confirming a booking is check-then-insert. inside one process confirms of the same lot are serialized
+# by a lock per lot_id, so two requests can never pick the same free spot, while confirms of different
+# lots run in parallel. a lock only lives while some request holds or waits for it. across processes the db
+# is the last word: the no overlap triggers on user_bookings (sqlite, migration 2) or the exclusion
+# constraint (postgresql, migration 8) reject an overlapping insert, we then drop that spot and try the next one.
+
+MAX_ATTEMPTS = 3   # spots tried after the storage layer rejected an insert made by another process
+
+
+class BookingAllocator:
+
+    def __init__(self):
+        self._guard = threading.Lock()
+        self._locks = {}    # lot_id -> [lock, requests holding or waiting for it]
+
+    @contextmanager
+    def lock_for(self, lot_id):
+        with self._guard:
+            entry = self._locks.setdefault(lot_id, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._guard:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._locks[lot_id]
+
+    def _free_spots(self, lot_id, spot_ids, parking_time, leaving_time):
+        # one query for all candidates: still in the lot and no booking overlapping the period
+        overlapping = exists().where(
+            UserBookings.spot_id == ParkingSpot.spot_id,
+            UserBookings.parking_time < leaving_time,
+            UserBookings.leaving_time > parking_time
+        )
+        free = set(db.session.execute(
+            select(ParkingSpot.spot_id).where(
+                ParkingSpot.spot_id.in_(spot_ids),
+                ParkingSpot.lot_id == lot_id,
+                ~overlapping
+            )
+        ).scalars())
+        return [spot_id for spot_id in spot_ids if spot_id in free]   # keep the caller's preference order
+
+    def allocate(self, lot_id, candidate_spot_ids, user_id, parking_time, leaving_time, parking_cost, vehicle_no):
+        """
+        books the first candidate spot that is still free for [parking_time, leaving_time), commits and
+        returns the new UserBookings row, or None if none of the candidates is free anymore"""
+        with self.lock_for(lot_id):
+            candidates = self._free_spots(lot_id, list(candidate_spot_ids), parking_time, leaving_time)
+            if len(candidates) < len(candidate_spot_ids):
+                availability_index.invalidate(lot_id)   # index was stale (booking by another worker / deleted spot)
+
+            for spot_id in candidates[:MAX_ATTEMPTS]:
+                booking = UserBookings(
+                    user_id=user_id,
+                    spot_id=spot_id,
+                    parking_time=parking_time,
+                    leaving_time=leaving_time,
+                    parking_cost=parking_cost,
+                    vehicle_no=vehicle_no
+                )
+                db.session.add(booking)
+                try:
+                    db.session.flush()   # the no overlap triggers run here
+                    bump_lot_counters(lot_id, booked=1)
+                    record_spot_events(lot_id, BOOKED, [spot_id])
+                    db.session.commit()
+                except IntegrityError:
+                    db.session.rollback()
+                    continue
+                availability_index.booking_created(lot_id, booking)
+                return booking
+
+            return None
+
+
+booking_allocator = BookingAllocator()
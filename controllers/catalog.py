@@ -0,0 +1,176 @@
+from collections import namedtuple
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import update
+from models.dbmodel import db, ParkingLot, CacheVersion
+from .lot_search import LotSearchIndex
+from .nearby import LotKDTree, locate_pincode, nearest_lots_with_free_spots
+from .metrics import metrics_registry
+
+
+# --------------------------- in-process cache of cities, pincodes and lot metadata -------------------------------------
+
+# lots change only when an admin adds/edits/deletes one, but the city dropdown and the searches read them on
+# every render. the catalog keeps them in memory together with the version it was loaded at. add_parking,
+# edit_parking and delete_parking call lot_catalog.invalidate() before their commit, which bumps the 'catalog'
+# row of cache_version; worker processes compare their copy with that row (at most every
+# CATALOG_VERSION_CHECK seconds, the process that made the change at once) and reload when it changed. the text search index (lot_search.py) is kept in the
+# catalog and only re-indexes the lots that changed on such a reload, the same goes for the k-d tree of lot
+# positions used by the nearest lot search (nearby.py). reloads are serialized, both structures are shared by
+# every copy and each sync diffs against the copy loaded before it.
+
+LotInfo = namedtuple('LotInfo', ['lot_id', 'area_type', 'city', 'primelocation_name', 'price_per_hr', 'address', 'pincode',
+                                 'latitude', 'longitude'], defaults=(None, None))
+
+CATALOG_VERSION_NAME = 'catalog'
+
+
+class LotCatalog:
+
+    def __init__(self):
+        self._data = None          # dict(version, cities, pincodes, lots, by_id)
+        self._checked_at = 0
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()   # one reload at a time, they sync the shared search index/k-d tree
+        self.hits = 0
+        self.misses = 0
+
+    def _db_version(self):
+        return db.session.query(CacheVersion.version).filter_by(name=CATALOG_VERSION_NAME).scalar() or 0
+
+    def _load(self, version, previous=None):
+        lots = [LotInfo(*row) for row in db.session.query(
+            ParkingLot.lot_id, ParkingLot.area_type, ParkingLot.city, ParkingLot.primelocation_name,
+            ParkingLot.price_per_hr, ParkingLot.address, ParkingLot.pincode, ParkingLot.latitude, ParkingLot.longitude
+        ).order_by(ParkingLot.lot_id).all()]
+        if previous is None:
+            search_index = LotSearchIndex(lots)
+            lot_index = LotKDTree(lots)
+        else:
+            search_index = previous['search']
+            search_index.sync(lots, previous['by_id'])
+            lot_index = previous['nearby']
+            lot_index.sync(lots, previous['by_id'])
+        return {
+            'version': version,
+            'cities': sorted({lot.city for lot in lots}),
+            'pincodes': sorted({lot.pincode for lot in lots}),
+            'lots': lots,
+            'by_id': {lot.lot_id: lot for lot in lots},
+            'search': search_index,
+            'nearby': lot_index,
+        }
+
+    def _current(self):
+        now = time.monotonic()
+        data = self._data
+        if data is not None and now - self._checked_at < current_app.config.get('CATALOG_VERSION_CHECK', 5):
+            self.hits += 1
+            return data
+
+        version = self._db_version()
+        if data is not None and data['version'] >= version:
+            self.hits += 1
+            with self._lock:
+                self._checked_at = now
+            return data
+
+        with self._reload_lock:
+            # a reload that ran while we waited may already have this version or a newer one (our transaction
+            # can still see an older version than it did, versions only grow). the shared index is only ever
+            # synced forward, never back to an older copy
+            data = self._data
+            version = self._db_version()
+            if data is not None and data['version'] >= version:
+                self.hits += 1
+            else:
+                self.misses += 1
+                data = self._load(version, data)
+            with self._lock:
+                self._data = data
+                self._checked_at = now
+        return data
+
+    # -------- reads --------
+
+    def cities(self):
+        return self._current()['cities']
+
+    def pincodes(self):
+        return self._current()['pincodes']
+
+    def all_lots(self):
+        return self._current()['lots']
+
+    def get(self, lot_id):
+        return self._current()['by_id'].get(lot_id)
+
+    def find(self, city=None, pincode=None, text=None):
+        # same semantics as the old filter_by(city=...).filter_by(pincode=...) searches, with text the lots
+        # matching it (prefix/typo tolerant, best match first) narrowed down by city/pincode
+        if text:
+            data = self._current()
+            by_id = data['by_id']
+            # the index is shared with newer catalog copies, skip lots this copy doesn't know (same as nearest)
+            lots = [by_id[lot_id] for lot_id, _ in data['search'].search(text) if lot_id in by_id]
+        else:
+            lots = self.all_lots()
+        return [lot for lot in lots
+                if (not city or lot.city == city) and (not pincode or lot.pincode == pincode)]
+
+    def nearest(self, pincode, k, window=None, among=None):
+        """
+        [(lot, km)] of the k lots nearest to the pincode that have a free spot (for the window if given),
+        only lots whose id is in among if given. None when the pincode can't be located"""
+        location = locate_pincode(pincode)
+        if location is None:
+            return None
+        data = self._current()
+        by_id = data['by_id']
+        # the tree is shared with newer catalog copies, skip lots this copy doesn't know yet
+        def accept(lot_id):
+            lot = by_id.get(lot_id)
+            return lot is not None and (among is None or lot_id in among)
+
+        return [(by_id[lot_id], km) for lot_id, km in
+                nearest_lots_with_free_spots(data['nearby'], *location, k, window=window, accept=accept)]
+
+    def stats(self):
+        data = self._data
+        return {'hits': self.hits, 'misses': self.misses, 'version': data['version'] if data else None}
+
+    # -------- writes --------
+
+    def invalidate(self):
+        """
+        call before committing a lot add/edit/delete, the version bump is part of that transaction"""
+        bumped = db.session.execute(
+            update(CacheVersion)
+            .where(CacheVersion.name == CATALOG_VERSION_NAME)
+            .values(version=CacheVersion.version + 1)
+        ).rowcount
+        if not bumped:
+            db.session.add(CacheVersion(name=CATALOG_VERSION_NAME, version=1))
+        # keep the copy, the next read compares versions at once and syncs the search index and the k-d tree
+        # lot by lot like any other process does
+        with self._lock:
+            self._checked_at = 0
+
+
+lot_catalog = LotCatalog()
+
+
+# hit rate of the catalog on /admin/metrics, a miss is a reload from db
+def _catalog_metrics():
+    stats = lot_catalog.stats()
+    return [
+        ('parkalot_lot_catalog_hits_total', 'counter', "Lot catalog reads served from the in-process copy.", stats['hits']),
+        ('parkalot_lot_catalog_misses_total', 'counter', "Lot catalog reloads from the database.", stats['misses']),
+        ('parkalot_lot_catalog_version', 'gauge', "Catalog version loaded in this process (-1 before the first load).",
+         -1 if stats['version'] is None else stats['version']),
+    ]
+
+
+metrics_registry.add_collector(_catalog_metrics)
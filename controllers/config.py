@@ -7,3 +7,83 @@ load_dotenv()
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('SQLALCHEMY_DATABASE_URI')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS']= os.getenv('SQLALCHEMY_TRACK_MODIFICATIONS')
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY')
+
+#seconds after which the in-memory availability index of a lot is rebuilt from db
+app.config['AVAILABILITY_INDEX_TTL'] = int(os.getenv('AVAILABILITY_INDEX_TTL', 30))
+
+#'inprocess' runs the booking activation/expiry scheduler as a thread in each web process,
+#'worker' leaves it to a separate `flask run-scheduler` process
+app.config['BOOKING_SCHEDULER'] = os.getenv('BOOKING_SCHEDULER', 'inprocess')
+app.config['BOOKING_SCHEDULER_RESYNC'] = int(os.getenv('BOOKING_SCHEDULER_RESYNC', 60))
+
+#seconds between lot_counters drift checks/repairs done on the scheduler thread
+app.config['LOT_COUNTER_RECONCILE'] = int(os.getenv('LOT_COUNTER_RECONCILE', 3600))
+
+#log a warning whenever a template lazy loads a relationship (defaults to on in debug mode)
+if os.getenv('WARN_TEMPLATE_LAZY_LOADS') is not None:
+    app.config['WARN_TEMPLATE_LAZY_LOADS'] = os.getenv('WARN_TEMPLATE_LAZY_LOADS') == 'True'
+
+#rows per page on the user booking history page
+app.config['HISTORY_PAGE_SIZE'] = int(os.getenv('HISTORY_PAGE_SIZE', 25))
+
+#identity cache used by user_access_required (seconds an entry is trusted, max number of users kept)
+app.config['AUTH_USER_CACHE_TTL'] = int(os.getenv('AUTH_USER_CACHE_TTL', 60))
+app.config['AUTH_USER_CACHE_SIZE'] = int(os.getenv('AUTH_USER_CACHE_SIZE', 1024))
+
+#seconds a worker trusts its cached lot catalog before comparing it with the version stored in db
+app.config['CATALOG_VERSION_CHECK'] = int(os.getenv('CATALOG_VERSION_CHECK', 5))
+
+#spot given to a new booking in lots without their own setting: 'best_fit' (smallest gaps) or 'first_free'
+app.config['SPOT_ASSIGNMENT_STRATEGY'] = os.getenv('SPOT_ASSIGNMENT_STRATEGY', 'best_fit')
+
+#lots listed by the "nearest to pincode" search (nearest ones that have a free spot)
+app.config['NEAREST_LOTS_K'] = int(os.getenv('NEAREST_LOTS_K', 5))
+
+#expired bookings moved to history per transaction
+app.config['ARCHIVE_CHUNK_SIZE'] = int(os.getenv('ARCHIVE_CHUNK_SIZE', 500))
+
+#database engine: sqlite pragmas set on every connection (ignored for server databases)
+app.config['DB_SQLITE_JOURNAL_MODE'] = os.getenv('DB_SQLITE_JOURNAL_MODE', 'WAL')
+app.config['DB_SQLITE_SYNCHRONOUS'] = os.getenv('DB_SQLITE_SYNCHRONOUS', 'NORMAL')
+app.config['DB_SQLITE_CACHE_SIZE'] = int(os.getenv('DB_SQLITE_CACHE_SIZE', -20000))   #negative = KiB i.e 20MB
+app.config['DB_BUSY_TIMEOUT_MS'] = int(os.getenv('DB_BUSY_TIMEOUT_MS', 5000))
+
+#connection pool per process (pool_recycle seconds only used for server databases)
+app.config['DB_POOL_SIZE'] = int(os.getenv('DB_POOL_SIZE', 10))
+app.config['DB_MAX_OVERFLOW'] = int(os.getenv('DB_MAX_OVERFLOW', 20))
+app.config['DB_POOL_TIMEOUT'] = int(os.getenv('DB_POOL_TIMEOUT', 30))
+app.config['DB_POOL_RECYCLE'] = int(os.getenv('DB_POOL_RECYCLE', 1800))
+
+#per request wall/sql/template timing histograms exposed at /admin/metrics
+app.config['REQUEST_METRICS'] = os.getenv('REQUEST_METRICS', 'True') == 'True'
+
+#statements slower than SLOW_QUERY_MS are logged with their query plan (negative switches it off),
+#SLOW_QUERY_LOG defaults to instance/slow_queries.log
+app.config['SLOW_QUERY_MS'] = int(os.getenv('SLOW_QUERY_MS', 100))
+app.config['SLOW_QUERY_LOG'] = os.getenv('SLOW_QUERY_LOG')
+app.config['SLOW_QUERY_LOG_MAX_BYTES'] = int(os.getenv('SLOW_QUERY_LOG_MAX_BYTES', 5 * 1024 * 1024))
+app.config['SLOW_QUERY_LOG_BACKUPS'] = int(os.getenv('SLOW_QUERY_LOG_BACKUPS', 3))
+
+#password hashing: werkzeug method string (stored hashes with other parameters are upgraded on login),
+#threads hashing in parallel, hashes allowed to wait/run at once and seconds a request waits for a slot
+app.config['PASSWORD_HASH_METHOD'] = os.getenv('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+app.config['PASSWORD_HASH_WORKERS'] = int(os.getenv('PASSWORD_HASH_WORKERS', 2))
+app.config['PASSWORD_HASH_MAX_PENDING'] = int(os.getenv('PASSWORD_HASH_MAX_PENDING', 32))
+app.config['PASSWORD_HASH_WAIT'] = int(os.getenv('PASSWORD_HASH_WAIT', 10))
+
+#live spot grid (server-sent events): seconds between reads of the spot_event log per process, seconds between
+#keepalives on an idle stream, open streams allowed per process and seconds events are kept before pruning.
+#every open stream holds a server thread: keep SPOT_EVENTS_MAX_STREAMS below the threads a process serves with
+#(sync workers would be used up by a few admin screens, run a threaded server, see README)
+app.config['SPOT_EVENTS_POLL'] = float(os.getenv('SPOT_EVENTS_POLL', 1.0))
+app.config['SPOT_EVENTS_HEARTBEAT'] = int(os.getenv('SPOT_EVENTS_HEARTBEAT', 15))
+app.config['SPOT_EVENTS_MAX_STREAMS'] = int(os.getenv('SPOT_EVENTS_MAX_STREAMS', 200))
+app.config['SPOT_EVENTS_KEEP'] = int(os.getenv('SPOT_EVENTS_KEEP', 3600))
+#seconds between prunings (scheduler), messages a slow stream may have queued before it is told to resync,
+#log rows read per query, client reconnect delay (ms) and seconds a skipped (not yet committed) event id is
+#looked for again before it is given up
+app.config['SPOT_EVENTS_PRUNE'] = int(os.getenv('SPOT_EVENTS_PRUNE', 600))
+app.config['SPOT_EVENTS_BACKLOG'] = int(os.getenv('SPOT_EVENTS_BACKLOG', 500))
+app.config['SPOT_EVENTS_BATCH'] = int(os.getenv('SPOT_EVENTS_BATCH', 1000))
+app.config['SPOT_EVENTS_RETRY_MS'] = int(os.getenv('SPOT_EVENTS_RETRY_MS', 3000))
+app.config['SPOT_EVENTS_GAP_GRACE'] = int(os.getenv('SPOT_EVENTS_GAP_GRACE', 10))
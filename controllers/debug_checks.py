@@ -0,0 +1,37 @@
+from flask import g, has_request_context, before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+
+# --------------------------- debug mode warning for lazy loads triggered from templates -------------------------------------
+
+# a template like user_history.html that reads record.spot_obj.lot.address on every row fires 2 lazy
+# loads per row unless the route eager loads those relationships. in debug mode (or with
+# WARN_TEMPLATE_LAZY_LOADS=True) every such lazy load is logged with the template and the attribute.
+
+def warn_on_template_lazy_loads(app):
+
+    def enabled():
+        return app.config.get('WARN_TEMPLATE_LAZY_LOADS', app.debug)
+
+    @before_render_template.connect_via(app)
+    def _template_started(sender, template, context, **extra):
+        if enabled():
+            g.rendering_template = template.name
+
+    @template_rendered.connect_via(app)
+    def _template_finished(sender, template, context, **extra):
+        g.pop('rendering_template', None)
+
+    @event.listens_for(Session, 'do_orm_execute')
+    def _check_lazy_load(orm_execute_state):
+        if not orm_execute_state.is_relationship_load or orm_execute_state.lazy_loaded_from is None:
+            return
+        if not has_request_context() or 'rendering_template' not in g:
+            return
+        parent = orm_execute_state.lazy_loaded_from
+        loaded = ", ".join(mapper.class_.__name__ for mapper in orm_execute_state.all_mappers)
+        app.logger.warning(
+            "lazy load of %s from %s while rendering %s, eager load it in the route",
+            loaded, parent.class_.__name__, g.rendering_template
+        )
@@ -1,6 +1,6 @@
 from functools import wraps
 from flask import flash, redirect, url_for, abort, session, current_app
-from models.dbmodel import User 
+from .auth_context import load_auth_user
 from slugify import slugify 
 
 
@@ -42,6 +42,7 @@ def only_user(f):
 #for checking if user_id present in url, 1
 #for checking if a user with that user_id exists in db, 2
 #for checking if user_id in url is that of currently logged in user in session or not, 3
+#the user is loaded at most once per request and normally comes from the identity cache (auth_context.py)
 def user_access_required(f):
     @wraps(f)
     def wrapper(*args, **kwargs):
@@ -54,7 +55,7 @@ def user_access_required(f):
             )
             abort(500, description="Internal error: User ID missing from URL.")
         #2
-        user = User.query.get(user_id_from_url)  
+        user = load_auth_user(user_id_from_url)  
         if not user:
             flash("User not found!", "danger")
             return redirect(url_for('login'))
@@ -64,7 +65,7 @@ def user_access_required(f):
             flash(f"Session changed! Please login again", "warning")
             return redirect(url_for('login'))
             
-        # if all checks pass, inject the user object
+        # if all checks pass, inject the user identity (AuthUser, read only)
         kwargs['user'] = user 
         return f(*args, **kwargs)
     return wrapper
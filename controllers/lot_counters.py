@@ -0,0 +1,114 @@
+from sqlalchemy import update, select, func
+
+from app import app
+from models.dbmodel import db, ParkingLot, ParkingSpot, UserBookings, LotCounters
+
+
+# --------------------------- incrementally maintained per lot counters -------------------------------------
+
+# every route that adds/deletes spots, changes a spot status or creates/removes a booking calls
+# bump_lot_counters() before its commit, so counters change in the same transaction as the data.
+# the increments are done in sql (x = x + n) so concurrent requests don't overwrite each other.
+# every bump also increments the lot's version, which the admin spot grid uses as its ETag.
+
+def bump_lot_counters(lot_id, total=0, occupied=0, booked=0):
+    if not (total or occupied or booked):
+        return
+    db.session.execute(
+        update(LotCounters)
+        .where(LotCounters.lot_id == lot_id)
+        .values(
+            total_spots=LotCounters.total_spots + total,
+            occupied_spots=LotCounters.occupied_spots + occupied,
+            booked_spots=LotCounters.booked_spots + booked,
+            version=LotCounters.version + 1
+        )
+    )
+
+
+def create_lot_counters(lot_id, total=0):
+    # for a newly added lot
+    db.session.add(LotCounters(lot_id=lot_id, total_spots=total, occupied_spots=0, booked_spots=0))
+
+
+# --------------------------- reconciliation -------------------------------------
+
+def _actual_counts():
+    actual = {lot_id: {'total_spots': 0, 'occupied_spots': 0, 'booked_spots': 0}
+              for (lot_id,) in db.session.query(ParkingLot.lot_id).all()}
+
+    for lot_id, status, count in (
+        db.session.query(ParkingSpot.lot_id, ParkingSpot.status, func.count(ParkingSpot.spot_id))
+        .group_by(ParkingSpot.lot_id, ParkingSpot.status)
+        .all()
+    ):
+        if lot_id in actual:
+            actual[lot_id]['total_spots'] += count
+            if status == 'O':
+                actual[lot_id]['occupied_spots'] += count
+
+    for lot_id, count in (
+        db.session.query(ParkingSpot.lot_id, func.count(UserBookings.id))
+        .join(UserBookings, UserBookings.spot_id == ParkingSpot.spot_id)
+        .group_by(ParkingSpot.lot_id)
+        .all()
+    ):
+        if lot_id in actual:
+            actual[lot_id]['booked_spots'] = count
+
+    return actual
+
+
+def reconcile_lot_counters(repair=True):
+    """
+    compares lot_counters with counts computed from parking_spot/user_bookings and returns a list of
+    drift reports {'lot_id', 'field', 'stored', 'actual'} (stored None means the row was missing).
+    with repair=True drifted rows are recomputed with one UPDATE per lot whose values are subqueries,
+    so a booking committed between detection and repair is still counted correctly"""
+
+    actual = _actual_counts()
+    stored = {row.lot_id: row for row in LotCounters.query.all()}
+    drift = []
+
+    for lot_id, counts in actual.items():
+        row = stored.get(lot_id)
+        if row is None:
+            drift.append({'lot_id': lot_id, 'field': 'row', 'stored': None, 'actual': counts})
+            if repair:
+                create_lot_counters(lot_id)
+            continue
+        for field, value in counts.items():
+            if getattr(row, field) != value:
+                drift.append({'lot_id': lot_id, 'field': field, 'stored': getattr(row, field), 'actual': value})
+
+    if repair and drift:
+        db.session.flush()
+        for lot_id in {d['lot_id'] for d in drift}:
+            db.session.execute(
+                update(LotCounters)
+                .where(LotCounters.lot_id == lot_id)
+                .values(
+                    total_spots=select(func.count(ParkingSpot.spot_id))
+                        .where(ParkingSpot.lot_id == lot_id).scalar_subquery(),
+                    occupied_spots=select(func.count(ParkingSpot.spot_id))
+                        .where(ParkingSpot.lot_id == lot_id, ParkingSpot.status == 'O').scalar_subquery(),
+                    booked_spots=select(func.count(UserBookings.id))
+                        .join(ParkingSpot, ParkingSpot.spot_id == UserBookings.spot_id)
+                        .where(ParkingSpot.lot_id == lot_id).scalar_subquery()
+                )
+            )
+        db.session.commit()
+
+    for d in drift:
+        app.logger.warning("lot counter drift: lot %s %s stored=%s actual=%s", d['lot_id'], d['field'], d['stored'], d['actual'])
+    return drift
+
+
+@app.cli.command('reconcile-counters')
+def reconcile_counters_command():
+    """Check lot_counters against the spot/booking tables and repair drift."""
+    drift = reconcile_lot_counters()
+    if not drift:
+        print("Lot counters are consistent.")
+    for d in drift:
+        print(f"lot {d['lot_id']}: {d['field']} stored={d['stored']} actual={d['actual']} (repaired)")
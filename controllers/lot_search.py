@@ -0,0 +1,185 @@
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+import re
+import threading
+
+
+# --------------------------- in-process prefix/typo tolerant text index over lots -------------------------------------
+
+# city, primelocation_name, address and pincode of every lot are split into lowercase words. a sorted
+# vocabulary gives prefix matches with two binary searches ("sect 18" finds "Sector 18 Plaza", "4000" the
+# 4000xx pincodes) and a trigram index over the vocabulary finds words within a small edit distance
+# ("gatewy" finds "Gateway"). every query word must match some word of the lot. the index lives in the lot
+# catalog (catalog.py) and is updated lot by lot whenever the catalog reloads after add/edit/delete_parking,
+# so the same code works for sqlite and server databases and never scans the lots table.
+
+SEARCH_FIELDS = ('city', 'primelocation_name', 'address', 'pincode')
+
+EXACT, PREFIX, FUZZY = 3, 2, 1     # score of a query word matching a lot word (steps of 1, see search)
+_WORD = re.compile(r"[^\W_]+")
+
+
+def words_of(text):
+    return _WORD.findall((text or '').lower())
+
+
+def max_typos(word):
+    # short words and numbers (pincodes, "sector 18") must match exactly, "4000" is not a typo of "5000"
+    if len(word) <= 3 or any(char.isdigit() for char in word):
+        return 0
+    return 1 if len(word) <= 7 else 2
+
+
+def _grams(word):
+    padded = '$' + word     # leading pad only, so a typo'd prefix still shares grams with the full word
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def within_distance(a, b, limit):
+    """
+    whether the optimal string alignment distance (levenshtein plus swapped neighbours) of a and b is
+    <= limit, stops as soon as a row is over the limit"""
+    if abs(len(a) - len(b)) > limit:
+        return False
+    previous, current = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        before, previous, current = previous, current, [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], before[j - 2] + 1)
+        if min(current) > limit:
+            return False
+    return current[-1] <= limit
+
+
+def _union(sets):
+    # the sets are postings of the index, never modify the result
+    if len(sets) == 1:
+        return sets[0]
+    return set().union(*sets)
+
+
+class LotSearchIndex:
+
+    def __init__(self, lots=()):
+        self._lock = threading.Lock()
+        self._words_of_lot = {}                 # lot_id -> set of words
+        self._postings = defaultdict(set)       # word -> lot_ids
+        self._vocabulary = []                   # sorted words, for prefix ranges
+        self._grams = defaultdict(set)          # trigram -> words
+        for lot in lots:
+            self._add(lot)
+
+    def __len__(self):
+        return len(self._words_of_lot)
+
+    # -------- updates --------
+
+    def _add(self, lot):
+        words = set()
+        for field in SEARCH_FIELDS:
+            words.update(words_of(str(getattr(lot, field))))
+        self._words_of_lot[lot.lot_id] = words
+        for word in words:
+            if not self._postings[word]:
+                insort(self._vocabulary, word)
+                for gram in _grams(word):
+                    self._grams[gram].add(word)
+            self._postings[word].add(lot.lot_id)
+
+    def _remove(self, lot_id):
+        for word in self._words_of_lot.pop(lot_id, ()):
+            postings = self._postings[word]
+            postings.discard(lot_id)
+            if not postings:
+                del self._postings[word]
+                del self._vocabulary[bisect_left(self._vocabulary, word)]
+                for gram in _grams(word):
+                    self._grams[gram].discard(word)
+
+    def put(self, lot):
+        """
+        adds a lot or re-indexes it after an edit"""
+        with self._lock:
+            self._remove(lot.lot_id)
+            self._add(lot)
+
+    def remove(self, lot_id):
+        with self._lock:
+            self._remove(lot_id)
+
+    def sync(self, lots, previous_lots=None):
+        """
+        brings the index to the given lots, only re-indexing the ones that differ from previous_lots
+        ({lot_id: lot} the index was last synced with). returns number of lots (re)indexed or removed"""
+        previous_lots = previous_lots or {}
+        current = {lot.lot_id: lot for lot in lots}
+        changed = 0
+        with self._lock:
+            for lot_id in set(self._words_of_lot) - set(current):
+                self._remove(lot_id)
+                changed += 1
+            for lot_id, lot in current.items():
+                if lot_id not in self._words_of_lot or previous_lots.get(lot_id) != lot:
+                    self._remove(lot_id)
+                    self._add(lot)
+                    changed += 1
+        return changed
+
+    # -------- queries --------
+
+    def _matches(self, query_word):
+        """
+        (lots with a word equal to query_word, lots with a word starting with it, lots with a word close to it)
+        as sets, built with set unions so a common prefix doesn't cost a python loop per lot"""
+        start = bisect_left(self._vocabulary, query_word)
+        end = bisect_left(self._vocabulary, query_word + '\uffff')
+        exact = self._postings.get(query_word, set())
+        prefixed = _union([self._postings[word] for word in self._vocabulary[start:end]])
+
+        close_words = []
+        limit = max_typos(query_word)
+        if limit:
+            grams = _grams(query_word)
+            shared = defaultdict(int)
+            for gram in grams:
+                for word in self._grams.get(gram, ()):
+                    shared[word] += 1
+            # a typo breaks at most 3 grams, swapped letters at most 4
+            needed = max(1, len(grams) - 4 * limit)
+            close_words = [
+                word for word, count in shared.items()
+                if count >= needed and not word.startswith(query_word)
+                and (within_distance(query_word, word, limit) or within_distance(query_word, word[:len(query_word)], limit))
+            ]
+        close = _union([self._postings[word] for word in close_words])
+        return exact, prefixed, close
+
+    def search(self, text, limit=None):
+        """
+        [(lot_id, score)] of the lots matching every word of text, best first"""
+        query_words = list(dict.fromkeys(words_of(text)))
+        if not query_words:
+            return []
+        with self._lock:   # the match sets are live postings, finish with them before an update can run
+            matches = [self._matches(query_word) for query_word in query_words]
+            candidates = None
+            for exact, prefixed, close in matches:
+                matching = prefixed | close      # prefixed includes exact
+                candidates = matching if candidates is None else candidates & matching
+                if not candidates:
+                    return []
+
+            # every query word scores at least FUZZY, counted with set intersections instead of per lot lookups
+            bonus = Counter()
+            for exact, prefixed, close in matches:
+                bonus.update(candidates & prefixed)      # PREFIX - FUZZY
+                bonus.update(candidates & exact)         # EXACT - PREFIX
+
+        base = FUZZY * len(matches)
+        ranked = sorted(candidates, key=lambda lot_id: (-bonus[lot_id], lot_id))
+        if limit:
+            ranked = ranked[:limit]
+        return [(lot_id, base + bonus[lot_id]) for lot_id in ranked]
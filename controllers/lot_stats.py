@@ -0,0 +1,84 @@
+from datetime import datetime
+
+from sqlalchemy import select, exists, func
+from models.dbmodel import db, LotCounters, ParkingSpot, UserBookings
+
+
+# --------------------------- per lot statistics for dashboard / search pages -------------------------------------
+
+def lots_with_stats(lots, with_booked_count=False, window=None):
+    """
+    returns one dict per lot (ParkingLot rows or catalog LotInfo) with
+    'lot', 'total_spots', 'occupied_physical_spots', optionally 'booked_spots_count'
+    (current + future bookings i.e spots unavailable for new bookings right now) and, when a
+    (parking_time, leaving_time) window is given, 'free_spots_for_window'.
+    the counts are read from the incrementally maintained lot_counters rows in a single query,
+    no matter how many lots are listed"""
+
+    lot_ids = [lot.lot_id for lot in lots]
+    if not lot_ids:
+        return []
+
+    query = db.session.query(LotCounters.lot_id, LotCounters.total_spots, LotCounters.occupied_spots, LotCounters.booked_spots)
+    if len(lot_ids) <= 500:     # for big listings (dashboard) reading the whole small table beats a huge IN list
+        query = query.filter(LotCounters.lot_id.in_(lot_ids))
+    counters = {row[0]: row[1:] for row in query.all()}
+    free_for_window = free_spots_for_window(lot_ids, *window) if window else None
+    # booked_spots still counts bookings whose leaving_time just passed until the scheduler archives them,
+    # the page shows only bookings that are not expired (leaving_time > now). those few come from the
+    # leaving_time index
+    expired_not_archived = expired_bookings_per_lot(lot_ids) if with_booked_count else {}
+
+    result = []
+    for lot in lots:
+        # a lot without counters row yet (db older than lot_counters) shows 0 until reconciliation
+        total_spots, occupied_spots, booked_spots = counters.get(lot.lot_id, (0, 0, 0))
+        stats = {
+            'lot': lot,
+            'total_spots': total_spots,
+            'occupied_physical_spots': occupied_spots
+        }
+        if with_booked_count:
+            stats['booked_spots_count'] = booked_spots - expired_not_archived.get(lot.lot_id, 0)
+        if free_for_window is not None:
+            stats['free_spots_for_window'] = free_for_window.get(lot.lot_id, 0)
+        result.append(stats)
+    return result
+
+
+def expired_bookings_per_lot(lot_ids):
+    """
+    {lot_id: bookings whose leaving_time has passed but that are not archived yet}"""
+    query = (
+        select(ParkingSpot.lot_id, func.count(UserBookings.id))
+        .join(ParkingSpot, ParkingSpot.spot_id == UserBookings.spot_id)
+        .where(UserBookings.leaving_time <= datetime.now())
+        .group_by(ParkingSpot.lot_id)
+    )
+    if len(lot_ids) <= 500:
+        query = query.where(ParkingSpot.lot_id.in_(lot_ids))
+    return dict(db.session.execute(query).all())
+
+
+def free_spots_for_window(lot_ids, parking_time, leaving_time):
+    """
+    {lot_id: number of spots with no booking overlapping [parking_time, leaving_time)} for all the lots in one
+    query (lots without a free spot are left out). same overlap test as the booking allocator, answered
+    from the (spot_id, parking_time, leaving_time) index"""
+    if not lot_ids:
+        return {}
+    overlapping = exists().where(
+        UserBookings.spot_id == ParkingSpot.spot_id,
+        UserBookings.parking_time < leaving_time,
+        UserBookings.leaving_time > parking_time
+    )
+    return dict(db.session.execute(
+        select(ParkingSpot.lot_id, func.count())
+        .where(ParkingSpot.lot_id.in_(lot_ids), ~overlapping)
+        .group_by(ParkingSpot.lot_id)
+    ).all())
+
+
+def rank_by_window_availability(stats):
+    # most free spots for the window first, cheaper lot first among equally free ones
+    return sorted(stats, key=lambda s: (-s['free_spots_for_window'], s['lot'].price_per_hr, s['lot'].lot_id))
@@ -0,0 +1,154 @@
+from bisect import bisect_left
+import threading
+import time
+
+from flask import g, request, has_request_context, before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+# --------------------------- per request performance metrics (prometheus text format) -------------------------------------
+
+# every request records wall time, number of sql statements, time spent in sql and time spent rendering
+# templates, labelled by flask endpoint (not url, so /admin/parking_spots/1 and /2 share one series).
+# sql is timed with engine cursor events, templates with flask's render signals. the histograms are
+# exposed at /admin/metrics, percentiles come from histogram_quantile() on the dashboard.
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250, 500, 1000)
+
+HISTOGRAMS = [
+    # (name, help, buckets, per request value key)
+    ('parkalot_request_duration_seconds', "Wall time of a request.", SECONDS_BUCKETS, 'duration'),
+    ('parkalot_request_sql_statements', "SQL statements executed by a request.", STATEMENT_BUCKETS, 'sql_count'),
+    ('parkalot_request_sql_seconds', "Time a request spent executing SQL.", SECONDS_BUCKETS, 'sql_time'),
+    ('parkalot_request_template_seconds', "Time a request spent rendering templates.", SECONDS_BUCKETS, 'template_time'),
+]
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'total', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)   # per bucket, made cumulative on export
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+        self.total += value
+        self.count += 1
+
+
+class MetricsRegistry:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}       # (metric name, endpoint) -> Histogram
+        self._requests = {}         # (endpoint, method, status) -> count
+        self._collectors = []       # functions returning [(name, type, help, value)], read on every scrape
+
+    def record(self, endpoint, method, status, values):
+        with self._lock:
+            key = (endpoint, method, status)
+            self._requests[key] = self._requests.get(key, 0) + 1
+            for name, _, buckets, value_key in HISTOGRAMS:
+                histogram = self._histograms.get((name, endpoint))
+                if histogram is None:
+                    histogram = self._histograms[(name, endpoint)] = Histogram(buckets)
+                histogram.observe(values[value_key])
+
+    def add_collector(self, collect):
+        """
+        publishes values kept by other components (cache hit counters, ...), collect() returns
+        [(metric name, 'counter' or 'gauge', help, value)]"""
+        self._collectors.append(collect)
+
+    def render(self):
+        """
+        all metrics in prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            lines.append("# HELP parkalot_requests_total Requests handled.")
+            lines.append("# TYPE parkalot_requests_total counter")
+            for (endpoint, method, status), count in sorted(self._requests.items()):
+                lines.append(f'parkalot_requests_total{{endpoint="{endpoint}",method="{method}",status="{status}"}} {count}')
+
+            for name, help_text, _, _ in HISTOGRAMS:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} histogram")
+                for (metric, endpoint), histogram in sorted(self._histograms.items()):
+                    if metric != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{{endpoint="{endpoint}",le="{bound:g}"}} {cumulative}')
+                    lines.append(f'{name}_bucket{{endpoint="{endpoint}",le="+Inf"}} {histogram.count}')
+                    lines.append(f'{name}_sum{{endpoint="{endpoint}"}} {histogram.total:.6f}')
+                    lines.append(f'{name}_count{{endpoint="{endpoint}"}} {histogram.count}')
+
+        for collect in self._collectors:
+            for name, kind, help_text, value in collect():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+metrics_registry = MetricsRegistry()
+
+
+def init_request_metrics(app):
+    """
+    hooks the request, template and sql timing into the app (called from app.py)"""
+
+    def enabled():
+        return app.config.get('REQUEST_METRICS', True)
+
+    @app.before_request
+    def _start_request_metrics():
+        if enabled():
+            g.metrics = {'started': time.perf_counter(), 'sql_count': 0, 'sql_time': 0.0,
+                         'template_time': 0.0, 'template_started': []}
+
+    @app.after_request
+    def _note_status(response):
+        if 'metrics' in g:
+            g.metrics['status'] = response.status_code
+        return response
+
+    @app.teardown_request
+    def _finish_request_metrics(exc):
+        metrics = g.pop('metrics', None)
+        if metrics is None:
+            return
+        metrics['duration'] = time.perf_counter() - metrics['started']
+        metrics_registry.record(
+            request.endpoint or 'unmatched', request.method,
+            metrics.get('status', 500), metrics
+        )
+
+    @before_render_template.connect_via(app)
+    def _template_started(sender, template, context, **extra):
+        if 'metrics' in g:
+            g.metrics['template_started'].append(time.perf_counter())
+
+    @template_rendered.connect_via(app)
+    def _template_finished(sender, template, context, **extra):
+        if 'metrics' in g and g.metrics['template_started']:
+            g.metrics['template_time'] += time.perf_counter() - g.metrics['template_started'].pop()
+
+    # every engine, so it works whatever database the app is configured with
+    @event.listens_for(Engine, 'before_cursor_execute')
+    def _sql_started(conn, cursor, statement, parameters, context, executemany):
+        conn.info['metrics_sql_started'] = time.perf_counter()   # statements on one connection run one at a time
+
+    @event.listens_for(Engine, 'after_cursor_execute')
+    def _sql_finished(conn, cursor, statement, parameters, context, executemany):
+        if has_request_context() and 'metrics' in g:
+            g.metrics['sql_count'] += 1
+            g.metrics['sql_time'] += time.perf_counter() - conn.info.get('metrics_sql_started', time.perf_counter())
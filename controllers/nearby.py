@@ -0,0 +1,243 @@
+import csv
+from heapq import heappush, heappop
+from itertools import count
+import math
+import os
+import threading
+
+import click
+from sqlalchemy import select, update
+from app import app
+from models.dbmodel import db, LotCounters, ParkingLot, PincodeLocation
+
+
+# --------------------------- nearest lots by pincode -------------------------------------
+
+# pincodes are located with the pincode_location table (loaded from a local csv with `flask load-pincodes`,
+# a 6 digit pincode falls back to its 3 digit sorting district). every lot stores the coordinates of its
+# pincode, set by add/edit_parking. the lot catalog keeps a k-d tree over the lots' positions as points on
+# the unit sphere, where straight line (chord) distance orders lots exactly like the real distance. it is
+# updated lot by lot when the catalog reloads, and walked best first so lots come out nearest first until
+# enough of them have free spots.
+
+BUNDLED_PINCODES = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'models', 'pincode_locations.csv')
+EARTH_RADIUS_KM = 6371.0
+
+
+def to_unit_vector(latitude, longitude):
+    lat, lon = math.radians(latitude), math.radians(longitude)
+    return (math.cos(lat) * math.cos(lon), math.cos(lat) * math.sin(lon), math.sin(lat))
+
+
+def chord_to_km(chord):
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, chord / 2))
+
+
+# -------- pincode coordinates --------
+
+def locate_pincode(pincode):
+    """
+    (latitude, longitude) of the pincode, or of its 3 digit district, or None"""
+    pincode = (pincode or '').strip()
+    if not pincode:
+        return None
+    rows = dict((row.pincode, (row.latitude, row.longitude)) for row in db.session.execute(
+        select(PincodeLocation).where(PincodeLocation.pincode.in_({pincode, pincode[:3]}))
+    ).scalars())
+    return rows.get(pincode) or rows.get(pincode[:3])
+
+
+def load_pincode_locations(path=BUNDLED_PINCODES):
+    """
+    upserts pincode,latitude,longitude rows from a csv (extra columns are ignored), caller commits.
+    returns number of rows read"""
+    with open(path, newline='') as csv_file:
+        rows = {row['pincode'].strip(): (float(row['latitude']), float(row['longitude'])) for row in csv.DictReader(csv_file)}
+    existing = set(db.session.execute(select(PincodeLocation.pincode).where(PincodeLocation.pincode.in_(rows))).scalars())
+    for pincode, (latitude, longitude) in rows.items():
+        if pincode in existing:
+            db.session.execute(update(PincodeLocation).where(PincodeLocation.pincode == pincode)
+                               .values(latitude=latitude, longitude=longitude))
+        else:
+            db.session.add(PincodeLocation(pincode=pincode, latitude=latitude, longitude=longitude))
+    return len(rows)
+
+
+def locate_lots(only_missing=True):
+    """
+    sets latitude/longitude of the lots from their pincode, caller commits and invalidates the catalog.
+    returns number of lots located"""
+    query = select(ParkingLot.lot_id, ParkingLot.pincode)
+    if only_missing:
+        query = query.where(ParkingLot.latitude.is_(None))
+    located = 0
+    cache = {}
+    for lot_id, pincode in db.session.execute(query).all():
+        if pincode not in cache:
+            cache[pincode] = locate_pincode(pincode)
+        if cache[pincode]:
+            db.session.execute(update(ParkingLot).where(ParkingLot.lot_id == lot_id)
+                               .values(latitude=cache[pincode][0], longitude=cache[pincode][1]))
+            located += 1
+    return located
+
+
+# -------- spatial index --------
+
+class _Node:
+    __slots__ = ('point', 'lot_id', 'axis', 'left', 'right', 'alive')
+
+    def __init__(self, point, lot_id, axis):
+        self.point, self.lot_id, self.axis = point, lot_id, axis
+        self.left = self.right = None
+        self.alive = True
+
+
+class LotKDTree:
+    """
+    k-d tree of lot positions. lots are inserted as they come and removed by marking their node dead,
+    the tree is rebuilt balanced once most of its nodes are dead or it got too deep"""
+
+    def __init__(self, lots=()):
+        self._lock = threading.Lock()
+        self._build([(to_unit_vector(lot.latitude, lot.longitude), lot.lot_id) for lot in lots if lot.latitude is not None])
+
+    def __len__(self):
+        return len(self._nodes)
+
+    # -------- updates --------
+
+    def _build(self, points):
+        self._nodes = {}          # lot_id -> live node
+        self._size = len(points)  # nodes in the tree, dead ones included
+        self._depth = 0
+
+        def build(items, depth):
+            if not items:
+                return None
+            axis = depth % 3
+            items.sort(key=lambda item: item[0][axis])
+            middle = len(items) // 2
+            node = _Node(items[middle][0], items[middle][1], axis)
+            self._nodes[node.lot_id] = node
+            self._depth = max(self._depth, depth + 1)
+            node.left = build(items[:middle], depth + 1)
+            node.right = build(items[middle + 1:], depth + 1)
+            return node
+
+        self._root = build(points, 0)
+
+    def _insert(self, lot_id, latitude, longitude):
+        point = to_unit_vector(latitude, longitude)
+        self._size += 1
+        parent, depth = None, 1
+        node = self._root
+        while node is not None:
+            parent, depth = node, depth + 1
+            node = node.left if point[node.axis] < node.point[node.axis] else node.right
+        child = _Node(point, lot_id, 0 if parent is None else (parent.axis + 1) % 3)
+        if parent is None:
+            self._root = child
+        elif point[parent.axis] < parent.point[parent.axis]:
+            parent.left = child
+        else:
+            parent.right = child
+        self._nodes[lot_id] = child
+        self._depth = max(self._depth, depth)
+
+    def _remove(self, lot_id):
+        node = self._nodes.pop(lot_id, None)
+        if node is not None:
+            node.alive = False
+
+    def _maybe_rebuild(self):
+        live = len(self._nodes)
+        if self._size > 2 * live + 16 or self._depth > 3 * max(1, live).bit_length() + 8:
+            self._build([(node.point, lot_id) for lot_id, node in self._nodes.items()])
+
+    def sync(self, lots, previous_lots=None):
+        """
+        brings the tree to the given lots, only moving the ones whose position differs from previous_lots
+        ({lot_id: lot} the tree was last synced with). returns number of lots inserted, moved or removed"""
+        previous_lots = previous_lots or {}
+        current = {lot.lot_id: lot for lot in lots if lot.latitude is not None}
+        changed = 0
+        with self._lock:
+            for lot_id in set(self._nodes) - set(current):
+                self._remove(lot_id)
+                changed += 1
+            for lot_id, lot in current.items():
+                previous = previous_lots.get(lot_id)
+                if (lot_id not in self._nodes or previous is None
+                        or (previous.latitude, previous.longitude) != (lot.latitude, lot.longitude)):
+                    self._remove(lot_id)
+                    self._insert(lot_id, lot.latitude, lot.longitude)
+                    changed += 1
+            self._maybe_rebuild()
+        return changed
+
+    # -------- queries --------
+
+    def nearest(self, latitude, longitude, limit, accept=None):
+        """
+        [(lot_id, km)] of the limit nearest lots (only lot_ids accepted by accept if given), nearest first.
+        best first walk of the tree: a subtree is only opened once nothing found so far can be nearer than
+        its side of the splitting plane, so taking k lots touches about log(n) + k nodes"""
+        target = to_unit_vector(latitude, longitude)
+        result = []
+        tie = count()
+        with self._lock:
+            heap = [(0.0, next(tie), self._root, None)] if self._root is not None else []
+            while heap and len(result) < limit:
+                bound, _, node, lot_id = heappop(heap)
+                if node is None:
+                    result.append((lot_id, chord_to_km(bound)))
+                    continue
+                if node.alive and (accept is None or accept(node.lot_id)):
+                    heappush(heap, (math.dist(target, node.point), next(tie), None, node.lot_id))
+                offset = target[node.axis] - node.point[node.axis]
+                near, far = (node.left, node.right) if offset < 0 else (node.right, node.left)
+                if near is not None:
+                    heappush(heap, (bound, next(tie), near, None))
+                if far is not None:
+                    heappush(heap, (max(bound, abs(offset)), next(tie), far, None))
+        return result
+
+
+def nearest_lots_with_free_spots(lot_index, latitude, longitude, k, window=None, accept=None):
+    """
+    [(lot_id, km)] of the k nearest lots that have a free spot, right now (lot_counters) or for the
+    (parking_time, leaving_time) window. nearest lots are taken from the tree in doubling batches and the
+    free counts of a batch are read in one query, so a full city costs a couple of queries, not one per lot"""
+    from .lot_stats import free_spots_for_window
+
+    found, checked = [], 0
+    limit = max(2 * k, 16)
+    while len(found) < k:
+        batch = lot_index.nearest(latitude, longitude, limit, accept)[checked:]
+        if not batch:
+            break
+        lot_ids = [lot_id for lot_id, _ in batch]
+        if window:
+            free = free_spots_for_window(lot_ids, *window)
+        else:
+            free = dict(db.session.execute(
+                select(LotCounters.lot_id, LotCounters.total_spots - LotCounters.occupied_spots)
+                .where(LotCounters.lot_id.in_(lot_ids))
+            ).all())
+        found += [(lot_id, km) for lot_id, km in batch if free.get(lot_id, 0) > 0]
+        checked, limit = checked + len(batch), limit * 2
+    return found[:k]
+
+
+@app.cli.command('load-pincodes')
+@click.argument('path', required=False)
+@click.option('--relocate', is_flag=True, help="recompute the position of every lot, not only unlocated ones")
+def load_pincodes_command(path, relocate):
+    """Load pincode coordinates from a csv (pincode,latitude,longitude) and locate the lots."""
+    from .catalog import lot_catalog
+    rows = load_pincode_locations(path or BUNDLED_PINCODES)
+    located = locate_lots(only_missing=not relocate)
+    lot_catalog.invalidate()
+    db.session.commit()
+    print(f"Loaded {rows} pincode locations, located {located} parking lots.")
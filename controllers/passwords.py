@@ -0,0 +1,69 @@
+from concurrent.futures import ThreadPoolExecutor
+import threading
+
+from werkzeug.security import generate_password_hash, check_password_hash
+from app import app
+
+
+# --------------------------- password hashing on a bounded pool -------------------------------------
+
+# scrypt/pbkdf2 are slow on purpose (and scrypt takes ~32MB per hash), so a burst of logins at shift change
+# used to eat every cpu core and request thread. hashes now run on a small thread pool of
+# PASSWORD_HASH_WORKERS threads (hashlib releases the GIL while hashing, so they run in parallel with
+# the other requests instead of starving them). at most PASSWORD_HASH_MAX_PENDING hashes may be queued or
+# running, a request that can't get a slot within PASSWORD_HASH_WAIT seconds gets PasswordHasherBusy and
+# is asked to try again. PASSWORD_HASH_METHOD is any werkzeug method string; stored hashes made with other
+# parameters are rehashed on the next successful login.
+
+class PasswordHasherBusy(Exception):
+    pass
+
+
+class PasswordHasher:
+
+    def __init__(self, app):
+        self.app = app
+        self._lock = threading.Lock()
+        self._executor = None        # created with the first hash, importing the app starts no threads
+        self._slots = None
+        self._method_prefixes = {}    # method -> hash prefix it produces
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.app.config.get('PASSWORD_HASH_WORKERS', 2), thread_name_prefix="password-hash"
+                )
+                self._slots = threading.BoundedSemaphore(self.app.config.get('PASSWORD_HASH_MAX_PENDING', 32))
+            return self._executor, self._slots
+
+    def _run(self, fn, *args):
+        executor, slots = self._pool()
+        if not slots.acquire(timeout=self.app.config.get('PASSWORD_HASH_WAIT', 10)):
+            raise PasswordHasherBusy()
+        try:
+            return executor.submit(fn, *args).result()
+        finally:
+            slots.release()
+
+    @property
+    def method(self):
+        return self.app.config.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, pass_hash, password):
+        return self._run(check_password_hash, pass_hash, password)
+
+    def needs_rehash(self, pass_hash):
+        """
+        whether a stored hash was made with other parameters than PASSWORD_HASH_METHOD"""
+        method = self.method
+        if method not in self._method_prefixes:
+            # werkzeug fills in default parameters ('scrypt' -> 'scrypt:32768:8:1'), compare the full form
+            self._method_prefixes[method] = self._run(generate_password_hash, '', method).split('$', 1)[0]
+        return pass_hash.split('$', 1)[0] != self._method_prefixes[method]
+
+
+password_hasher = PasswordHasher(app)
@@ -0,0 +1,188 @@
+from collections import defaultdict
+from decimal import Decimal
+import time
+
+from sqlalchemy import select, delete, update, func
+from sqlalchemy.dialects import sqlite, postgresql
+from app import app
+from models.dbmodel import db, ParkingLot, ParkingSpot, UserHistory, LotDailyRollup, UserLotRollup, RollupTotal
+
+
+# --------------------------- booking rollups for the summary pages -------------------------------------
+
+# rollup_lot_day (lot, day) and rollup_user_lot (user, lot) hold booking count, total parking_cost and total
+# hours of everything in booking_history. every path that moves bookings to history (archival, release/cancel)
+# deletes the bookings first and passes the rows it really deleted to add_to_rollups(), in the same transaction,
+# so the summary pages never have to group booking_history and a booking is never counted twice.
+# rebuild_rollups() recomputes both from history. deleting a lot drops its rollups, deleting an account drops
+# the user's rows but keeps the per day lot totals (the parkings did happen).
+# the number of booking_history rows is kept exactly in rollup_total, the per lot rollups leave out history
+# whose spot or lot was deleted and still count the history of deleted accounts.
+
+UPSERT_INSERTS = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+HISTORY_TOTAL = 'history'
+
+
+def _aggregate(rows):
+    """
+    rows of (user_id, lot_id, start, end, parking_cost) -> (per (lot_id, day), per (user_id, lot_id)) dicts of
+    [bookings, parking_cost, hours]"""
+    per_lot_day = defaultdict(lambda: [0, Decimal(0), 0.0])
+    per_user_lot = defaultdict(lambda: [0, Decimal(0), 0.0])
+    for user_id, lot_id, start, end, parking_cost in rows:
+        hours = (end - start).total_seconds() / 3600
+        for totals in (per_lot_day[(lot_id, start.date())], per_user_lot[(user_id, lot_id)]):
+            totals[0] += 1
+            totals[1] += Decimal(str(parking_cost))
+            totals[2] += hours
+    return per_lot_day, per_user_lot
+
+
+def _increment(model, key_names, aggregated):
+    if not aggregated:
+        return
+    rows = [dict(zip(key_names, key), bookings=b, parking_cost=c, hours=h) for key, (b, c, h) in aggregated.items()]
+    dialect_insert = UPSERT_INSERTS.get(db.engine.dialect.name)
+
+    if dialect_insert:
+        statement = dialect_insert(model)
+        statement = statement.on_conflict_do_update(
+            index_elements=key_names,
+            set_={
+                'bookings': model.bookings + statement.excluded.bookings,
+                'parking_cost': model.parking_cost + statement.excluded.parking_cost,
+                'hours': model.hours + statement.excluded.hours,
+            }
+        )
+        db.session.execute(statement, rows)
+        return
+
+    # other backends: update, insert the rows that didn't exist yet
+    for row in rows:
+        keys = [getattr(model, name) == row[name] for name in key_names]
+        updated = db.session.execute(
+            update(model).where(*keys).values(
+                bookings=model.bookings + row['bookings'],
+                parking_cost=model.parking_cost + row['parking_cost'],
+                hours=model.hours + row['hours'],
+            )
+        ).rowcount
+        if not updated:
+            db.session.add(model(**row))
+
+
+def _add_history_total(delta):
+    if not delta:
+        return
+    updated = db.session.execute(
+        update(RollupTotal).where(RollupTotal.name == HISTORY_TOTAL).values(bookings=RollupTotal.bookings + delta)
+    ).rowcount
+    if not updated:
+        db.session.add(RollupTotal(name=HISTORY_TOTAL, bookings=delta))
+
+
+def set_history_total():
+    """
+    recounts booking_history into rollup_total, caller commits"""
+    total = db.session.execute(select(func.count(UserHistory.id))).scalar()
+    db.session.execute(delete(RollupTotal).where(RollupTotal.name == HISTORY_TOTAL))
+    db.session.add(RollupTotal(name=HISTORY_TOTAL, bookings=total))
+    return total
+
+
+def add_to_rollups(rows, history_rows=None):
+    """
+    adds bookings given as (user_id, lot_id, parking_time, leaving_time, parking_cost) rows to the rollups. call
+    in the transaction that moves those bookings to booking_history, after it claimed them, caller commits.
+    history_rows: rows written to booking_history when it's not len(rows) (bookings whose spot is gone)"""
+    per_lot_day, per_user_lot = _aggregate(rows)
+    _increment(LotDailyRollup, ['lot_id', 'day'], per_lot_day)
+    _increment(UserLotRollup, ['user_id', 'lot_id'], per_user_lot)
+    _add_history_total(len(rows) if history_rows is None else history_rows)
+
+
+def drop_lot_rollups(lot_id):
+    db.session.execute(delete(LotDailyRollup).where(LotDailyRollup.lot_id == lot_id))
+    db.session.execute(delete(UserLotRollup).where(UserLotRollup.lot_id == lot_id))
+
+
+def drop_user_rollups(user_id, history_rows):
+    """
+    for a deleted account whose history_rows booking_history rows were deleted"""
+    db.session.execute(delete(UserLotRollup).where(UserLotRollup.user_id == user_id))
+    _add_history_total(-history_rows)
+
+
+def rebuild_rollups(batch_size=50000):
+    """
+    recomputes both rollup tables from booking_history (history rows whose spot was deleted can't be
+    attributed to a lot and are left out, same as the old summary queries) and recounts the history total.
+    commits, returns stats"""
+    started = time.perf_counter()
+    db.session.execute(delete(LotDailyRollup))
+    db.session.execute(delete(UserLotRollup))
+
+    rows = db.session.execute(
+        select(UserHistory.user_id, ParkingSpot.lot_id, UserHistory.booking_time,
+               UserHistory.leaving_time, UserHistory.parking_cost)
+        .join(ParkingSpot, ParkingSpot.spot_id == UserHistory.spot_id)
+        .execution_options(yield_per=batch_size)
+    )
+    history_rows = 0
+    per_lot_day, per_user_lot = defaultdict(lambda: [0, Decimal(0), 0.0]), defaultdict(lambda: [0, Decimal(0), 0.0])
+    for batch in rows.partitions():
+        history_rows += len(batch)
+        lot_day, user_lot = _aggregate(batch)
+        for target, source in ((per_lot_day, lot_day), (per_user_lot, user_lot)):
+            for key, (b, c, h) in source.items():
+                totals = target[key]
+                totals[0] += b
+                totals[1] += c
+                totals[2] += h
+
+    _increment(LotDailyRollup, ['lot_id', 'day'], per_lot_day)
+    _increment(UserLotRollup, ['user_id', 'lot_id'], per_user_lot)
+    set_history_total()
+    db.session.commit()
+    return {'history_rows': history_rows, 'lot_days': len(per_lot_day), 'user_lots': len(per_user_lot),
+            'seconds': round(time.perf_counter() - started, 2)}
+
+
+# --------------------------- summary page queries -------------------------------------
+
+def top_lots(limit=5, user_id=None):
+    """
+    [(primelocation_name, bookings)] of the most booked lots, overall or for one user"""
+    if user_id is None:
+        # summed per lot along the primary key first, names are joined to the 1 row per lot result
+        per_lot = (
+            select(LotDailyRollup.lot_id, func.sum(LotDailyRollup.bookings).label('bookings'))
+            .group_by(LotDailyRollup.lot_id)
+        )
+    else:
+        per_lot = select(UserLotRollup.lot_id, UserLotRollup.bookings).where(UserLotRollup.user_id == user_id)
+    per_lot = per_lot.subquery()
+
+    bookings = func.sum(per_lot.c.bookings)
+    return db.session.execute(
+        select(ParkingLot.primelocation_name, bookings)
+        .join(per_lot, per_lot.c.lot_id == ParkingLot.lot_id)
+        .group_by(ParkingLot.primelocation_name)
+        .order_by(bookings.desc())
+        .limit(limit)
+    ).all()
+
+
+def history_bookings_count():
+    # rows in booking_history, kept exactly by the paths that write or delete history
+    return db.session.execute(
+        select(RollupTotal.bookings).where(RollupTotal.name == HISTORY_TOTAL)
+    ).scalar() or 0
+
+
+@app.cli.command('rollups-backfill')
+def rollups_backfill_command():
+    """Recompute the booking rollup tables from booking history."""
+    stats = rebuild_rollups()
+    print(f"Rolled up {stats['history_rows']} history rows into {stats['lot_days']} lot/day and "
+          f"{stats['user_lots']} user/lot rows in {stats['seconds']}s.")
@@ -1,14 +1,34 @@
 from flask import render_template, request, redirect, url_for, flash, session
 from models.dbmodel import *
 from app import app
-from werkzeug.security import generate_password_hash, check_password_hash
 from slugify import slugify
 from datetime import datetime, timedelta
-from sqlalchemy import func
+from sqlalchemy import func, select, update, delete, exists
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import joinedload
 import json
 
 from .decorators import login_required, admin_required, only_user, user_access_required
+from .availability import availability_index
+from .scheduler import booking_scheduler
+from .lot_stats import lots_with_stats, rank_by_window_availability
+from .lot_counters import bump_lot_counters, create_lot_counters
+from .debug_checks import warn_on_template_lazy_loads
+from .slow_queries import log_slow_queries
+from .auth_context import invalidate_auth_user
+from .catalog import lot_catalog
+from .booking_allocator import booking_allocator
+from .rollups import add_to_rollups, drop_lot_rollups, drop_user_rollups, top_lots, history_bookings_count
+from .metrics import metrics_registry
+from .passwords import password_hasher, PasswordHasherBusy
+from .spot_grid import lot_spot_grid, lot_version, grid_etag
+from .spot_assignment import strategy_for, STRATEGIES, STRATEGY_LABELS
+from .spot_provisioning import provision_spots, remove_free_spots, MAX_SPOTS_PER_ACTION
+from .nearby import locate_pincode
+from .spot_events import spot_event_hub, record_spot_events, format_sse, RELEASED, DELETED
 app.permanent_session_lifetime = timedelta(minutes=10)   #set session lifetime to 10 minutes 
+warn_on_template_lazy_loads(app)
+log_slow_queries(app)
 
 
 # ---------------------------------------------PUBLIC ROUTES------------------------------------------------
@@ -57,10 +77,27 @@ def login():
         flash("User does not exist, Please register", "warning")
         return redirect(url_for('register'))
 
-    if not check_password_hash(user.pass_wd, password):
-        flash("Incorrect Password", "warning")
+    try:
+        if not password_hasher.verify(user.pass_wd, password):
+            flash("Incorrect Password", "warning")
+            return redirect(url_for('login'))
+    except PasswordHasherBusy:
+        flash("Too many sign-ins right now, please try again in a moment", "warning")
         return redirect(url_for('login'))
 
+    # hash parameters changed, upgrade the stored hash. best effort: a busy hasher or a db that can't store the
+    # new hash (pass_wd not widened yet, migration 10) must not reject a correct password, the upgrade is
+    # simply tried again on the next login
+    try:
+        if password_hasher.needs_rehash(user.pass_wd):
+            user.pass_wd = password_hasher.hash(password)
+            db.session.commit()
+    except PasswordHasherBusy:
+        pass
+    except SQLAlchemyError as error:
+        db.session.rollback()
+        app.logger.warning("password hash upgrade of user %s failed, run `flask db-upgrade`: %s", user.user_id, error)
+
     # Store user's session
     session['user_id'] = user.user_id
     session['username'] = user.user_name
@@ -96,7 +133,11 @@ def register():
         flash("A User with this email id already exists!", "warning")
         return redirect(url_for('register'))
 
-    passhash = generate_password_hash(password)
+    try:
+        passhash = password_hasher.hash(password)
+    except PasswordHasherBusy:
+        flash("Too many sign-ins right now, please try again in a moment", "warning")
+        return redirect(url_for('register'))
     new_user = User(email_id=email, pass_wd=passhash, user_name=username, is_admin=False)
     db.session.add(new_user)
     db.session.commit()
@@ -119,116 +160,44 @@ def logout():
 # NEW HELPER FUNCTION:
 # To update spot statuses
 # -----------------------------
-
-def update_spot_statuses_and_counts():
-    """
-    for when admin sees update occupied/available for everybody's bookings that had gone activated or expiered
-    in current time"""
-
-    now = datetime.now()
-    
-    messages_to_flash = []  
-
-    # --- activating bookings  ---
-    bookings_to_activate = UserBookings.query.filter(
-        UserBookings.parking_time <= now,
-        UserBookings.leaving_time > now,
-        ParkingSpot.spot_id == UserBookings.spot_id,
-        ParkingSpot.status == 'A'
-    ).join(ParkingSpot).all()
-
-    for booking in bookings_to_activate:
-        if booking.spot:
-            booking.spot.status = 'O'
-        
-    # ---release booking on expiry---
-    bookings_to_expire = UserBookings.query.filter(
-        UserBookings.leaving_time <= now 
-    ).all()
-
-    for booking in bookings_to_expire:
-        # move expired booking to UserHistory
-        history = UserHistory(
-            user_id=booking.user_id,
-            spot_id=booking.spot_id,
-            booking_time=booking.parking_time,
-            leaving_time=booking.leaving_time,
-            parking_cost=booking.parking_cost,
-            vehicle_no=booking.vehicle_no
-        )
-        db.session.add(history)
-        
-        # freeing spot if was occupied
-        if booking.spot and booking.spot.status == 'O':
-            if booking.spot:
-                booking.spot.status = 'A'
-        
-        db.session.delete(booking)
-
-    # commit all changes in one go
-    if bookings_to_activate or bookings_to_expire:
-        db.session.commit()
-    
-    return messages_to_flash # return counts for flash messages
+# activation/expiry for everybody's bookings is done by the background booking scheduler (scheduler.py) only,
+# a page load never writes spot statuses. this helper tells the user about his own bookings that turned
+# active or expired since his last page view, remembered in the session as
+# {'at': timestamp of the view, 'ends': {booking id: leaving timestamp} of the bookings he had then}
 
 def update_spot_statuses_for_user(user_id):
     """
-    this is specific for user if under his session any of his booking got live or expires we will update spot 
-    status for current user specifically only and then also give him a flash message the downside is here that if 
-    status updates happened under admin session or search_parking route that uses helper to update all of users 
-    booking based on booking time period this user will not get flash message"""
+    this is specific for user: if since his last page view any of his bookings got live or expired he gets a
+    flash message, whoever (scheduler, another worker) applied the transition. the first page view of a
+    session only records what is there"""
 
     now = datetime.now()
     
     messages_to_flash = []  
 
-    # --- activating bookings for current user in session only---
-    bookings_to_activate = UserBookings.query.filter(
-        UserBookings.user_id==user_id,
-        UserBookings.parking_time <= now,
-        UserBookings.leaving_time > now,
-        ParkingSpot.spot_id == UserBookings.spot_id,
-        ParkingSpot.status == 'A'
-    ).join(ParkingSpot).all()
-
-    for booking in bookings_to_activate:
-        if booking.spot:
-            booking.spot.status = 'O'
+    bookings = db.session.query(UserBookings.id, UserBookings.parking_time, UserBookings.leaving_time).filter(
+        UserBookings.user_id == user_id,
+        UserBookings.leaving_time > now
+    ).all()
+    seen = session.get('bookings_seen')
+    session['bookings_seen'] = {'at': now.timestamp(),
+                                'ends': {str(booking.id): booking.leaving_time.timestamp() for booking in bookings}}
+    if not seen:
+        return messages_to_flash
+
+    # --- bookings of the user that started since the last check ---
+    activated_count = sum(1 for booking in bookings if seen['at'] < booking.parking_time.timestamp() <= now.timestamp())
     
-    if len(bookings_to_activate) > 0:
-        messages_to_flash.append(("info", f"{len(bookings_to_activate)} of your bookings are now active. Please proceed to your spot."))
+    if activated_count > 0:
+        messages_to_flash.append(("info", f"{activated_count} of your bookings are now active. Please proceed to your spot."))
     
-    # ---release booking on expiry---
-    bookings_to_expire = UserBookings.query.filter(
-        UserBookings.user_id==user_id,
-        UserBookings.leaving_time <= now 
-    ).all()
+    # --- bookings he had at the last check whose leaving time has passed since (released ones are dropped
+    # from the session by release_booking), moved to history by the scheduler ---
+    expired_count = sum(1 for leaving in seen.get('ends', {}).values() if seen['at'] < leaving <= now.timestamp())
 
-    for booking in bookings_to_expire:
-        # move expired booking to UserHistory
-        history = UserHistory(
-            user_id=booking.user_id,
-            spot_id=booking.spot_id,
-            booking_time=booking.parking_time,
-            leaving_time=booking.leaving_time,
-            parking_cost=booking.parking_cost,
-            vehicle_no=booking.vehicle_no
-        )
-        db.session.add(history)
-        
-        # freeing spot if was occupied
-        if booking.spot and booking.spot.status == 'O':
-            booking.spot.status = 'A'
-        
-        db.session.delete(booking)
-    
-    if len(bookings_to_expire) > 0:
-        messages_to_flash.append(("warning", f"{len(bookings_to_expire)} of your past bookings have expired and are moved to history. Please evacuate the parking spot if you haven't already."))
+    if expired_count > 0:
+        messages_to_flash.append(("warning", f"{expired_count} of your past bookings have expired and are moved to history. Please evacuate the parking spot if you haven't already."))
 
-    # commit all changes in one go
-    if bookings_to_activate or bookings_to_expire:
-        db.session.commit()
-    
     return messages_to_flash # return flash messages list
 
 
@@ -242,7 +211,7 @@ def update_spot_statuses_for_user(user_id):
 @user_access_required    
 @only_user               
 def user_home(user_id, slug, user): 
-    cities = [row[0] for row in db.session.query(ParkingLot.city).distinct().all()]
+    cities = lot_catalog.cities()
 
     now = datetime.now()  
 
@@ -251,11 +220,20 @@ def user_home(user_id, slug, user):
     for category, message in status_messages:
         flash(message, category)
     
-    # fetch active bookings (after updates)
-    active_bookings = UserBookings.query.filter_by(user_id=user.user_id).all()
+    # fetch active bookings (after updates), spot and lot joined in so the template's booking.spot.lot.address
+    # doesn't lazy load 2 queries per row
+    active_bookings = (
+        UserBookings.query.filter_by(user_id=user.user_id)
+        .options(joinedload(UserBookings.spot).joinedload(ParkingSpot.lot))
+        .all()
+    )
 
     # recent history
-    recent_history = UserHistory.query.filter_by(user_id=user.user_id).order_by(UserHistory.id.desc()).limit(5).all()
+    recent_history = (
+        UserHistory.query.filter_by(user_id=user.user_id)
+        .options(joinedload(UserHistory.spot_obj).joinedload(ParkingSpot.lot))
+        .order_by(UserHistory.id.desc()).limit(5).all()
+    )
 
     return render_template('user_home1.html', user=user, cities=cities,
                            current_bookings=active_bookings, recent_history=recent_history, now=now)
@@ -289,6 +267,16 @@ def release_booking(user_id, slug, user, booking_id):
     # determine if it's a future booking being cancelled or an active one being released
     now = datetime.now()
     is_future_booking = booking.parking_time > now
+    if booking.leaving_time <= now:     # the scheduler archives it in a moment
+        flash("Could not complete the action, your booking had already expired", "warning")
+        return redirect(url_for('user_home', user_id=session['user_id'], slug=slugify(session['username'])))
+
+    spot = booking.spot
+    # the delete claims the booking: if the scheduler archived it meanwhile nothing is deleted and nothing is counted
+    if db.session.execute(delete(UserBookings).where(UserBookings.id == booking.id)).rowcount != 1:
+        db.session.rollback()
+        flash("Booking not found or already processed (e.g., expired and moved to history).", "warning")
+        return redirect(url_for('user_home', user_id=session['user_id'], slug=slugify(session['username'])))
 
     # Move booking to history
     history = UserHistory(
@@ -301,12 +289,32 @@ def release_booking(user_id, slug, user, booking_id):
     )
     db.session.add(history)
 
-    # free the parking spot
-    if booking.spot:
-        booking.spot.status = 'A' #make spot Physically Available
+    add_to_rollups([(booking.user_id, spot.lot_id, booking.parking_time, booking.leaving_time, booking.parking_cost)]
+                   if spot else [], history_rows=1)
+
+    # free the parking spot (make it physically available) when the released booking is the one occupying it:
+    # cancelling a future booking leaves an active booking of someone else on the spot alone. same guard as
+    # archival, occupancy only drops if the spot really was freed
+    if spot:
+        lot_id = spot.lot_id
+        other_active_booking = exists().where(
+            UserBookings.spot_id == ParkingSpot.spot_id,
+            UserBookings.parking_time <= now,
+            UserBookings.leaving_time > now
+        )
+        freed = 0 if is_future_booking else db.session.execute(
+            update(ParkingSpot)
+            .where(ParkingSpot.spot_id == booking.spot_id, ParkingSpot.status == 'O', ~other_active_booking)
+            .values(status='A')
+        ).rowcount
+        bump_lot_counters(lot_id, occupied=-freed, booked=-1)
+        record_spot_events(lot_id, RELEASED, [booking.spot_id])
+        availability_index.booking_removed(lot_id, booking.spot_id, booking.id)
 
-    db.session.delete(booking)
     db.session.commit()
+    seen = session.get('bookings_seen')
+    if seen and seen.get('ends', {}).pop(str(booking.id), None) is not None:
+        session.modified = True     # a released booking doesn't "expire" later
     
     if is_future_booking:
         flash("Future booking cancelled successfully!", "success")
@@ -324,7 +332,8 @@ def release_booking(user_id, slug, user, booking_id):
 @user_access_required
 
 @only_user # Ensure this is a non-admin user's profile
-def profile(user_id, slug, user): # 'user' object is injected
+def profile(user_id, slug, user): # 'user' identity is injected
+    user = User.query.get(user.user_id) # full row, this route edits it
 
     # calling helper function if users spot freed/occupied right before this action
     status_messages = update_spot_statuses_for_user(user_id)
@@ -351,11 +360,14 @@ def profile(user_id, slug, user): # 'user' object is injected
         elif action == 'update_password':
             old_pass = request.form.get('old_password')
             new_pass = request.form.get('new_password')
-            if check_password_hash(user.pass_wd, old_pass):
-                user.pass_wd = generate_password_hash(new_pass)
-                flash("Password updated successfully", "success")
-            else:
-                flash("Old password is incorrect", "danger")
+            try:
+                if password_hasher.verify(user.pass_wd, old_pass):
+                    user.pass_wd = password_hasher.hash(new_pass)
+                    flash("Password updated successfully", "success")
+                else:
+                    flash("Old password is incorrect", "danger")
+            except PasswordHasherBusy:
+                flash("Server is busy, please try again in a moment", "warning")
 
         elif action == 'delete_account':
             # check for any active or future bookings by this user
@@ -378,19 +390,35 @@ def profile(user_id, slug, user): # 'user' object is injected
 
             for spot in occupied_spots_by_user:
                 spot.status = 'A' # Make spots available
+                bump_lot_counters(spot.lot_id, occupied=-1)
+                record_spot_events(spot.lot_id, RELEASED, [spot.spot_id])
+
+            # leftover (already expired, not yet archived) bookings are still counted as booked for their lots
+            leftover_bookings_per_lot = (
+                db.session.query(ParkingSpot.lot_id, func.count(UserBookings.id))
+                .join(UserBookings, UserBookings.spot_id == ParkingSpot.spot_id)
+                .filter(UserBookings.user_id == user.user_id)
+                .group_by(ParkingSpot.lot_id)
+                .all()
+            )
+            for lot_id, count in leftover_bookings_per_lot:
+                bump_lot_counters(lot_id, booked=-count)
 
             # Delete user's history & bookings (explicitly, even if cascade delete is set up)
             UserBookings.query.filter_by(user_id=user.user_id).delete()
-            UserHistory.query.filter_by(user_id=user.user_id).delete()
+            history_rows = UserHistory.query.filter_by(user_id=user.user_id).delete()
+            drop_user_rollups(user.user_id, history_rows)
             
             db.session.delete(user)
             db.session.commit()
+            invalidate_auth_user(user.user_id)
 
             session.clear()
             flash("Your account and all data have been deleted.", "success")
             return redirect(url_for('home'))
 
         db.session.commit() # Commit changes for update actions
+        invalidate_auth_user(user.user_id)
         return redirect(url_for('profile', user_id=user.user_id, slug=slugify(user.user_name)))
 
     return render_template('profile.html', user=user)
@@ -404,16 +432,36 @@ def profile(user_id, slug, user): # 'user' object is injected
 @user_access_required
 @only_user
 def user_history(user_id, slug, user): 
+    # keyset pagination on (user_id, id): ?before=<id> returns the next older page, so a request only
+    # ever reads HISTORY_PAGE_SIZE rows no matter how long the user's history is
+    page_size = app.config.get('HISTORY_PAGE_SIZE', 25)
+    before_id = request.args.get('before', type=int)
+    is_partial = request.args.get('partial') == '1'   # "load more" fetch, only the rows are rendered
+
+    if not is_partial:
+        # calling helper function if users spot freed/occupied right before this action
+        status_messages = update_spot_statuses_for_user(user_id)
+        for category, message in status_messages:
+            flash("Please check in home, "+ message, category)
+
+    # Fetch one page of history for this user (one extra row tells if there is an older page), with spot and lot in the same query
+    query = UserHistory.query.filter_by(user_id=user.user_id)
+    if before_id:
+        query = query.filter(UserHistory.id < before_id)
+    history_page = (
+        query.options(joinedload(UserHistory.spot_obj).joinedload(ParkingSpot.lot))
+        .order_by(UserHistory.id.desc())
+        .limit(page_size + 1)
+        .all()
+    )
+    user_history = history_page[:page_size]
+    next_cursor = user_history[-1].id if len(history_page) > page_size else None
 
-    # calling helper function if users spot freed/occupied right before this action
-    status_messages = update_spot_statuses_for_user(user_id)
-    for category, message in status_messages:
-        flash("Please check in home, "+ message, category)
-
-    # Fetch full history for this user
-    user_history = UserHistory.query.filter_by(user_id=user.user_id).order_by(UserHistory.id.desc()).all()
+    if is_partial:
+        rows = render_template('user_history_rows.html', user_history=user_history)
+        return rows, 200, {'X-Next-Cursor': str(next_cursor) if next_cursor else ''}
 
-    return render_template('user_history.html', user=user, user_history=user_history)
+    return render_template('user_history.html', user=user, user_history=user_history, next_cursor=next_cursor)
 
 
 # ------------------------
@@ -425,49 +473,56 @@ def user_history(user_id, slug, user):
 
 @only_user
 def search_parking(user_id, slug, user):
-    cities = [row[0] for row in db.session.query(ParkingLot.city).distinct().all()]
+    cities = lot_catalog.cities()
 
-    # calling helper function if users spot or anyothers spot freed/occupied  right before this action
+    # calling helper function if users spot freed/occupied right before this action
     status_messages = update_spot_statuses_for_user(user_id)
-    update_spot_statuses_and_counts()
     for category, message in status_messages:
         flash("Please check in home, "+ message, category)
     
     if request.method == 'POST':
         city = request.form.get('city')
         pincode = request.form.get('pincode')
+        text = request.form.get('q', '').strip()    #free text over name/address/city/pincode, typos allowed
+        near = request.form.get('near', '').strip()  #pincode to search nearest lots with free spots around
+        parking_time_str = request.form.get('parking_time')
+        leaving_time_str = request.form.get('leaving_time')
 
-        query = ParkingLot.query
-        if city:
-            query = query.filter_by(city=city)
-        if pincode:
-            query = query.filter_by(pincode=pincode)
-
-        parking_lots = query.all()
-        # for each lot, calculate total, physically occupied, and booked spots dynamically
-        lots_with_stats = []
-        for lot in parking_lots:
-            total_spots = ParkingSpot.query.filter_by(lot_id=lot.lot_id).count()
-            # count spots that are physically occupied (status 'O')
-            occupied_physical_spots = ParkingSpot.query.filter_by(lot_id=lot.lot_id, status='O').count()
-            
-            # count spots that are currently booked (future or present)
-            # this is the count of spots that are 'unavailable for new bookings'
-            booked_spots_count = UserBookings.query.join(ParkingSpot).filter(
-                ParkingSpot.lot_id == lot.lot_id,
-                UserBookings.leaving_time > datetime.now() # booking is not yet expired
-            ).count()
-
-            lots_with_stats.append({
-                'lot': lot,
-                'total_spots': total_spots,
-                'occupied_physical_spots': occupied_physical_spots, # New stat for physical occupancy
-                'booked_spots_count': booked_spots_count # Number of spots currently unavailable for new bookings
-            })
+        # optional time window: free spots for exactly that period instead of today's counts
+        window = None
+        if parking_time_str and leaving_time_str:
+            parking_time = datetime.fromisoformat(parking_time_str)
+            leaving_time = datetime.fromisoformat(leaving_time_str)
+            if parking_time <= datetime.now():
+                flash("Parking start time must be in the future!", "warning")
+            elif leaving_time <= parking_time:
+                flash("Leaving time must be later than parking time!", "warning")
+            else:
+                window = (parking_time, leaving_time)
+        elif parking_time_str or leaving_time_str:
+            flash("Enter both parking and leaving time to search by time window", "warning")
+
+        # total, physically occupied and booked (current/future) spots for all matching lots at once,
+        # plus the spots free in the window (one query for all lots), best lots first
+        if near:
+            # k nearest lots with a free spot (now or in the window) among the ones matching the other fields
+            among = {lot.lot_id for lot in lot_catalog.find(city, pincode, text)} if (city or pincode or text) else None
+            nearest = lot_catalog.nearest(near, app.config.get('NEAREST_LOTS_K', 5), window=window, among=among)
+            if nearest is None:
+                flash(f"Could not locate pincode {near}, try a nearby one", "warning")
+                nearest = []
+            parking_lots_with_stats = lots_with_stats([lot for lot, _ in nearest], with_booked_count=True, window=window)
+            for stats, (_, km) in zip(parking_lots_with_stats, nearest):
+                stats['distance_km'] = km
+        else:
+            parking_lots_with_stats = lots_with_stats(lot_catalog.find(city, pincode, text), with_booked_count=True, window=window)
+            if window:
+                parking_lots_with_stats = rank_by_window_availability(parking_lots_with_stats)
 
-        return render_template('search_parking.html', user=user, parking_lots_with_stats=lots_with_stats, cities=cities)
+        return render_template('search_parking.html', user=user, parking_lots_with_stats=parking_lots_with_stats,
+                               cities=cities, window=window, city=city, pincode=pincode, text=text, near=near)
 
-    return render_template('search_parking.html', user=user, parking_lots_with_stats=None, cities=cities)
+    return render_template('search_parking.html', user=user, parking_lots_with_stats=None, cities=cities, window=None)
 
 
 # ------------------------
@@ -491,6 +546,11 @@ def book_spot(user_id, slug, lot_id, user):
     conflicting_bookings_info = [] # this list will only be populated if "all" spots are conflicting
     is_any_spot_available_for_period = False # Intitially false cause if available we set it to true
 
+    if request.method == 'GET' and request.args.get('parking_time') and request.args.get('leaving_time'):
+        # coming from a time window search, prefill the form with that window
+        parking_time = datetime.fromisoformat(request.args['parking_time'])
+        leaving_time = datetime.fromisoformat(request.args['leaving_time'])
+
     if request.method == 'POST':
         vehicle_no = request.form.get('vehicle_no')
         parking_time_str = request.form.get('parking_time')
@@ -529,29 +589,21 @@ def book_spot(user_id, slug, lot_id, user):
         estimated_price = round(hours * lot.price_per_hr, 2)
 
         # --- check for overall availability for the time period ---
-        all_spots_in_lot = ParkingSpot.query.filter_by(lot_id=lot_id).all()
-        
-        available_spot_ids_for_period = [] 
-        # conflicting_bookings_info is already initialized at the top of the POST block
-
-        for spot_candidate in all_spots_in_lot:
-            overlapping_bookings_for_spot = UserBookings.query.filter(  # find overlapping booking for user's given time period
-                UserBookings.spot_id == spot_candidate.spot_id,
-                UserBookings.parking_time < leaving_time,  
-                UserBookings.leaving_time > parking_time   
-            ).all()
+        # one lookup in the in-memory index of this lot instead of an overlap query per spot
+        # free spots come back in the order of the lot's assignment strategy (see spot_assignment.py)
+        available_spot_ids_for_period, conflicts_by_spot = availability_index.lookup(
+            lot_id, parking_time, leaving_time, strategy=strategy_for(lot)
+        )
 
-            if not overlapping_bookings_for_spot:                        #if no overlapping booking add this spot to available
-                available_spot_ids_for_period.append(spot_candidate.spot_id)
-            else:
-                # only populate conflicting_bookings_info if this spot is actually unavailable.
-                # we will only display this list if "all" spots are unavailable.
-                for conflict in overlapping_bookings_for_spot:
-                    conflicting_bookings_info.append({
-                        'spot_id': spot_candidate.spot_id,
-                        'parking_time': conflict.parking_time.strftime('%Y-%m-%d %H:%M'),
-                        'leaving_time': conflict.leaving_time.strftime('%Y-%m-%d %H:%M')
-                    })
+        # only populate conflicting_bookings_info for spots that are actually unavailable.
+        # we will only display this list if "all" spots are unavailable.
+        for conflict_spot_id, overlapping_bookings_for_spot in conflicts_by_spot.items():
+            for conflict_parking_time, conflict_leaving_time, _ in overlapping_bookings_for_spot:
+                conflicting_bookings_info.append({
+                    'spot_id': conflict_spot_id,
+                    'parking_time': conflict_parking_time.strftime('%Y-%m-%d %H:%M'),
+                    'leaving_time': conflict_leaving_time.strftime('%Y-%m-%d %H:%M')
+                })
         
         # will be false if available_spot_ids_for_period is empty i.e when no spot_canditate was available in timeperiod
         is_any_spot_available_for_period = bool(available_spot_ids_for_period)
@@ -565,36 +617,23 @@ def book_spot(user_id, slug, lot_id, user):
                                    is_any_spot_available_for_period=is_any_spot_available_for_period) # <-- Pass new var
 
         if action == 'confirm':  # finalise booking
-            selected_spot_id = available_spot_ids_for_period[0] 
-            spot = ParkingSpot.query.get(selected_spot_id) 
-
-            if not spot:    #in case spot deleted by admin while a user was midway confirming
-                flash("The selected spot is no longer available. Please try again or choose different times.", "danger")
-                return redirect(url_for('book_spot', user_id=user.user_id, slug=slugify(user.user_name), lot_id=lot_id))
-
-            recheck_overlapping = UserBookings.query.filter(
-                UserBookings.spot_id == spot.spot_id,
-                UserBookings.parking_time < leaving_time,
-                UserBookings.leaving_time > parking_time
-            ).first()
-
-            if recheck_overlapping:
-                flash("The selected spot became unavailable just now. Please try again or choose different times.", "danger")
-                return redirect(url_for('book_spot', user_id=user.user_id, slug=slugify(user.user_name), lot_id=lot_id))
-
-            booking = UserBookings(
+            # the allocator rechecks the candidates against db under a per lot lock (see booking_allocator.py)
+            booking = booking_allocator.allocate(
+                lot_id, available_spot_ids_for_period,
                 user_id=user.user_id,
-                spot_id=spot.spot_id,
                 parking_time=parking_time,
                 leaving_time=leaving_time,
                 parking_cost=estimated_price,
                 vehicle_no=vehicle_no
             )
 
-            db.session.add(booking)
-            db.session.commit()
+            if not booking:    # spots taken by another request or deleted by admin while user was midway confirming
+                flash("The selected spot became unavailable just now. Please try again or choose different times.", "danger")
+                return redirect(url_for('book_spot', user_id=user.user_id, slug=slugify(user.user_name), lot_id=lot_id))
+
+            booking_scheduler.schedule_booking(booking)
 
-            flash(f"Booking confirmed! Spot {spot.spot_id} is booked for you. Total cost: ₹ {estimated_price}", "success")
+            flash(f"Booking confirmed! Spot {booking.spot_id} is booked for you. Total cost: ₹ {estimated_price}", "success")
             return redirect(url_for('user_home', user_id=user.user_id, slug=slugify(user.user_name)))
         
         elif action == 'preview': 
@@ -614,22 +653,8 @@ def book_spot(user_id, slug, lot_id, user):
 @only_user
 def user_summary(user_id, slug, user):
 
-    # calling helper function if users spot freed/occupied right before this action
-    status_messages = update_spot_statuses_and_counts()
-    for category, message in status_messages:
-        flash("Please check in home, "+ message, category)
-    
-    # Group bookings by parking lot name from history
-    data = (
-        db.session.query(ParkingLot.primelocation_name, func.count(UserHistory.id))
-        .join(ParkingSpot, ParkingSpot.lot_id == ParkingLot.lot_id)
-        .join(UserHistory, UserHistory.spot_id == ParkingSpot.spot_id)
-        .filter(UserHistory.user_id == user.user_id)
-        .group_by(ParkingLot.primelocation_name)
-        .order_by(func.count(UserHistory.id).desc())
-        .limit(5)
-        .all()
-    )
+    # most used parking lots of this user, from the pre-aggregated rollups (rollups.py)
+    data = top_lots(5, user_id=user.user_id)
 
     # Prepare chart data
     labels = [row[0] for row in data]
@@ -651,23 +676,10 @@ def user_summary(user_id, slug, user):
 @app.route('/admin/dashboard')
 @admin_required
 def admin_dashboard():
-    # --- call the new helper function to update statuses ---
-    update_spot_statuses_and_counts() # we don't flash messages of user to admin here (has a drawback)
-    
-    parking_lots = ParkingLot.query.all()
-    
-    lots_with_stats = []
-    for lot in parking_lots:
-        total_spots = ParkingSpot.query.filter_by(lot_id=lot.lot_id).count()
-        occupied_physical_spots = ParkingSpot.query.filter_by(lot_id=lot.lot_id, status='O').count()
-        
-        lots_with_stats.append({
-            'lot': lot,
-            'total_spots': total_spots,
-            'occupied_physical_spots': occupied_physical_spots
-        })
+    # spot statuses are kept current by the background booking scheduler
+    dashboard_lots = lots_with_stats(lot_catalog.all_lots())
 
-    return render_template('admin_dashboard.html', lots_with_stats=lots_with_stats)
+    return render_template('admin_dashboard.html', lots_with_stats=dashboard_lots)
 
 #--------------------------
 # EDIT PROFILE-ADMIN
@@ -697,13 +709,17 @@ def admin_profile():
         elif action == 'update_password':
             old_pass = request.form.get('old_password')
             new_pass = request.form.get('new_password')
-            if check_password_hash(user.pass_wd, old_pass):
-                user.pass_wd = generate_password_hash(new_pass)
-                flash("Password updated successfully", "success")
-            else:
-                flash("Old password is incorrect", "danger")
+            try:
+                if password_hasher.verify(user.pass_wd, old_pass):
+                    user.pass_wd = password_hasher.hash(new_pass)
+                    flash("Password updated successfully", "success")
+                else:
+                    flash("Old password is incorrect", "danger")
+            except PasswordHasherBusy:
+                flash("Server is busy, please try again in a moment", "warning")
 
         db.session.commit()
+        invalidate_auth_user(user.user_id)
         return redirect(url_for('admin_profile'))
 
     return render_template('admin_profile.html', user=user)
@@ -722,27 +738,32 @@ def add_parking():
         city = request.form.get('city')
         pincode = request.form.get('pincode')
         capacity = int(request.form.get('capacity')) 
+        spot_assignment = request.form.get('spot_assignment') or None   #empty = configured default
 
         if capacity < 0:
             flash("Capacity cannot be negative.", "danger")
-            return render_template('add_parking_lot.html')
+            return render_template('add_parking_lot.html', assignment_strategies=STRATEGY_LABELS)
 
         new_lot = ParkingLot(area_type=area_type, city=city, primelocation_name=prime_loc,
-                             price_per_hr=price_per_hr, address=address, pincode=pincode)
+                             price_per_hr=price_per_hr, address=address, pincode=pincode,
+                             spot_assignment=spot_assignment if spot_assignment in STRATEGIES else None)
+        new_lot.latitude, new_lot.longitude = locate_pincode(pincode) or (None, None)  #for nearest lot search
 
         db.session.add(new_lot)
         db.session.flush() # Get lot_id before commit
 
-        # --- loop to add spots based on capacity ---
-        for _ in range(capacity):
-            db.session.add(ParkingSpot(lot_id=new_lot.lot_id, status='A')) 
+        # --- add spots based on capacity, one multi-row insert ---
+        create_lot_counters(new_lot.lot_id)
+        provision_spots(new_lot.lot_id, capacity)
+        lot_catalog.invalidate()
 
         db.session.commit()    
+        availability_index.invalidate(new_lot.lot_id)
 
         flash(f"Parking Lot added successfully with {capacity} spots!", "success")
         return redirect(url_for('admin_dashboard'))
 
-    return render_template('add_parking_lot.html')
+    return render_template('add_parking_lot.html', assignment_strategies=STRATEGY_LABELS)
 
 
 # -------------------------
@@ -766,10 +787,24 @@ def delete_parking(lot_id):
         flash("Cannot delete Parking Lot with active (future or current) bookings! Please ensure all spots are free.", "warning")
         return redirect(url_for('admin_dashboard'))
 
+    # same for expired bookings not archived yet, deleting the spots would drop them without a history record
+    if UserBookings.query.join(ParkingSpot).filter(ParkingSpot.lot_id == lot_id).first():
+        flash("Cannot delete Parking Lot yet, its expired bookings are still being moved to history. Please try again in a minute.", "warning")
+        return redirect(url_for('admin_dashboard'))
+
     # delete all associated parking spots first (cascade="all, delete-orphan" on relationship handles this)
     # parkingSpot.query.filter_by(lot_id=lot_id).delete()   #this is handled by cascade on lot.spots relationship
+    db.session.execute(
+        update(UserHistory)
+        .where(UserHistory.spot_id.in_(select(ParkingSpot.spot_id).where(ParkingSpot.lot_id == lot_id)))
+        .values(spot_id=None)
+    )
     db.session.delete(lot)
+    drop_lot_rollups(lot_id)
+    record_spot_events(lot_id, DELETED)    # open live grids of the lot learn it is gone
+    lot_catalog.invalidate()
     db.session.commit()
+    availability_index.invalidate(lot_id)
     flash("Parking Lot deleted successfully!", "success")
     return redirect(url_for('admin_dashboard'))
 
@@ -792,13 +827,17 @@ def edit_parking(lot_id):
         lot.price_per_hr = float(request.form.get('price_per_hr'))
         lot.city = request.form.get('city')
         lot.pincode = request.form.get('pincode')
+        spot_assignment = request.form.get('spot_assignment') or None
+        lot.spot_assignment = spot_assignment if spot_assignment in STRATEGIES else None
+        lot.latitude, lot.longitude = locate_pincode(lot.pincode) or (None, None)
         # removed: max_spots and occupied_spots from form processing
+        lot_catalog.invalidate()
         
         db.session.commit()
         flash("Parking Lot updated successfully!", "success")
         return redirect(url_for('admin_dashboard'))
 
-    return render_template('edit_parking_lot.html', lot=lot)
+    return render_template('edit_parking_lot.html', lot=lot, assignment_strategies=STRATEGY_LABELS)
 
 # ---------------------------
 # VIEW PARKING SPOTS-ADMIN (MODIFIED)
@@ -806,47 +845,75 @@ def edit_parking(lot_id):
 @app.route('/admin/parking_spots/<int:lot_id>')
 @admin_required
 def parking_spots(lot_id):
-    # call the new helper function to update statuses ---
-    update_spot_statuses_and_counts() 
-    
     lot = ParkingLot.query.get(lot_id)
     if not lot:
         flash("Parking Lot not found!", "danger")
         return redirect(url_for('admin_dashboard'))
 
-    all_spots = ParkingSpot.query.filter_by(lot_id=lot_id).all()
-    
-    spots_for_display = []
-    now = datetime.now()
+    # whole grid from a constant number of queries, the page then keeps it fresh through parking_spots_grid
+    # (version read first so a change made meanwhile shows up on the next poll)
+    grid_etag_value = grid_etag(lot_id, lot_version(lot_id))
+    grid = lot_spot_grid(lot_id)
 
-    for spot in all_spots:
-        display_status = spot.status  # display status for spot color not text at start same as spot.status
-        
-        # check for any future bookings
-        future_bookings = UserBookings.query.filter(
-            UserBookings.spot_id == spot.spot_id,
-            UserBookings.parking_time > now 
-        ).first()
-
-        if spot.status == 'O':
-            display_status = 'O'
-        elif spot.status == 'A' and future_bookings:
-            display_status = 'F' # F for available but Booked for future color
-        else:
-            display_status = 'A'
+    return render_template('parking_spots.html', lot=lot, spots=grid['spots'],
+                           total_spots_count=grid['counts']['total'],
+                           occupied_physical_spots_count=grid['counts']['occupied'],
+                           grid_etag=grid_etag_value)
 
-        spots_for_display.append({
-            'spot_id': spot.spot_id,
-            'status': spot.status,  # actual status shown will be A or O only
-            'display_status': display_status # Status for coloring the grid A, O, F
-        })
 
-    total_spots_count = len(all_spots)
-    occupied_physical_spots_count = sum(1 for spot in all_spots if spot.status == 'O')
+# ---------------------------
+# SPOT GRID OF A LOT (JSON, polled by parking_spot_scripts.js)
+# ---------------------------
+@app.route('/admin/parking_spots/<int:lot_id>/grid')
+@admin_required
+def parking_spots_grid(lot_id):
+    version = lot_version(lot_id)
+    if version is None:
+        return {"error": "Parking lot not found"}, 404
+
+    etag = grid_etag(lot_id, version)
+    if request.if_none_match.contains(etag):   # nothing changed in this lot since the last poll
+        response = app.response_class(status=304)
+    else:
+        grid = lot_spot_grid(lot_id)
+        response = app.json.response({'lot_id': lot_id, 'version': version, **grid})
+    response.set_etag(etag)
+    response.cache_control.no_cache = True     # always revalidate
+    response.cache_control.private = True
+    return response
 
-    return render_template('parking_spots.html', lot=lot, spots=spots_for_display, 
-                           total_spots_count=total_spots_count,
-                           occupied_physical_spots_count=occupied_physical_spots_count)
+# ---------------------------
+# LIVE SPOT TRANSITIONS OF A LOT (server-sent events, see spot_events.py)
+# ---------------------------
+@app.route('/admin/parking_spots/<int:lot_id>/events')
+@admin_required
+def parking_spots_events(lot_id):
+    if lot_version(lot_id) is None:
+        return {"error": "Parking lot not found"}, 404
+    stream = spot_event_hub.subscribe(lot_id)
+    if stream is None:     # too many open streams in this process, the page falls back to polling the grid
+        return {"error": "Too many live streams, try again later"}, 503
+    db.session.remove()    # the stream may stay open for hours, don't keep a connection checked out
+
+    heartbeat = app.config.get('SPOT_EVENTS_HEARTBEAT', 15)
+
+    def events():
+        try:
+            yield f"retry: {app.config.get('SPOT_EVENTS_RETRY_MS', 3000)}\n\n"
+            while True:
+                message = stream.get(timeout=heartbeat)
+                if message is None:     # fell behind, the client reconnects and reloads the grid
+                    yield format_sse('resync', {'lot_id': lot_id})
+                    return
+                # an empty comment line keeps proxies from closing an idle stream and finds dead clients
+                yield message or ": keepalive\n\n"
+        finally:
+            spot_event_hub.unsubscribe(stream)
+
+    response = app.response_class(events(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'    # nginx: pass events through unbuffered
+    return response
 
 # ---------------------------
 # FETCH DETAIL OF SPOT - ADMIN
@@ -855,9 +922,6 @@ def parking_spots(lot_id):
 @admin_required
 def spot_details(spot_id):
 
-    # in case users spot status got updated right before this action
-    update_spot_statuses_and_counts()
-
     spot = ParkingSpot.query.get(spot_id)
     if not spot:
         return {"error": "Spot not found"}, 404
@@ -885,8 +949,8 @@ def spot_details(spot_id):
     }
 
     # determine if the spot is deletable
-    # a spot is deletable ONLY if it has no current or future bookings.
-    is_deletable = not current_booking and not future_bookings
+    # a spot is deletable ONLY if it has no bookings left, expired ones not archived yet included
+    is_deletable = not current_booking and not future_bookings and not UserBookings.query.filter_by(spot_id=spot_id).first()
     response_data['is_deletable'] = is_deletable 
 
     if current_booking:
@@ -915,8 +979,19 @@ def spot_details(spot_id):
 
 
 # ---------------------------
-# ADD SPOT TO PARKING LOT- INSIDE parking_lot MANAGE PAGE
+# ADD SPOT(S) TO PARKING LOT- INSIDE parking_lot MANAGE PAGE
 # ---------------------------
+def spot_count_from_form():
+    # number of spots for add/remove actions, 1 if the form doesn't send one
+    try:
+        count = int(request.form.get('count', 1))
+    except ValueError:
+        return None
+    if count < 1 or count > MAX_SPOTS_PER_ACTION:
+        return None
+    return count
+
+
 @app.route('/admin/add_spot/<int:lot_id>', methods=['POST'])
 @admin_required
 def add_spot(lot_id):
@@ -924,11 +999,45 @@ def add_spot(lot_id):
     if not lot:
         flash("Parking Lot not found!", "danger")
         return redirect(url_for('admin_dashboard'))
-    
-    new_spot = ParkingSpot(lot_id=lot.lot_id, status='A')
-    db.session.add(new_spot)
+
+    count = spot_count_from_form()
+    if count is None:
+        flash(f"Number of spots must be between 1 and {MAX_SPOTS_PER_ACTION}.", "warning")
+        return redirect(url_for('parking_spots', lot_id=lot.lot_id))
+
+    provision_spots(lot.lot_id, count)
+    db.session.commit()
+    availability_index.invalidate(lot.lot_id)
+    if count == 1:
+        flash(f"New spot added to {lot.primelocation_name}!", "success")
+    else:
+        flash(f"{count} new spots added to {lot.primelocation_name}!", "success")
+    return redirect(url_for('parking_spots', lot_id=lot.lot_id))
+
+# ---------------------------
+# REMOVE N FREE SPOTS FROM PARKING LOT- INSIDE parking_lot MANAGE PAGE
+# ---------------------------
+@app.route('/admin/remove_spots/<int:lot_id>', methods=['POST'])
+@admin_required
+def remove_spots(lot_id):
+    lot = ParkingLot.query.get(lot_id)
+    if not lot:
+        flash("Parking Lot not found!", "danger")
+        return redirect(url_for('admin_dashboard'))
+
+    count = spot_count_from_form()
+    if count is None:
+        flash(f"Number of spots must be between 1 and {MAX_SPOTS_PER_ACTION}.", "warning")
+        return redirect(url_for('parking_spots', lot_id=lot.lot_id))
+
+    # only spots that are available and have no booking left (expired ones not archived yet included) are removed
+    removed = remove_free_spots(lot.lot_id, count)
     db.session.commit()
-    flash(f"New spot added to {lot.primelocation_name}!", "success")
+    availability_index.invalidate(lot.lot_id)
+    if removed < count:
+        flash(f"Removed {removed} of {count} spots, the remaining spots have bookings (expired ones are moved to history within a minute).", "warning")
+    else:
+        flash(f"{removed} spots removed from {lot.primelocation_name}!", "success")
     return redirect(url_for('parking_spots', lot_id=lot.lot_id))
 
 # ---------------------------
@@ -950,33 +1059,42 @@ def delete_spot(spot_id):
     if active_booking_for_spot:
         flash(f"Cannot delete spot {spot_id} as it has an active booking. Please ensure the booking is released first.", "danger")
         return redirect(url_for('parking_spots', lot_id=spot.lot_id))
-            
+
+    # expired bookings stay in user_bookings until the scheduler archives them, deleting the spot before would
+    # leave them pointing at nothing and the lot's booked counter off
+    if UserBookings.query.filter(UserBookings.spot_id == spot_id).first():
+        flash(f"Cannot delete spot {spot_id} yet, its expired bookings are still being moved to history. Please try again in a minute.", "warning")
+        return redirect(url_for('parking_spots', lot_id=spot.lot_id))
+
     lot = ParkingLot.query.get(spot.lot_id) 
+    bump_lot_counters(lot.lot_id, total=-1, occupied=-1 if spot.status == 'O' else 0)
+    record_spot_events(lot.lot_id, DELETED, [spot.spot_id])
+    # history keeps the record without the spot, what the SET NULL foreign key does where it is enforced
+    db.session.execute(update(UserHistory).where(UserHistory.spot_id == spot.spot_id).values(spot_id=None))
     db.session.delete(spot)
     db.session.commit()
+    availability_index.invalidate(lot.lot_id)
     flash("Spot deleted successfully!", "success")
     return redirect(url_for('parking_spots', lot_id=lot.lot_id))
 
 
+#-----------------------
+# REQUEST METRICS (prometheus text format, see metrics.py)
+#-----------------------
+@app.route('/admin/metrics')
+@admin_required
+def admin_metrics():
+    return metrics_registry.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+
 #-----------------------
 # ADMIN SUMMARY
 #-----------------------
 @app.route('/admin/summary')
 @admin_required
 def admin_summary():
-    # most booked lots from booking history only
-    lot_data = (
-        db.session.query(
-            ParkingLot.primelocation_name, 
-            func.count(UserHistory.id) # count only from userhistory
-        )
-        .join(ParkingSpot, ParkingSpot.lot_id == ParkingLot.lot_id)
-        .join(UserHistory, UserHistory.spot_id == ParkingSpot.spot_id)
-        .group_by(ParkingLot.primelocation_name)
-        .order_by(func.count(UserHistory.id).desc())
-        .limit(5)
-        .all()
-    )
+    # most booked lots from booking history, read from the pre-aggregated rollups (rollups.py)
+    lot_data = top_lots(5)
 
     # prepare data for Chart.js
     labels = [row[0] for row in lot_data]
@@ -984,13 +1102,13 @@ def admin_summary():
 
     # totals counts for display
     total_users = User.query.count()
-    total_lots = ParkingLot.query.count()
+    total_lots = len(lot_catalog.all_lots())
     
-    # total bookings, currently booked either occupied or future
-    total_bookings = UserBookings.query.count() 
+    # total bookings, currently booked either occupied or future (sum of the per lot counters)
+    total_bookings = db.session.query(func.coalesce(func.sum(LotCounters.booked_spots), 0)).scalar()
     
     # Total history records
-    total_history = UserHistory.query.count()
+    total_history = history_bookings_count()
 
     return render_template(
         'admin_summary.html',
@@ -1040,28 +1158,13 @@ def admin_search():
             search_type = 'search_parking_lot'
             city = request.form.get('city')
             pincode = request.form.get('pincode')
+            text = request.form.get('q', '').strip()
 
-            if not city and not pincode:
-                flash("Please enter either City or Pincode.", "warning")
+            if not city and not pincode and not text:
+                flash("Please enter a City, Pincode or search text.", "warning")
             else:
-                query = ParkingLot.query
-                if city:
-                    query = query.filter_by(city=city)
-                if pincode:
-                    query = query.filter_by(pincode=pincode)
-                
-                parking_lots = query.all()
-                # calc stats for search results
-                lots_with_stats = []
-                for lot in parking_lots:
-                    total_spots = ParkingSpot.query.filter_by(lot_id=lot.lot_id).count()
-                    occupied_physical_spots = ParkingSpot.query.filter_by(lot_id=lot.lot_id, status='O').count()
-                    lots_with_stats.append({
-                        'lot': lot,
-                        'total_spots': total_spots,
-                        'occupied_physical_spots': occupied_physical_spots
-                    })
-                parking_lots_result = lots_with_stats # Assign the list with stats
+                # calc stats for search results (text matches come best first)
+                parking_lots_result = lots_with_stats(lot_catalog.find(city, pincode, text)) # Assign the list with stats
 
                 if not parking_lots_result:
                     flash("No parking lots found with the provided details.", "info")
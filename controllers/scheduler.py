@@ -0,0 +1,197 @@
+from datetime import datetime
+import heapq
+import threading
+
+from sqlalchemy import select, update, exists
+from app import app
+from models.dbmodel import db, ParkingSpot, UserBookings
+from .lot_counters import bump_lot_counters, reconcile_lot_counters
+from .archival import archive_expired_bookings
+from .spot_events import record_spot_events, prune_spot_events, ACTIVATED
+
+
+# --------------------------- background activation/expiry of bookings -------------------------------------
+
+# every booking has 2 transitions: at parking_time its spot becomes physically occupied ('O') and at
+# leaving_time the booking is moved to history and the spot is freed ('A'). instead of every GET route
+# sweeping the whole bookings table we keep a time ordered heap of upcoming transitions and a daemon
+# thread that sleeps until the next one is due.
+# the heap is rebuilt from db every BOOKING_SCHEDULER_RESYNC seconds so bookings made by other worker
+# processes are picked up, and on startup so bookings that came due while the app was down are handled.
+# the same thread also runs periodic maintenance jobs registered with every().
+
+EXPIRE = 0      # expire sorts before activate so back to back bookings on one spot end up 'O'
+ACTIVATE = 1
+
+
+class BookingScheduler:
+
+    def __init__(self, flask_app):
+        self.app = flask_app
+        self._heap = []
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopped = False
+        self._next_resync = None
+        self._jobs = []   # [next run timestamp, interval config key, default interval, function]
+
+    # -------- feeding the queue --------
+
+    def _push(self, due, kind, booking_id):
+        heapq.heappush(self._heap, (due, kind, booking_id))
+
+    def schedule_booking(self, booking):
+        """
+        called after a new booking is committed. without a running thread in this process (separate
+        worker mode) the worker picks the booking up on its next resync"""
+        with self._cond:
+            if self._thread is None:
+                return
+            self._push(booking.parking_time, ACTIVATE, booking.id)
+            self._push(booking.leaving_time, EXPIRE, booking.id)
+            self._cond.notify()
+
+    def resync(self):
+        # user_bookings only holds current/future bookings (expired ones move to history) so this stays small
+        rows = db.session.query(UserBookings.id, UserBookings.parking_time, UserBookings.leaving_time).all()
+        heap = []
+        for booking_id, parking_time, leaving_time in rows:
+            heap.append((parking_time, ACTIVATE, booking_id))
+            heap.append((leaving_time, EXPIRE, booking_id))
+        heapq.heapify(heap)
+        with self._cond:
+            self._heap = heap
+        self._next_resync = datetime.now().timestamp() + self.app.config.get('BOOKING_SCHEDULER_RESYNC', 60)
+
+    def every(self, config_key, default_seconds, func):
+        """
+        registers func to run on the scheduler thread every app.config[config_key] seconds (first run on start)"""
+        self._jobs.append([0, config_key, default_seconds, func])
+
+    # -------- applying transitions --------
+
+    def _pop_due(self, now):
+        activate_ids, expire_ids = set(), set()
+        with self._cond:
+            while self._heap and self._heap[0][0] <= now:
+                _, kind, booking_id = heapq.heappop(self._heap)
+                (expire_ids if kind == EXPIRE else activate_ids).add(booking_id)
+        return activate_ids, expire_ids
+
+    def _activate(self, booking_ids, now):
+        due = db.session.execute(
+            select(UserBookings.id, UserBookings.spot_id, ParkingSpot.lot_id)
+            .join(ParkingSpot, ParkingSpot.spot_id == UserBookings.spot_id)
+            .where(
+                UserBookings.id.in_(booking_ids),
+                UserBookings.parking_time <= now,
+                UserBookings.leaving_time > now,
+                ParkingSpot.status == 'A'
+            )
+        ).all()
+
+        # one conditional write per spot: another process (or a release) that got there first leaves nothing
+        # to match, so the occupancy counter and the event only follow a transition this call really made
+        activated = 0
+        for booking_id, spot_id, lot_id in due:
+            still_booked = exists().where(UserBookings.id == booking_id, UserBookings.leaving_time > now)
+            changed = db.session.execute(
+                update(ParkingSpot)
+                .where(ParkingSpot.spot_id == spot_id, ParkingSpot.status == 'A', still_booked)
+                .values(status='O')
+            ).rowcount
+            if changed == 1:
+                bump_lot_counters(lot_id, occupied=1)
+                record_spot_events(lot_id, ACTIVATED, [spot_id])
+                activated += 1
+        return activated
+
+    def run_due(self):
+        """
+        applies every transition that is due now, returns (activated, expired) counts"""
+        now = datetime.now()
+        if self._next_resync is None or now.timestamp() >= self._next_resync:
+            self.resync()
+
+        activate_ids, expire_ids = self._pop_due(now)
+        if not activate_ids and not expire_ids:
+            return 0, 0
+
+        # bookings released/cancelled meanwhile are simply not found anymore
+        expired = archive_expired_bookings(booking_ids=expire_ids, now=now)['moved'] if expire_ids else 0
+        activated = self._activate(activate_ids, now) if activate_ids else 0
+        db.session.commit()
+        return activated, expired
+
+    def run_jobs(self):
+        now = datetime.now().timestamp()
+        for job in self._jobs:
+            next_run, config_key, default_seconds, func = job
+            if now >= next_run:
+                job[0] = now + self.app.config.get(config_key, default_seconds)
+                try:
+                    func()
+                except Exception:
+                    db.session.rollback()
+                    self.app.logger.exception("scheduled job %s failed", func.__name__)
+
+    # -------- worker loop --------
+
+    def _seconds_until_next(self):
+        # caller holds self._cond
+        now = datetime.now()
+        wait = self._next_resync - now.timestamp() if self._next_resync else 0
+        if self._heap:
+            wait = min(wait, (self._heap[0][0] - now).total_seconds())
+        for job in self._jobs:
+            wait = min(wait, job[0] - now.timestamp())
+        return max(wait, 0)
+
+    def run_forever(self):
+        while not self._stopped:
+            with self.app.app_context():
+                try:
+                    activated, expired = self.run_due()
+                    if activated or expired:
+                        self.app.logger.info("booking scheduler: %s activated, %s expired", activated, expired)
+                except Exception:
+                    db.session.rollback()
+                    self.app.logger.exception("booking scheduler run failed")
+                self.run_jobs()
+            with self._cond:
+                if not self._stopped:
+                    self._cond.wait(self._seconds_until_next())
+
+    def start(self):
+        """
+        starts the in-process daemon thread (once per process)"""
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self.run_forever, name="booking-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+
+booking_scheduler = BookingScheduler(app)
+booking_scheduler.every('LOT_COUNTER_RECONCILE', 3600, reconcile_lot_counters)
+booking_scheduler.every('SPOT_EVENTS_PRUNE', 600, prune_spot_events)
+
+
+# start in-process scheduler with the first request, so importing the app (cli, tests) doesn't spawn threads
+@app.before_request
+def start_booking_scheduler():
+    if app.config.get('BOOKING_SCHEDULER') == 'inprocess' and booking_scheduler._thread is None:
+        booking_scheduler.start()
+
+
+# separate worker process: set BOOKING_SCHEDULER=worker for the web processes and run `flask run-scheduler`
+@app.cli.command('run-scheduler')
+def run_scheduler_command():
+    """Run the booking activation/expiry scheduler in the foreground."""
+    print("Booking scheduler running, press CTRL+C to quit")
+    booking_scheduler.run_forever()
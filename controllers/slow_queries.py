@@ -0,0 +1,190 @@
+from collections import defaultdict
+from datetime import datetime
+import glob
+import json
+import logging
+from logging.handlers import RotatingFileHandler
+import os
+import re
+import threading
+import time
+
+import click
+from flask import request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app import app
+
+
+# --------------------------- slow query log with query plans -------------------------------------
+
+# every statement slower than SLOW_QUERY_MS is written as one json line to a rotating file with its sql,
+# redacted parameters, the route (or background thread) that issued it and, on sqlite, its
+# EXPLAIN QUERY PLAN. `flask slow-queries` groups the log by statement shape (literals and IN lists
+# normalized) so the worst offenders and their full scans show up first.
+
+_logger = logging.getLogger('parkalot.slow_queries')
+_logger.propagate = False
+_handler_lock = threading.Lock()
+
+
+def _log_path():
+    return app.config.get('SLOW_QUERY_LOG') or os.path.join(app.instance_path, 'slow_queries.log')
+
+
+def _ensure_handler():
+    # the file is only created once the first slow statement shows up
+    with _handler_lock:
+        if _logger.handlers:
+            return
+        path = _log_path()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        handler = RotatingFileHandler(
+            path, maxBytes=app.config.get('SLOW_QUERY_LOG_MAX_BYTES', 5 * 1024 * 1024),
+            backupCount=app.config.get('SLOW_QUERY_LOG_BACKUPS', 3)
+        )
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        _logger.addHandler(handler)
+        _logger.setLevel(logging.INFO)
+
+
+def redact(value):
+    # ids, numbers, dates and flags help reading a plan, strings may be emails, names, password hashes
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ')
+    if isinstance(value, str):
+        return f"<str len={len(value)}>"
+    return f"<{type(value).__name__}>"
+
+
+def redact_parameters(parameters):
+    if isinstance(parameters, dict):
+        return {key: redact(value) for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [redact(value) for value in parameters]
+    return redact(parameters)
+
+
+def _origin():
+    if has_request_context():
+        return f"{request.method} {request.endpoint or request.path}"
+    return f"background:{threading.current_thread().name}"
+
+
+def _query_plan(cursor, statement, parameters):
+    try:
+        plan_cursor = cursor.connection.cursor()   # raw dbapi cursor, doesn't fire engine events again
+        plan_cursor.execute("EXPLAIN QUERY PLAN " + statement, parameters)
+        plan = [row[-1] for row in plan_cursor.fetchall()]
+        plan_cursor.close()
+        return plan
+    except Exception as exc:      # the plan is best effort, never break the request over it
+        return [f"plan unavailable: {exc}"]
+
+
+def log_slow_queries(app):
+    """
+    registers the timing listeners on every engine"""
+
+    @event.listens_for(Engine, 'before_cursor_execute')
+    def _slow_query_started(conn, cursor, statement, parameters, context, executemany):
+        conn.info['slow_query_started'] = time.perf_counter()
+
+    @event.listens_for(Engine, 'after_cursor_execute')
+    def _slow_query_finished(conn, cursor, statement, parameters, context, executemany):
+        threshold = app.config.get('SLOW_QUERY_MS', 100)
+        started = conn.info.pop('slow_query_started', None)
+        if threshold < 0 or started is None:
+            return
+        duration_ms = (time.perf_counter() - started) * 1000
+        if duration_ms < threshold:
+            return
+
+        plan = None
+        if conn.dialect.name == 'sqlite' and not executemany:
+            plan = _query_plan(cursor, statement, parameters)
+        _ensure_handler()
+        _logger.info(json.dumps({
+            'time': datetime.now().isoformat(timespec='seconds'),
+            'duration_ms': round(duration_ms, 2),
+            'origin': _origin(),
+            'sql': statement,
+            'parameters': "executemany" if executemany else redact_parameters(parameters),
+            'plan': plan,
+        }))
+
+
+# --------------------------- aggregation cli -------------------------------------
+
+_NUMBER = re.compile(r"\b\d+(\.\d+)?\b")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_IN_LIST = re.compile(r"\bIN\s*\(\s*(?:\?|:\w+|%\(\w+\)s)(?:\s*,\s*(?:\?|:\w+|%\(\w+\)s))*\s*\)", re.IGNORECASE)
+_POSTCOMPILE = re.compile(r"\(__\[POSTCOMPILE_\w+\]\)")
+_SPACES = re.compile(r"\s+")
+
+
+def statement_shape(sql):
+    """
+    sql with literals replaced by ? and IN lists of any length collapsed, so the same query with other
+    values groups together"""
+    shape = _STRING.sub('?', sql)
+    shape = _NUMBER.sub('?', shape)
+    shape = _POSTCOMPILE.sub('(...)', shape)
+    shape = _IN_LIST.sub('IN (...)', shape)
+    return _SPACES.sub(' ', shape).strip()
+
+
+def is_full_scan(plan):
+    # a SCAN without index over a table, scanning a materialized subquery/co-routine doesn't count
+    plan = plan or []
+    subqueries = {line.split()[1] for line in plan if line.startswith(('MATERIALIZE', 'CO-ROUTINE')) and len(line.split()) > 1}
+    return any(
+        line.startswith('SCAN') and 'INDEX' not in line and line.split()[1] not in subqueries
+        for line in plan if len(line.split()) > 1
+    )
+
+
+def aggregate_slow_log(path):
+    """
+    reads the log (and its rotated files) and returns one dict per statement shape, slowest total first"""
+    groups = defaultdict(lambda: {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'origins': defaultdict(int), 'plan': None})
+    for file_path in sorted(glob.glob(path + '*')):
+        with open(file_path) as log_file:
+            for line in log_file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                group = groups[statement_shape(entry['sql'])]
+                group['count'] += 1
+                group['total_ms'] += entry['duration_ms']
+                group['max_ms'] = max(group['max_ms'], entry['duration_ms'])
+                group['origins'][entry['origin']] += 1
+                group['plan'] = entry.get('plan') or group['plan']
+
+    result = [dict(shape=shape, **group) for shape, group in groups.items()]
+    result.sort(key=lambda group: group['total_ms'], reverse=True)
+    return result
+
+
+@app.cli.command('slow-queries')
+@click.option('--top', default=10, help="number of statement shapes to show")
+@click.option('--file', 'path', default=None, help="log file (defaults to SLOW_QUERY_LOG)")
+def slow_queries_command(top, path):
+    """Aggregate the slow query log by statement shape."""
+    groups = aggregate_slow_log(path or _log_path())
+    if not groups:
+        print("No slow queries logged.")
+        return
+    for group in groups[:top]:
+        flag = "  [FULL SCAN]" if is_full_scan(group['plan']) else ""
+        print(f"{group['count']:6d}x  total {group['total_ms']:10.1f} ms  avg {group['total_ms'] / group['count']:8.1f} ms  "
+              f"max {group['max_ms']:8.1f} ms{flag}")
+        print(f"    {group['shape']}")
+        origins = sorted(group['origins'].items(), key=lambda item: item[1], reverse=True)
+        print(f"    from: {', '.join(f'{origin} ({count})' for origin, count in origins[:5])}")
+        if group['plan']:
+            print(f"    plan: {' | '.join(group['plan'])}")
+        print()
@@ -0,0 +1,60 @@
+from flask import current_app
+
+
+# --------------------------- which free spot a new booking gets -------------------------------------
+
+# a strategy orders the free spots of a lot for a requested period, the allocator books the first one that
+# is still free. 'first_free' is the old behaviour (lowest spot id). 'best_fit' picks the spot whose
+# neighbouring bookings leave the smallest gaps around the new one, so short free stretches get filled
+# and long empty timelines stay available for long bookings instead of every spot ending up with
+# unusable holes. the strategy is chosen per lot (parkinglot.spot_assignment), lots without one use
+# SPOT_ASSIGNMENT_STRATEGY.
+#
+# a strategy is called as strategy(free_spot_ids, neighbours, parking_time, leaving_time) where
+# neighbours(spot_id) gives (leaving_time of the booking before, parking_time of the booking after),
+# None when the spot has nothing booked on that side.
+
+OPEN_ENDED = float('inf')
+
+
+def first_free(free_spot_ids, neighbours, parking_time, leaving_time):
+    return sorted(free_spot_ids)
+
+
+def best_fit(free_spot_ids, neighbours, parking_time, leaving_time):
+    def fit(spot_id):
+        before, after = neighbours(spot_id)
+        gaps = sorted(
+            gap.total_seconds() for gap in (
+                parking_time - before if before is not None else None,
+                after - leaving_time if after is not None else None,
+            ) if gap is not None
+        )
+        gaps += [OPEN_ENDED] * (2 - len(gaps))
+        # the spot where the booking fits tightest against an existing one, then the smaller other gap.
+        # spots with nothing booked around come last so their timelines stay whole
+        return gaps[0], gaps[1], spot_id
+
+    return sorted(free_spot_ids, key=fit)
+
+
+STRATEGIES = {
+    'first_free': first_free,
+    'best_fit': best_fit,
+}
+
+STRATEGY_LABELS = {
+    'first_free': "First free spot",
+    'best_fit': "Best fit (smallest gaps)",
+}
+
+
+def strategy_name(lot):
+    """
+    name of the strategy used for the lot (its own setting or the configured default)"""
+    name = getattr(lot, 'spot_assignment', None) or current_app.config.get('SPOT_ASSIGNMENT_STRATEGY', 'best_fit')
+    return name if name in STRATEGIES else 'first_free'
+
+
+def strategy_for(lot):
+    return STRATEGIES[strategy_name(lot)]
@@ -0,0 +1,256 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+import json
+import queue
+import threading
+import time
+
+from sqlalchemy import select, insert, delete, func, event
+from sqlalchemy.orm import Session
+from app import app
+from models.dbmodel import db, LotCounters, SpotEvent
+from .spot_grid import lot_spot_grid
+
+
+# --------------------------- live spot transitions for the admin spot grid (server-sent events) -------------------------------------
+
+# every change to a spot writes spot_event rows in the same transaction (record_spot_events), so the changes
+# made by every worker process and the scheduler end up in one ordered log. in each web process a single
+# thread, running only while some admin has a stream open, reads the new rows every SPOT_EVENTS_POLL seconds
+# (at once after a commit of this process), builds the new state of the changed spots once with the spot
+# grid queries and hands the same message to every open stream of that lot. a wall of monitoring screens
+# costs one primary key range query per process and poll instead of a page reload per screen.
+# streams start at "now", the page refreshes its grid (ETag, usually a 304) whenever a stream (re)connects.
+# on server databases ids are taken at insert but become visible at commit, so a lower id can show up after
+# a higher one was read. ids skipped over are remembered and looked up again on every poll for
+# SPOT_EVENTS_GAP_GRACE seconds (sqlite commits in id order, it never has such gaps).
+# every open stream holds a server thread for as long as it is open, size the workers accordingly.
+
+ACTIVATED, EXPIRED, RELEASED, BOOKED, ADDED, DELETED = 'activated', 'expired', 'released', 'booked', 'added', 'deleted'
+
+WHOLE_LOT_AFTER = 100    # more changed spots than this in one poll are sent as the whole grid
+MAX_MISSING = 5000       # skipped ids remembered at most (a bigger jump is a sequence jump, not open transactions)
+
+
+def record_spot_events(lot_id, kind, spot_ids=(None,)):
+    """
+    logs kind for the spots (spot_id None: many spots of the lot, e.g bulk add/remove) in the caller's
+    transaction, caller commits"""
+    now = datetime.now()
+    rows = [dict(lot_id=lot_id, spot_id=spot_id, kind=kind, created_at=now) for spot_id in spot_ids]
+    if rows:
+        db.session.execute(insert(SpotEvent), rows)
+        db.session.info['spot_events'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _wake_after_commit(session):
+    if session.info.pop('spot_events', False):
+        spot_event_hub.wake()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_after_rollback(session):
+    session.info.pop('spot_events', None)
+
+
+def prune_spot_events():
+    cutoff = datetime.now() - timedelta(seconds=app.config.get('SPOT_EVENTS_KEEP', 3600))
+    db.session.execute(delete(SpotEvent).where(SpotEvent.created_at < cutoff))
+    db.session.commit()
+
+
+def format_sse(name, data, event_id=None):
+    lines = [f"id: {event_id}"] if event_id is not None else []
+    lines += [f"event: {name}", f"data: {json.dumps(data)}"]
+    return "\n".join(lines) + "\n\n"
+
+
+class SpotEventStream:
+    """
+    one open stream: a bounded queue of formatted messages. a client that falls that far behind is closed
+    and told to resync, it reconnects and reloads the grid once"""
+
+    def __init__(self, lot_id, backlog):
+        self.lot_id = lot_id
+        self._messages = queue.Queue(maxsize=backlog)
+        self.closed = False
+
+    def put(self, message):
+        try:
+            self._messages.put_nowait(message)
+            return True
+        except queue.Full:
+            self.close()
+            return False
+
+    def close(self):
+        self.closed = True
+        try:
+            self._messages.put_nowait(None)
+        except queue.Full:
+            pass    # the reader finds closed set after the next heartbeat
+
+    def get(self, timeout):
+        """
+        next message, '' when nothing came within timeout, None once the stream is closed"""
+        if self.closed and self._messages.empty():
+            return None
+        try:
+            return self._messages.get(timeout=timeout)
+        except queue.Empty:
+            return None if self.closed else ''
+
+
+class SpotEventHub:
+
+    def __init__(self, flask_app):
+        self.app = flask_app
+        self._lock = threading.Lock()
+        self._streams = defaultdict(set)    # lot_id -> open SpotEventStreams
+        self._wake = threading.Event()
+        self._thread = None
+        self._last_id = 0
+        self._missing = {}      # ids below _last_id not seen yet -> monotonic time they were skipped
+        self.polls = 0
+
+    # -------- streams --------
+
+    def subscribe(self, lot_id):
+        """
+        opens a stream for the lot, None when this process already serves SPOT_EVENTS_MAX_STREAMS streams.
+        call within a request, the first stream reads where the log ends right away so nothing committed
+        after the page's grid refresh is missed"""
+        log_end = db.session.execute(select(func.max(SpotEvent.id))).scalar() or 0
+        with self._lock:
+            if sum(len(streams) for streams in self._streams.values()) >= self.app.config.get('SPOT_EVENTS_MAX_STREAMS', 200):
+                return None
+            stream = SpotEventStream(lot_id, self.app.config.get('SPOT_EVENTS_BACKLOG', 500))
+            self._streams[lot_id].add(stream)
+            if self._thread is None:
+                self._last_id = log_end
+                self._missing = {}
+                self._thread = threading.Thread(target=self._run, name="spot-events", daemon=True)
+                self._thread.start()
+        return stream
+
+    def unsubscribe(self, stream):
+        with self._lock:
+            streams = self._streams.get(stream.lot_id)
+            if streams is not None:
+                streams.discard(stream)
+                if not streams:
+                    del self._streams[stream.lot_id]
+        stream.close()
+
+    def stream_count(self):
+        with self._lock:
+            return sum(len(streams) for streams in self._streams.values())
+
+    def wake(self):
+        self._wake.set()
+
+    # -------- reading the log --------
+
+    def _messages_for_lot(self, lot_id, events):
+        """
+        sse messages for the (event_id, spot_id, kind) events of one lot, built once for all its streams"""
+        changed = {spot_id for _, spot_id, _ in events}
+        last_id = events[-1][0]
+        kinds = sorted({kind for _, _, kind in events})
+
+        counters = db.session.execute(
+            select(LotCounters.version, LotCounters.total_spots, LotCounters.occupied_spots)
+            .where(LotCounters.lot_id == lot_id)
+        ).first()
+        if counters is None:     # lot deleted
+            return [format_sse('lot_deleted', {'lot_id': lot_id}, last_id)]
+
+        if None in changed or len(changed) > WHOLE_LOT_AFTER:
+            grid = lot_spot_grid(lot_id)
+            return [format_sse('grid', {'lot_id': lot_id, 'kinds': kinds, 'version': counters.version, **grid}, last_id)]
+
+        states = {spot['spot_id']: spot for spot in lot_spot_grid(lot_id, spot_ids=changed)['spots']}
+        counts = {'total': counters.total_spots, 'occupied': counters.occupied_spots,
+                  'available': counters.total_spots - counters.occupied_spots}
+        return [
+            format_sse('spot', {'lot_id': lot_id, 'kind': kind, 'spot_id': spot_id, 'spot': states.get(spot_id),
+                                'counts': counts, 'version': counters.version}, event_id)
+            for event_id, spot_id, kind in events
+        ]
+
+    def _late_rows(self, columns, now):
+        """
+        rows of skipped ids that were committed since, ids skipped longer than the grace period are given up
+        (rolled back transactions)"""
+        grace = self.app.config.get('SPOT_EVENTS_GAP_GRACE', 10)
+        self._missing = {event_id: skipped for event_id, skipped in self._missing.items() if now - skipped < grace}
+        if not self._missing:
+            return []
+        rows = db.session.execute(select(*columns).where(SpotEvent.id.in_(list(self._missing)))).all()
+        for row in rows:
+            del self._missing[row.id]
+        return rows
+
+    def poll(self):
+        """
+        reads the log rows committed since the last poll (new ones and late commits of skipped ids) and
+        delivers them to the open streams of their lots. returns number of new rows read"""
+        now = time.monotonic()
+        columns = (SpotEvent.id, SpotEvent.lot_id, SpotEvent.spot_id, SpotEvent.kind)
+        late = self._late_rows(columns, now)
+        rows = db.session.execute(
+            select(*columns)
+            .where(SpotEvent.id > self._last_id)
+            .order_by(SpotEvent.id)
+            .limit(self.app.config.get('SPOT_EVENTS_BATCH', 1000))
+        ).all()
+        previous = self._last_id
+        for row in rows:
+            if len(self._missing) < MAX_MISSING:
+                for event_id in range(previous + 1, min(row.id, previous + 1 + MAX_MISSING - len(self._missing))):
+                    self._missing[event_id] = now
+            previous = row.id
+        if rows:
+            self._last_id = rows[-1].id
+        if not rows and not late:
+            db.session.commit()
+            return 0
+        self.polls += 1
+
+        with self._lock:
+            watched = {lot_id for lot_id, streams in self._streams.items() if streams}
+        events = defaultdict(list)
+        for row in sorted(late + rows, key=lambda row: row.id):
+            if row.lot_id in watched:
+                events[row.lot_id].append((row.id, row.spot_id, row.kind))
+
+        for lot_id, lot_events in events.items():
+            messages = self._messages_for_lot(lot_id, lot_events)
+            with self._lock:
+                streams = list(self._streams.get(lot_id, ()))
+            for stream in streams:
+                for message in messages:
+                    if not stream.put(message):
+                        break
+        db.session.commit()     # ends the read transaction, a long lived one would pin the sqlite wal
+        return len(rows)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._streams:
+                    self._thread = None
+                    return
+            with self.app.app_context():
+                try:
+                    while self.poll() >= self.app.config.get('SPOT_EVENTS_BATCH', 1000):
+                        pass    # backlog, keep reading
+                except Exception:
+                    db.session.rollback()
+                    self.app.logger.exception("spot event poll failed")
+            self._wake.wait(self.app.config.get('SPOT_EVENTS_POLL', 1.0))
+            self._wake.clear()
+
+
+spot_event_hub = SpotEventHub(app)
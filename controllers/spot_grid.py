@@ -0,0 +1,90 @@
+from datetime import datetime
+
+from sqlalchemy import select, func
+from models.dbmodel import db, User, ParkingSpot, UserBookings, LotCounters
+
+
+# --------------------------- whole lot spot grid for the admin parking_spots page -------------------------------------
+
+# the grid of a lot is built from a fixed number of queries (spots, current bookings with their users,
+# latest booking start per spot) no matter how many spots the lot has. its ETag is the lot's change version
+# from lot_counters, bumped in the same transaction as every booking/spot change, so a poll of an
+# unchanged lot is answered with 304 after a single primary key lookup.
+
+def lot_version(lot_id):
+    """
+    change version of the lot, None if the lot has no counters row (lot doesn't exist)"""
+    return db.session.execute(select(LotCounters.version).where(LotCounters.lot_id == lot_id)).scalar()
+
+
+def grid_etag(lot_id, version):
+    return f"lot-{lot_id}-v{version}"
+
+
+def lot_spot_grid(lot_id, now=None, spot_ids=None):
+    """
+    returns {'spots': [...], 'counts': {...}} with per spot: spot_id, status (A/O), display_status (A/O/F),
+    future_booked, current_booking (summary dict or None) and deletable. with spot_ids only those spots of
+    the lot are listed (and counted), same number of queries"""
+    now = now or datetime.now()
+    in_lot = [ParkingSpot.lot_id == lot_id]
+    if spot_ids is not None:
+        in_lot.append(ParkingSpot.spot_id.in_(spot_ids))
+
+    spots = db.session.execute(
+        select(ParkingSpot.spot_id, ParkingSpot.status)
+        .where(*in_lot)
+        .order_by(ParkingSpot.spot_id)
+    ).all()
+
+    current_bookings = {
+        row.spot_id: row for row in db.session.execute(
+            select(UserBookings.spot_id, UserBookings.vehicle_no, UserBookings.parking_time,
+                   UserBookings.leaving_time, UserBookings.parking_cost, User.user_name, User.email_id)
+            .join(ParkingSpot, ParkingSpot.spot_id == UserBookings.spot_id)
+            .join(User, User.user_id == UserBookings.user_id)
+            .where(*in_lot, UserBookings.parking_time <= now, UserBookings.leaving_time > now)
+        ).all()
+    }
+
+    # latest start per spot: after now means booked for the future, any row at all (expired ones not archived
+    # yet too) means the spot can't be deleted
+    latest_start = dict(db.session.execute(
+        select(UserBookings.spot_id, func.max(UserBookings.parking_time))
+        .join(ParkingSpot, ParkingSpot.spot_id == UserBookings.spot_id)
+        .where(*in_lot)
+        .group_by(UserBookings.spot_id)
+    ).all())
+
+    grid = []
+    occupied = 0
+    for spot_id, status in spots:
+        future_booked = spot_id in latest_start and latest_start[spot_id] > now
+        current = current_bookings.get(spot_id)
+        if status == 'O':
+            occupied += 1
+            display_status = 'O'
+        elif future_booked:
+            display_status = 'F'   # available but booked for future
+        else:
+            display_status = 'A'
+        grid.append({
+            'spot_id': spot_id,
+            'status': status,
+            'display_status': display_status,
+            'future_booked': future_booked,
+            'current_booking': {
+                'user_name': current.user_name,
+                'email': current.email_id,
+                'vehicle_no': current.vehicle_no,
+                'parking_time': current.parking_time.strftime("%d-%m-%Y %H:%M"),
+                'leaving_time': current.leaving_time.strftime("%d-%m-%Y %H:%M"),
+                'parking_cost': str(current.parking_cost)
+            } if current else None,
+            'deletable': spot_id not in latest_start
+        })
+
+    return {
+        'spots': grid,
+        'counts': {'total': len(spots), 'occupied': occupied, 'available': len(spots) - occupied}
+    }
@@ -0,0 +1,67 @@
+from sqlalchemy import select, insert, update, delete, literal, exists
+from models.dbmodel import db, ParkingSpot, UserBookings, UserHistory
+from .lot_counters import bump_lot_counters
+from .spot_events import record_spot_events, ADDED, DELETED
+
+
+# --------------------------- adding/removing many spots of a lot with set based statements -------------------------------------
+
+MAX_SPOTS_PER_ACTION = 5000   # upper bound for one add/remove request from the admin page
+SPOTS_PER_INSERT = 1000       # rows generated by one recursive cte, mysql stops recursing at 1000 by default
+                              # (cte_max_recursion_depth)
+
+
+def provision_spots(lot_id, count):
+    """
+    adds count available spots to the lot with INSERT ... SELECT over a generated number series, one statement
+    per SPOTS_PER_INSERT spots (no per row round trip or unit of work flush) and bumps the lot counters.
+    caller commits."""
+    if count <= 0:
+        return 0
+    for start in range(0, count, SPOTS_PER_INSERT):
+        rows = min(SPOTS_PER_INSERT, count - start)
+        numbers = select(literal(1).label('n')).cte('numbers', recursive=True)
+        numbers = numbers.union_all(select(numbers.c.n + 1).where(numbers.c.n < rows))
+        db.session.execute(
+            insert(ParkingSpot).from_select(
+                ['lot_id', 'status'],
+                select(literal(lot_id), literal('A')).select_from(numbers)
+            )
+        )
+    bump_lot_counters(lot_id, total=count)
+    record_spot_events(lot_id, ADDED)
+    return count
+
+
+def remove_free_spots(lot_id, count):
+    """
+    deletes up to count spots of the lot that are available and have no booking at all, newest spots first.
+    expired bookings count until the scheduler has archived them, deleting their spot before would leave them
+    pointing at nothing (and the booked counter off). the check is part of the DELETE itself so a booking
+    confirmed meanwhile can't lose its spot. returns the number of spots removed. caller commits."""
+    if count <= 0:
+        return 0
+    no_booking = ~exists().where(UserBookings.spot_id == ParkingSpot.spot_id)
+    free_spots = (
+        select(ParkingSpot.spot_id)
+        .where(ParkingSpot.lot_id == lot_id, ParkingSpot.status == 'A', no_booking)
+        .order_by(ParkingSpot.spot_id.desc())
+        .limit(count)
+    )
+    spot_ids = [row[0] for row in db.session.execute(free_spots).all()]
+    if not spot_ids:
+        return 0
+
+    removed = db.session.execute(
+        delete(ParkingSpot).where(ParkingSpot.spot_id.in_(spot_ids), ParkingSpot.status == 'A', no_booking)
+    ).rowcount
+    # history keeps the record, only loses the deleted spot (same as the SET NULL foreign key)
+    db.session.execute(
+        update(UserHistory)
+        .where(UserHistory.spot_id.in_(spot_ids), ~exists().where(ParkingSpot.spot_id == UserHistory.spot_id))
+        .values(spot_id=None)
+    )
+    bump_lot_counters(lot_id, total=-removed)
+    if removed:
+        record_spot_events(lot_id, DELETED)
+    return removed
@@ -1,9 +1,9 @@
 from app import app
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy import CheckConstraint
-from werkzeug.security import generate_password_hash
-import os          #Using for logic - db.sqlite3 file exists in its path or not
+from models.engine import engine_options, configure_engine
 
+app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config))
 db = SQLAlchemy(app)
 
 class User(db.Model):
@@ -11,7 +11,7 @@ class User(db.Model):
 
     user_id = db.Column(db.Integer, primary_key=True, unique=True, autoincrement=True)
     email_id = db.Column(db.String(50), unique=True, nullable=False)
-    pass_wd = db.Column(db.String(100), nullable=False)
+    pass_wd = db.Column(db.String(255), nullable=False)   # werkzeug hashes: scrypt 162 chars, pbkdf2 ~100
     user_name = db.Column(db.String(50), nullable=False)
     is_admin = db.Column(db.Boolean, default=False)
 
@@ -34,6 +34,13 @@ class UserBookings(db.Model):
     spot = db.relationship('ParkingSpot', back_populates='bookings')
     # removed the redundant lot-relationship here. Access via booking.spot.lot
 
+    # indexes for the hot queries, existing databases get them through models/migrations.py
+    __table_args__ = (
+        db.Index('ix_user_bookings_spot_period', 'spot_id', 'parking_time', 'leaving_time'),  # overlap checks
+        db.Index('ix_user_bookings_user_leaving', 'user_id', 'leaving_time'),                 # per user status sweep
+        db.Index('ix_user_bookings_leaving', 'leaving_time'),                                 # expiry
+    )
+
 class UserHistory(db.Model):
     __tablename__ = 'booking_history'
 
@@ -49,6 +56,11 @@ class UserHistory(db.Model):
     # using back_populates to link with 'history_records' on ParkingSpot
     spot_obj = db.relationship('ParkingSpot', back_populates='history_records')
 
+    __table_args__ = (
+        db.Index('ix_booking_history_user_id', 'user_id', 'id'),  # user history pages (keyset on id)
+        db.Index('ix_booking_history_spot', 'spot_id'),           # summaries
+    )
+
 
 class ParkingLot(db.Model):
     __tablename__ = 'parkinglot'
@@ -60,13 +72,19 @@ class ParkingLot(db.Model):
     price_per_hr = db.Column(db.Float, nullable=False)
     address = db.Column(db.String(200), unique=True, nullable=False)
     pincode = db.Column(db.String(6), nullable=False)
+    spot_assignment = db.Column(db.String(20), nullable=True)  # 'first_free'/'best_fit', None = SPOT_ASSIGNMENT_STRATEGY
+    latitude = db.Column(db.Float, nullable=True)   # located from the pincode (pincode_location), None if unknown
+    longitude = db.Column(db.Float, nullable=True)
 
     # Removed: max_spots and occupied_spots from parkinglot they caused heavy inconsistency 
+    # counts now live in lot_counters, updated in the same transaction as every change and reconciled periodically
 
     spots = db.relationship('ParkingSpot', backref='lot', cascade="all, delete-orphan", passive_deletes=False)
+    counters = db.relationship('LotCounters', uselist=False, cascade="all, delete-orphan", passive_deletes=False)
 
     __table_args__ = (
         db.CheckConstraint("area_type IN ('Open','Covered','Both')", name='check_area_type'),
+        db.Index('ix_parkinglot_city_pincode', 'city', 'pincode'),  # search
     )
     
     
@@ -83,77 +101,89 @@ class ParkingSpot(db.Model):
 
     __table_args__ = (
         CheckConstraint("status IN ('O','A')", name='check_status_occupied'),
+        db.Index('ix_parking_spot_lot_status', 'lot_id', 'status'),  # spots of a lot
+    )
+
+
+class LotCounters(db.Model):
+    __tablename__ = 'lot_counters'
+
+    lot_id = db.Column(db.Integer, db.ForeignKey("parkinglot.lot_id", ondelete="CASCADE"), primary_key=True)
+    total_spots = db.Column(db.Integer, nullable=False, default=0)     # rows in parking_spot
+    occupied_spots = db.Column(db.Integer, nullable=False, default=0)  # spots with status 'O'
+    booked_spots = db.Column(db.Integer, nullable=False, default=0)    # rows in user_bookings i.e current + future bookings
+    version = db.Column(db.Integer, nullable=False, default=0)         # +1 on every change of the lot's spots/bookings (spot grid ETag)
+
+
+# booking_history pre-aggregated for the summary pages, incremented whenever bookings are moved to history
+class LotDailyRollup(db.Model):
+    __tablename__ = 'rollup_lot_day'
+
+    lot_id = db.Column(db.Integer, db.ForeignKey("parkinglot.lot_id", ondelete="CASCADE"), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)                     # day the parking started
+    bookings = db.Column(db.Integer, nullable=False, default=0)
+    parking_cost = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    hours = db.Column(db.Float, nullable=False, default=0)
+
+    __table_args__ = (
+        db.Index('ix_rollup_lot_day_bookings', 'lot_id', 'bookings'),   # per lot totals without touching the table
+    )
+
+
+class UserLotRollup(db.Model):
+    __tablename__ = 'rollup_user_lot'
+
+    user_id = db.Column(db.Integer, db.ForeignKey("user.user_id", ondelete="CASCADE"), primary_key=True)
+    lot_id = db.Column(db.Integer, db.ForeignKey("parkinglot.lot_id", ondelete="CASCADE"), primary_key=True)
+    bookings = db.Column(db.Integer, nullable=False, default=0)
+    parking_cost = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    hours = db.Column(db.Float, nullable=False, default=0)
+
+
+# totals of the whole booking_history the per lot rollups can't give: history of deleted lots/spots is still
+# history. maintained together with the rollups
+class RollupTotal(db.Model):
+    __tablename__ = 'rollup_total'
+
+    name = db.Column(db.String(50), primary_key=True)           # 'history': rows in booking_history
+    bookings = db.Column(db.Integer, nullable=False, default=0)
+
+
+class CacheVersion(db.Model):
+    __tablename__ = 'cache_version'
+
+    # bumped in the same transaction as the data it describes so every worker process can tell its cached copy is stale
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+
+class PincodeLocation(db.Model):
+    __tablename__ = 'pincode_location'
+
+    # 6 digit pincodes, or 3 digit prefixes (sorting district) used when the exact pincode isn't listed
+    pincode = db.Column(db.String(6), primary_key=True)
+    latitude = db.Column(db.Float, nullable=False)
+    longitude = db.Column(db.Float, nullable=False)
+
+
+class SpotEvent(db.Model):
+    __tablename__ = 'spot_event'
+
+    # log of spot transitions written in the same transaction as the change, read by the admin grid's live
+    # stream (controllers/spot_events.py) and pruned after SPOT_EVENTS_KEEP seconds
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    lot_id = db.Column(db.Integer, nullable=False)     # no foreign key, 'deleted' of a lot outlives the lot
+    spot_id = db.Column(db.Integer, nullable=True)     # None: many spots of the lot changed at once
+    kind = db.Column(db.String(10), nullable=False)    # activated/expired/released/booked/added/deleted
+    created_at = db.Column(db.DateTime, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_spot_event_created', 'created_at'),   # pruning
     )
 
 
 with app.app_context():
-    db_uri = app.config.get('SQLALCHEMY_DATABASE_URI')            #get dbfile configured path in app config like 'sqlite///filename'
-    db_filename = db_uri.replace('sqlite:///', '')                #remove "sqlite:///" from fetched configured path so just filename
-    db_file_path = os.path.join(app.instance_path, db_filename)   #join with file name with root folder/instance/filename
-    db_existed_bef_create_all = os.path.exists(db_file_path)      #check if a files exists in that path 
-    #print(f"DEBUG: checking for DB file at: {db_file_path}")     #to debug, showed correct behaviour therefore commented
-    db.create_all()
-
-    # -------------------- create Master User Admin (only if not exists) ----------------------
-    admin_email = "parkalot@admin"
-    admin_password = "1234"
-    admin_username = "Admin"
-    
-    # Check if the admin user already exists
-    existing_admin = User.query.filter_by(is_admin=True).first()
-
-    if not existing_admin:
-        passhash = generate_password_hash(admin_password)
-        master_admin = User(user_id=1, email_id=admin_email, pass_wd=passhash, user_name=admin_username, is_admin=True)
-        db.session.add(master_admin)
-        db.session.commit()
-        print(f"Master Admin user '{admin_username}' ({admin_email}) created successfully with ID 1.") 
-    else:
-        print(f"Master Admin user '{admin_email}' already exists. Skipping creation.")
-
-
-    # ---------------------- Populate dummy parking lot data, only add if new db/tables created --------------------
-
-    if not db_existed_bef_create_all:
-        print("Populating dummy parking lot data...")
-        
-        # all parkinglots data nested list of dictionaries
-        dummy_parking_lots_data = [
-            {"area_type": "Open", "city": "Mumbai", "primelocation_name": "Gateway Gardens", "price_per_hr": 60.0, "address": "101 Marine Drive, Mumbai", "pincode": "400001"},
-            {"area_type": "Covered", "city": "Delhi", "primelocation_name": "Connaught Place Hub", "price_per_hr": 55.0, "address": "202 Barakhamba Rd, Delhi", "pincode": "110001"},
-            {"area_type": "Both", "city": "Noida", "primelocation_name": "Sector 18 Plaza", "price_per_hr": 45.0, "address": "303 Main Rd, Noida", "pincode": "201301"},
-            {"area_type": "Open", "city": "Gurugram", "primelocation_name": "Cyber City Parking", "price_per_hr": 50.0, "address": "404 Cyber Hub, Gurugram", "pincode": "122001"},
-            {"area_type": "Covered", "city": "Bangalore", "primelocation_name": "MG Road Garage", "price_per_hr": 70.0, "address": "505 MG Rd, Bangalore", "pincode": "560001"},
-            {"area_type": "Open", "city": "Pune", "primelocation_name": "Deccan Gymkhana Lot", "price_per_hr": 35.0, "address": "606 FC Rd, Pune", "pincode": "411004"},
-            {"area_type": "Both", "city": "Hyderabad", "primelocation_name": "Hitech City Towers", "price_per_hr": 50.0, "address": "707 Mindspace, Hyderabad", "pincode": "500081"},
-            {"area_type": "Open", "city": "Chennai", "primelocation_name": "Besant Nagar Beach", "price_per_hr": 40.0, "address": "808 Beach Rd, Chennai", "pincode": "600090"},
-            {"area_type": "Covered", "city": "Ahmedabad", "primelocation_name": "Sabarmati Riverfront", "price_per_hr": 30.0, "address": "909 Riverfront East, Ahmedabad", "pincode": "380001"},
-            {"area_type": "Open", "city": "Jaipur", "primelocation_name": "Pink City Bazaar", "price_per_hr": 38.0, "address": "1010 Hawa Mahal Rd, Jaipur", "pincode": "302002"},
-            {"area_type": "Both", "city": "Kolkata", "primelocation_name": "Park Street Hub", "price_per_hr": 42.0, "address": "1111 Park St, Kolkata", "pincode": "700016"},
-            {"area_type": "Open", "city": "Indore", "primelocation_name": "Rajwada Palace Lot", "price_per_hr": 25.0, "address": "1212 MG Rd, Indore", "pincode": "452001"},
-            {"area_type": "Covered", "city": "Bhopal", "primelocation_name": "Upper Lake Parking", "price_per_hr": 28.0, "address": "1313 Lake View Rd, Bhopal", "pincode": "462001"},
-            {"area_type": "Open", "city": "Lucknow", "primelocation_name": "Hazratganj Market", "price_per_hr": 30.0, "address": "1414 Ganj Rd, Lucknow", "pincode": "226001"},
-            {"area_type": "Both", "city": "Chandigarh", "primelocation_name": "Sector 17 Plaza", "price_per_hr": 38.0, "address": "1515 Sector 17, Chandigarh", "pincode": "160017"},
-            {"area_type": "Open", "city": "Kochi", "primelocation_name": "Fort Kochi Parking", "price_per_hr": 32.0, "address": "1616 Fort Rd, Kochi", "pincode": "682001" }
-            ]
-
-        for lot_data in dummy_parking_lots_data:
-            new_lot = ParkingLot(
-                area_type=lot_data["area_type"], 
-                city=lot_data["city"],
-                primelocation_name=lot_data["primelocation_name"], 
-                price_per_hr=lot_data["price_per_hr"], 
-                address=lot_data["address"], 
-                pincode=lot_data["pincode"])
-            
-            db.session.add(new_lot)
-            db.session.flush() # get lot_id before commit
-
-            # add 10 spots for each lot 
-            for _ in range(10): 
-                db.session.add(ParkingSpot(lot_id=new_lot.lot_id, status='A'))
-            
-        db.session.commit()
-        print("Dummy parking lot data populated.")
-    else:
-        print("Parking lot data already exists. Skipping dummy data population.")
\ No newline at end of file
+    configure_engine(app, db)   #pragmas (sqlite) on every new connection, creating the engine doesn't connect yet
+
+# creating tables, the admin user and demo data is done by `flask init-db`, `flask create-admin` and
+# `flask seed` (models/setup.py), importing the app never touches the database
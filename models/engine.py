@@ -0,0 +1,96 @@
+from sqlalchemy import event, inspect
+from sqlalchemy.engine import make_url
+from app import app
+
+
+# --------------------------- database engine configuration -------------------------------------
+
+# everything backend specific about the connection lives here so the rest of the app only sees
+# SQLALCHEMY_DATABASE_URI. sqlite gets WAL (readers don't block behind the writer), a busy timeout
+# instead of failing at once with "database is locked", and a bigger page cache, all set on every new
+# connection. server databases (postgresql://, mysql://, ...) get a sized connection pool instead.
+
+def is_sqlite(uri):
+    return make_url(uri).get_backend_name() == 'sqlite'
+
+
+def is_memory_sqlite(uri):
+    url = make_url(uri)
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+
+def engine_options(config):
+    """
+    SQLALCHEMY_ENGINE_OPTIONS for the configured database uri"""
+    uri = config['SQLALCHEMY_DATABASE_URI']
+    if not uri:
+        return {}   # let flask-sqlalchemy report the missing setting
+    options = {'pool_pre_ping': not is_sqlite(uri)}
+
+    if is_sqlite(uri):
+        # the driver level timeout is the same thing as busy_timeout, keep them equal
+        options['connect_args'] = {'timeout': config['DB_BUSY_TIMEOUT_MS'] / 1000}
+        if is_memory_sqlite(uri):
+            return options      # single connection pool, nothing to size
+
+    options.update(
+        pool_size=config['DB_POOL_SIZE'],
+        max_overflow=config['DB_MAX_OVERFLOW'],
+        pool_timeout=config['DB_POOL_TIMEOUT'],
+    )
+    if not is_sqlite(uri):
+        options['pool_recycle'] = config['DB_POOL_RECYCLE']   # server closes idle connections
+    return options
+
+
+def sqlite_pragmas(config):
+    return [
+        ('journal_mode', config['DB_SQLITE_JOURNAL_MODE']),
+        ('synchronous', config['DB_SQLITE_SYNCHRONOUS']),
+        ('busy_timeout', config['DB_BUSY_TIMEOUT_MS']),
+        ('cache_size', config['DB_SQLITE_CACHE_SIZE']),
+    ]
+
+
+def configure_engine(app, db):
+    """
+    registers the per connection setup on the app's engine, call inside an app context
+    before the first query"""
+    if db.engine.dialect.name != 'sqlite':
+        return
+    pragmas = sqlite_pragmas(app.config)
+
+    @event.listens_for(db.engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas:
+            cursor.execute(f"PRAGMA {name} = {value}")
+        cursor.close()
+
+
+def schema_exists(db, table_name):
+    """
+    whether the app tables were already created, asked from the database itself so it works for
+    any uri (relative/absolute sqlite path, in memory, server databases)"""
+    return inspect(db.engine).has_table(table_name)
+
+
+def engine_info(db):
+    """
+    backend, pool and (sqlite) pragma values actually in effect, for `flask db-info`"""
+    info = {'backend': db.engine.dialect.name, 'driver': db.engine.driver,
+            'database': db.engine.url.render_as_string(hide_password=True),
+            'pool': db.engine.pool.status()}
+    if db.engine.dialect.name == 'sqlite':
+        with db.engine.connect() as connection:
+            for name in ('journal_mode', 'synchronous', 'busy_timeout', 'cache_size'):
+                info[name] = connection.exec_driver_sql(f"PRAGMA {name}").scalar()
+    return info
+
+
+@app.cli.command('db-info')
+def db_info_command():
+    """Show the database backend, pool status and SQLite pragmas in effect."""
+    from models.dbmodel import db
+    for key, value in engine_info(db).items():
+        print(f"{key:14s} {value}")
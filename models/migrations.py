@@ -0,0 +1,225 @@
+from datetime import datetime
+
+from sqlalchemy import text, inspect
+from app import app
+
+
+# --------------------------- versioned schema migrations -------------------------------------
+
+# db.create_all() only creates missing tables, it never adds an index to a table that already exists.
+# every schema change after the first release is added here as (version, description, statements) and
+# applied once, in order, by `flask init-db` or `flask db-upgrade`. starting the app never migrates, run one of
+# them on every deploy before the new code serves requests. the applied version is kept in schema_version.
+# statements must be safe to run on a fresh db where create_all already created everything (IF NOT EXISTS).
+# a statement given as (dialect, sql) only runs on that database backend, a callable is called with db.
+
+
+def add_column(table, column, ddl):
+    # ALTER TABLE ... ADD COLUMN has no IF NOT EXISTS and on a fresh db create_all already added the column
+    def apply(db):
+        if column not in {c['name'] for c in inspect(db.engine).get_columns(table)}:
+            db.session.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+    return apply
+
+
+def backfill_rollups(db):
+    # tables are created by create_all, fill them from the history that is already there
+    from controllers.rollups import rebuild_rollups
+    rebuild_rollups()
+
+
+def count_history(db):
+    from controllers.rollups import set_history_total
+    set_history_total()
+
+
+def locate_existing_lots(db):
+    # bundled pincode table if nothing was loaded yet, then coordinates for the lots that are already there
+    from controllers.nearby import load_pincode_locations, locate_lots
+    from controllers.catalog import lot_catalog
+    from models.dbmodel import PincodeLocation
+    if not db.session.query(PincodeLocation.pincode).first():
+        load_pincode_locations()
+    if locate_lots():
+        lot_catalog.invalidate()
+
+
+MIGRATIONS = [
+    (1, "indexes for hot query shapes", [
+        "CREATE INDEX IF NOT EXISTS ix_user_bookings_spot_period ON user_bookings (spot_id, parking_time, leaving_time)",
+        "CREATE INDEX IF NOT EXISTS ix_user_bookings_user_leaving ON user_bookings (user_id, leaving_time)",
+        "CREATE INDEX IF NOT EXISTS ix_user_bookings_leaving ON user_bookings (leaving_time)",
+        "CREATE INDEX IF NOT EXISTS ix_booking_history_user_id ON booking_history (user_id, id)",
+        "CREATE INDEX IF NOT EXISTS ix_booking_history_spot ON booking_history (spot_id)",
+        "CREATE INDEX IF NOT EXISTS ix_parkinglot_city_pincode ON parkinglot (city, pincode)",
+        "CREATE INDEX IF NOT EXISTS ix_parking_spot_lot_status ON parking_spot (lot_id, status)",
+    ]),
+    (2, "no overlapping bookings on a spot", [
+        ('sqlite', "CREATE TRIGGER IF NOT EXISTS trg_user_bookings_no_overlap_insert BEFORE INSERT ON user_bookings "
+                   "WHEN EXISTS (SELECT 1 FROM user_bookings WHERE spot_id = NEW.spot_id "
+                   "AND parking_time < NEW.leaving_time AND leaving_time > NEW.parking_time) "
+                   "BEGIN SELECT RAISE(ABORT, 'overlapping booking for spot'); END"),
+        ('sqlite', "CREATE TRIGGER IF NOT EXISTS trg_user_bookings_no_overlap_update "
+                   "BEFORE UPDATE OF spot_id, parking_time, leaving_time ON user_bookings "
+                   "WHEN EXISTS (SELECT 1 FROM user_bookings WHERE spot_id = NEW.spot_id AND id != NEW.id "
+                   "AND parking_time < NEW.leaving_time AND leaving_time > NEW.parking_time) "
+                   "BEGIN SELECT RAISE(ABORT, 'overlapping booking for spot'); END"),
+    ]),
+    (3, "per lot change version", [
+        add_column('lot_counters', 'version', "INTEGER NOT NULL DEFAULT 0"),
+    ]),
+    (4, "booking rollups from existing history", [
+        "CREATE INDEX IF NOT EXISTS ix_rollup_lot_day_bookings ON rollup_lot_day (lot_id, bookings)",
+        backfill_rollups,
+    ]),
+    (5, "per lot spot assignment strategy", [
+        add_column('parkinglot', 'spot_assignment', "VARCHAR(20)"),
+    ]),
+    (6, "lot coordinates for nearest lot search", [
+        add_column('parkinglot', 'latitude', "FLOAT"),
+        add_column('parkinglot', 'longitude', "FLOAT"),
+        locate_existing_lots,
+    ]),
+    (7, "spot event log for the live spot grid", [
+        # table created by create_all
+        "CREATE INDEX IF NOT EXISTS ix_spot_event_created ON spot_event (created_at)",
+    ]),
+    (8, "no overlapping bookings on a spot (postgresql)", [
+        # same guard as the sqlite triggers of migration 2, enforced across all worker processes. fails if the
+        # table already holds overlapping bookings, those have to be resolved first
+        ('postgresql', "CREATE EXTENSION IF NOT EXISTS btree_gist"),
+        ('postgresql', "DO $$ BEGIN "
+                       "IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'ex_user_bookings_no_overlap') THEN "
+                       "ALTER TABLE user_bookings ADD CONSTRAINT ex_user_bookings_no_overlap "
+                       "EXCLUDE USING gist (spot_id WITH =, tsrange(parking_time, leaving_time) WITH &&); "
+                       "END IF; END $$"),
+    ]),
+    (9, "exact booking history total", [
+        # table created by create_all
+        count_history,
+    ]),
+    (10, "password hashes up to 255 characters", [
+        # a scrypt hash (the default PASSWORD_HASH_METHOD) is 162 characters. sqlite doesn't enforce varchar
+        # lengths, server databases reject the longer hashes on register and on the rehash at login
+        ('postgresql', 'ALTER TABLE "user" ALTER COLUMN pass_wd TYPE VARCHAR(255)'),
+        ('mysql', "ALTER TABLE user MODIFY pass_wd VARCHAR(255) NOT NULL"),
+    ]),
+]
+
+
+def current_schema_version(db):
+    db.session.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_version ("
+        "version INTEGER PRIMARY KEY, description VARCHAR(200) NOT NULL, applied_at DATETIME NOT NULL)"
+    ))
+    return db.session.execute(text("SELECT MAX(version) FROM schema_version")).scalar() or 0
+
+
+def run_migrations(db, verify=True):
+    """
+    applies pending migrations, each in its own transaction, then checks the query plans of the hot queries.
+    returns list of applied versions"""
+    applied = []
+    version = current_schema_version(db)
+    db.session.commit()
+
+    for migration_version, description, statements in MIGRATIONS:
+        if migration_version <= version:
+            continue
+        for statement in statements:
+            if callable(statement):
+                statement(db)
+                continue
+            if isinstance(statement, tuple):
+                dialect, statement = statement
+                if dialect != db.engine.dialect.name:
+                    continue
+            db.session.execute(text(statement))
+        db.session.execute(
+            text("INSERT INTO schema_version (version, description, applied_at) VALUES (:v, :d, :t)"),
+            {'v': migration_version, 'd': description, 't': datetime.now()}
+        )
+        db.session.commit()
+        applied.append(migration_version)
+        print(f"Applied migration {migration_version}: {description}")
+
+    if applied and verify:
+        for name, ok, plan in verify_index_usage(db):
+            if not ok:
+                app.logger.warning("hot query '%s' does not use an index: %s", name, " | ".join(plan))
+    return applied
+
+
+# --------------------------- query plan verification -------------------------------------
+
+# the hot query shapes from the routes/scheduler with sample parameters
+HOT_QUERIES = [
+    ("booking overlap per spot",
+     "SELECT id FROM user_bookings WHERE spot_id = :spot AND parking_time < :t2 AND leaving_time > :t1",
+     {'spot': 1, 't1': datetime(2025, 1, 1), 't2': datetime(2025, 1, 2)}),
+    ("per user status sweep",
+     "SELECT id FROM user_bookings WHERE user_id = :user AND leaving_time <= :t",
+     {'user': 1, 't': datetime(2025, 1, 1)}),
+    ("global expiry sweep",
+     "SELECT id FROM user_bookings WHERE leaving_time <= :t",
+     {'t': datetime(2025, 1, 1)}),
+    ("user history page",
+     "SELECT id FROM booking_history WHERE user_id = :user AND id < :before ORDER BY id DESC LIMIT 26",
+     {'user': 1, 'before': 100}),
+    ("history per spot (summaries)",
+     "SELECT COUNT(id) FROM booking_history WHERE spot_id = :spot",
+     {'spot': 1}),
+    ("lot search by city and pincode",
+     "SELECT lot_id FROM parkinglot WHERE city = :city AND pincode = :pincode",
+     {'city': 'Mumbai', 'pincode': '400001'}),
+    ("summary top lots",
+     "SELECT lot_id, SUM(bookings) FROM rollup_lot_day GROUP BY lot_id",
+     {}),
+    ("spots of a lot",
+     "SELECT spot_id FROM parking_spot WHERE lot_id = :lot",
+     {'lot': 1}),
+    ("free spots per lot for a time window",
+     "SELECT s.lot_id, COUNT(*) FROM parking_spot s WHERE s.lot_id IN (:lot1, :lot2) AND NOT EXISTS "
+     "(SELECT 1 FROM user_bookings b WHERE b.spot_id = s.spot_id AND b.parking_time < :t2 AND b.leaving_time > :t1) "
+     "GROUP BY s.lot_id",
+     {'lot1': 1, 'lot2': 2, 't1': datetime(2025, 1, 1), 't2': datetime(2025, 1, 2)}),
+    ("new spot events since the last poll",
+     "SELECT id, lot_id, spot_id, kind FROM spot_event WHERE id > :last ORDER BY id LIMIT 1000",
+     {'last': 0}),
+    ("spot event pruning",
+     "DELETE FROM spot_event WHERE created_at < :t",
+     {'t': datetime(2025, 1, 1)}),
+]
+
+
+def verify_index_usage(db):
+    """
+    runs EXPLAIN QUERY PLAN (sqlite) for every hot query and returns [(name, uses_index, plan lines)].
+    a plan line starting with SCAN that doesn't go through an index means a full table scan"""
+    if db.engine.dialect.name != 'sqlite':
+        return []
+    results = []
+    for name, sql, params in HOT_QUERIES:
+        plan = [row[-1] for row in db.session.execute(text("EXPLAIN QUERY PLAN " + sql), params).all()]
+        full_scan = any(line.startswith('SCAN') and 'INDEX' not in line for line in plan)
+        results.append((name, not full_scan, plan))
+    return results
+
+
+@app.cli.command('db-upgrade')
+def db_upgrade_command():
+    """Apply pending schema migrations."""
+    from models.dbmodel import db
+    if not run_migrations(db):
+        print("Database schema is up to date.")
+
+
+@app.cli.command('db-verify-indexes')
+def db_verify_indexes_command():
+    """Show the query plan of every hot query and whether it uses an index."""
+    from models.dbmodel import db
+    results = verify_index_usage(db)
+    if not results:
+        print("Query plan verification is only available for SQLite.")
+    for name, ok, plan in results:
+        print(f"[{'OK' if ok else 'FULL SCAN'}] {name}: {' | '.join(plan)}")
@@ -0,0 +1,134 @@
+import click
+from app import app
+from models.dbmodel import db, User, ParkingLot, ParkingSpot, LotCounters
+from models.migrations import run_migrations
+from models.engine import schema_exists
+from controllers.passwords import password_hasher
+from controllers.nearby import locate_lots
+
+
+# --------------------------- database setup, run explicitly instead of on import -------------------------------------
+
+# importing the app used to create the tables, run the migrations, hash the admin password and seed the demo
+# lots on every start of every process (web workers, scheduler, cli). these are one time steps now:
+#   flask init-db        tables + pending migrations
+#   flask create-admin   master admin user (if there is none yet)
+#   flask seed           demo parking lots (only into an empty db)
+# `flask init-db --demo` does all three, like the first start of the app used to.
+
+DEFAULT_ADMIN_EMAIL = "parkalot@admin"
+DEFAULT_ADMIN_PASSWORD = "1234"
+DEFAULT_ADMIN_NAME = "Admin"
+DEMO_SPOTS_PER_LOT = 10
+
+DEMO_PARKING_LOTS = [
+    {"area_type": "Open", "city": "Mumbai", "primelocation_name": "Gateway Gardens", "price_per_hr": 60.0, "address": "101 Marine Drive, Mumbai", "pincode": "400001"},
+    {"area_type": "Covered", "city": "Delhi", "primelocation_name": "Connaught Place Hub", "price_per_hr": 55.0, "address": "202 Barakhamba Rd, Delhi", "pincode": "110001"},
+    {"area_type": "Both", "city": "Noida", "primelocation_name": "Sector 18 Plaza", "price_per_hr": 45.0, "address": "303 Main Rd, Noida", "pincode": "201301"},
+    {"area_type": "Open", "city": "Gurugram", "primelocation_name": "Cyber City Parking", "price_per_hr": 50.0, "address": "404 Cyber Hub, Gurugram", "pincode": "122001"},
+    {"area_type": "Covered", "city": "Bangalore", "primelocation_name": "MG Road Garage", "price_per_hr": 70.0, "address": "505 MG Rd, Bangalore", "pincode": "560001"},
+    {"area_type": "Open", "city": "Pune", "primelocation_name": "Deccan Gymkhana Lot", "price_per_hr": 35.0, "address": "606 FC Rd, Pune", "pincode": "411004"},
+    {"area_type": "Both", "city": "Hyderabad", "primelocation_name": "Hitech City Towers", "price_per_hr": 50.0, "address": "707 Mindspace, Hyderabad", "pincode": "500081"},
+    {"area_type": "Open", "city": "Chennai", "primelocation_name": "Besant Nagar Beach", "price_per_hr": 40.0, "address": "808 Beach Rd, Chennai", "pincode": "600090"},
+    {"area_type": "Covered", "city": "Ahmedabad", "primelocation_name": "Sabarmati Riverfront", "price_per_hr": 30.0, "address": "909 Riverfront East, Ahmedabad", "pincode": "380001"},
+    {"area_type": "Open", "city": "Jaipur", "primelocation_name": "Pink City Bazaar", "price_per_hr": 38.0, "address": "1010 Hawa Mahal Rd, Jaipur", "pincode": "302002"},
+    {"area_type": "Both", "city": "Kolkata", "primelocation_name": "Park Street Hub", "price_per_hr": 42.0, "address": "1111 Park St, Kolkata", "pincode": "700016"},
+    {"area_type": "Open", "city": "Indore", "primelocation_name": "Rajwada Palace Lot", "price_per_hr": 25.0, "address": "1212 MG Rd, Indore", "pincode": "452001"},
+    {"area_type": "Covered", "city": "Bhopal", "primelocation_name": "Upper Lake Parking", "price_per_hr": 28.0, "address": "1313 Lake View Rd, Bhopal", "pincode": "462001"},
+    {"area_type": "Open", "city": "Lucknow", "primelocation_name": "Hazratganj Market", "price_per_hr": 30.0, "address": "1414 Ganj Rd, Lucknow", "pincode": "226001"},
+    {"area_type": "Both", "city": "Chandigarh", "primelocation_name": "Sector 17 Plaza", "price_per_hr": 38.0, "address": "1515 Sector 17, Chandigarh", "pincode": "160017"},
+    {"area_type": "Open", "city": "Kochi", "primelocation_name": "Fort Kochi Parking", "price_per_hr": 32.0, "address": "1616 Fort Rd, Kochi", "pincode": "682001" }
+    ]
+
+
+def init_db():
+    """
+    creates missing tables and applies pending migrations, returns (schema existed before, applied versions)"""
+    existed = schema_exists(db, ParkingLot.__tablename__)
+    db.create_all()
+    return existed, run_migrations(db)
+
+
+def create_admin(email=DEFAULT_ADMIN_EMAIL, password=DEFAULT_ADMIN_PASSWORD, name=DEFAULT_ADMIN_NAME):
+    """
+    creates the master admin unless an admin already exists, returns (admin user, created)"""
+    existing_admin = User.query.filter_by(is_admin=True).first()
+    if existing_admin:
+        return existing_admin, False
+
+    master_admin = User(email_id=email, pass_wd=password_hasher.hash(password), user_name=name, is_admin=True)
+    db.session.add(master_admin)
+    db.session.commit()
+    return master_admin, True
+
+
+def seed_demo_lots():
+    """
+    adds the demo lots with their spots and counters if there are no lots yet, returns number of lots added"""
+    if db.session.execute(db.select(ParkingLot.lot_id).limit(1)).first():
+        return 0
+
+    for lot_data in DEMO_PARKING_LOTS:
+        new_lot = ParkingLot(
+            area_type=lot_data["area_type"],
+            city=lot_data["city"],
+            primelocation_name=lot_data["primelocation_name"],
+            price_per_hr=lot_data["price_per_hr"],
+            address=lot_data["address"],
+            pincode=lot_data["pincode"])
+
+        db.session.add(new_lot)
+        db.session.flush() # get lot_id before commit
+
+        # add the spots for each lot, one multi-row insert
+        db.session.execute(db.insert(ParkingSpot), [dict(lot_id=new_lot.lot_id, status='A') for _ in range(DEMO_SPOTS_PER_LOT)])
+        db.session.add(LotCounters(lot_id=new_lot.lot_id, total_spots=DEMO_SPOTS_PER_LOT, occupied_spots=0, booked_spots=0))
+
+    locate_lots()   # coordinates from pincode_location, loaded by migration 6
+    db.session.commit()
+    return len(DEMO_PARKING_LOTS)
+
+
+# --------------------------- cli -------------------------------------
+
+def _report_admin(admin, created):
+    if created:
+        print(f"Master Admin user '{admin.user_name}' ({admin.email_id}) created successfully with ID {admin.user_id}.")
+    else:
+        print(f"Master Admin user '{admin.email_id}' already exists. Skipping creation.")
+
+
+def _report_seed(added):
+    if added:
+        print(f"Dummy parking lot data populated ({added} lots).")
+    else:
+        print("Parking lots already exist. Skipping dummy data.")
+
+
+@app.cli.command('init-db')
+@click.option('--demo', is_flag=True, help="also create the default admin and the demo parking lots")
+def init_db_command(demo):
+    """Create the database tables and apply pending migrations."""
+    existed, applied = init_db()
+    if not existed:
+        print("Database tables created.")
+    elif not applied:
+        print("Database schema is up to date.")
+    if demo:
+        _report_admin(*create_admin())
+        _report_seed(seed_demo_lots())
+
+
+@app.cli.command('create-admin')
+@click.option('--email', default=DEFAULT_ADMIN_EMAIL, show_default=True)
+@click.option('--password', default=DEFAULT_ADMIN_PASSWORD, show_default=True)
+@click.option('--name', default=DEFAULT_ADMIN_NAME, show_default=True)
+def create_admin_command(email, password, name):
+    """Create the master admin user if there is no admin yet."""
+    _report_admin(*create_admin(email, password, name))
+
+
+@app.cli.command('seed')
+def seed_command():
+    """Add the demo parking lots to an empty database."""
+    _report_seed(seed_demo_lots())
@@ -1,8 +1,242 @@
 document.addEventListener('DOMContentLoaded', function() {
+    // --- whole lot grid: rendered by the server once, then kept up to date by the lot's event stream ---
+    // spot transitions arrive as server-sent events and are applied in place. the grid endpoint answers 304
+    // while nothing in the lot changed (ETag = lot change version), it is used when the stream (re)connects,
+    // as a slow safety check while streaming and for polling when no stream can be opened
+    const GRID_POLL_MS = 15000;
+    const GRID_REVALIDATE_MS = 120000;
+    const gridElement = document.getElementById("spots-grid");
+    let gridEtag = `"${gridElement.dataset.etag}"`;
+    let spotsById = {};
+    let selectedSpotId = null;
+
+    function escapeHtml(value) {
+        const div = document.createElement("div");
+        div.textContent = value;
+        return div.innerHTML;
+    }
+
+    function indexSpots(spots) {
+        const previous = spotsById;
+        spotsById = {};
+        spots.forEach(spot => { spotsById[spot.spot_id] = spot; });
+        return previous;
+    }
+
+    function spotClass(spot) {
+        if (spot.display_status === 'O') return 'occupied';
+        if (spot.display_status === 'F') return 'future-booked';
+        return 'available';
+    }
+
+    function renderGrid(data) {
+        const previous = indexSpots(data.spots);
+
+        const fragment = document.createDocumentFragment();
+        data.spots.forEach(spot => {
+            const spotElement = spotElementFor(spot);
+            spotElement.className = `spot ${spotClass(spot)}`;
+            fragment.appendChild(spotElement);
+        });
+        gridElement.replaceChildren(fragment);
+
+        showCounts(data.counts);
+
+        // keep the details panel in step with the grid
+        if (selectedSpotId !== null) {
+            if (!spotsById[selectedSpotId]) {
+                clearDetails();
+            } else if (JSON.stringify(previous[selectedSpotId]) !== JSON.stringify(spotsById[selectedSpotId])) {
+                showDetails(selectedSpotId);
+            }
+        }
+    }
+
+    function showCounts(counts) {
+        document.getElementById("count-total").textContent = counts.total;
+        document.getElementById("count-available").textContent = counts.available;
+        document.getElementById("count-occupied").textContent = counts.occupied;
+    }
+
+    function spotElementFor(spot) {
+        const spotElement = document.createElement("div");
+        spotElement.dataset.spotId = spot.spot_id;
+        spotElement.textContent = spot.spot_id;
+        spotElement.addEventListener("click", () => showDetails(spot.spot_id));
+        return spotElement;
+    }
+
+    // one spot changed: update, add or remove just its element
+    function applySpot(spotId, spot) {
+        const existing = gridElement.querySelector(`[data-spot-id="${spotId}"]`);
+        if (!spot) {
+            delete spotsById[spotId];
+            if (existing) existing.remove();
+        } else {
+            spotsById[spotId] = spot;
+            const spotElement = existing || spotElementFor(spot);
+            spotElement.className = `spot ${spotClass(spot)}`;
+            void spotElement.offsetWidth;   // restart the highlight if the spot changed again
+            spotElement.classList.add("spot-changed");
+            if (!existing) {
+                // spots are listed by id
+                const next = Array.from(gridElement.children).find(el => Number(el.dataset.spotId) > spotId);
+                gridElement.insertBefore(spotElement, next || null);
+            }
+        }
+        if (selectedSpotId === spotId) {
+            spot ? showDetails(spotId) : clearDetails();
+        }
+    }
+
+    function refreshGrid() {
+        return fetch(gridElement.dataset.gridUrl, { headers: { 'If-None-Match': gridEtag }, cache: 'no-store' })
+            .then(response => {
+                if (response.status === 304) {
+                    return null; // nothing changed
+                }
+                if (!response.ok) {
+                    throw new Error(`Grid refresh failed (${response.status})`);
+                }
+                gridEtag = response.headers.get('ETag') || gridEtag;
+                return response.json();
+            })
+            .then(data => {
+                if (data) {
+                    renderGrid(data);
+                }
+            })
+            .catch(error => console.error('Error refreshing spot grid:', error));
+    }
+
+    indexSpots(JSON.parse(gridElement.dataset.spots));
+
+    let streaming = false;
+    let lotDeleted = false;
+    let lastRefresh = Date.now();
+
+    function openEventStream() {
+        const source = new EventSource(gridElement.dataset.eventsUrl);
+        source.addEventListener("open", () => {
+            streaming = true;
+            refreshGrid();   // catch up with changes made while the stream was down (usually a 304)
+            lastRefresh = Date.now();
+        });
+        source.addEventListener("spot", event => {
+            const data = JSON.parse(event.data);
+            applySpot(data.spot_id, data.spot);
+            showCounts(data.counts);
+            gridEtag = `"lot-${data.lot_id}-v${data.version}"`;
+        });
+        source.addEventListener("grid", event => {
+            const data = JSON.parse(event.data);
+            renderGrid(data);
+            gridEtag = `"lot-${data.lot_id}-v${data.version}"`;
+        });
+        source.addEventListener("resync", () => refreshGrid());
+        source.addEventListener("lot_deleted", () => {
+            source.close();
+            streaming = false;
+            lotDeleted = true;
+            gridElement.replaceChildren();
+            document.getElementById("details-content").innerHTML =
+                `<p class="text-danger">This parking lot has been deleted.</p>`;
+        });
+        source.addEventListener("error", () => {
+            // the browser reconnects by itself unless the server refused the stream (e.g. too many streams),
+            // then the grid is polled instead
+            if (source.readyState === EventSource.CLOSED) {
+                streaming = false;
+            }
+        });
+        return source;
+    }
+
+    if (window.EventSource && gridElement.dataset.eventsUrl) {
+        openEventStream();
+    }
+    setInterval(() => {
+        if (document.hidden || lotDeleted) {
+            return;
+        }
+        if (!streaming || Date.now() - lastRefresh >= GRID_REVALIDATE_MS) {
+            lastRefresh = Date.now();
+            refreshGrid();
+        }
+    }, GRID_POLL_MS);
+
+    // --- details panel, built from the grid data; only the upcoming bookings list is fetched (on click) ---
     function showDetails(spotId) { 
         const panel = document.getElementById("details-content");
-        panel.innerHTML = `<p class="text-center text-muted">Loading details...</p>`;
+        const spot = spotsById[spotId];
+        selectedSpotId = spotId;
+
+        if (!spot) {
+            panel.innerHTML = `<p class="text-danger">Error: Spot not found</p>`;
+            return;
+        }
+
+        let htmlContent = '';
+
+        // --- display current status and details ---
+        if (spot.current_booking) {
+            // scenario: spot is currently physically occupied
+            const booking = spot.current_booking;
+            htmlContent += `
+                <h6 class="text-center">Currently Occupied</h6>
+                <p><strong>User:</strong> ${escapeHtml(booking.user_name)}</p>
+                <p><strong>Email:</strong> ${escapeHtml(booking.email)}</p>
+                <p><strong>Vehicle No:</strong> ${escapeHtml(booking.vehicle_no)}</p>
+                <p><strong>Start:</strong> ${booking.parking_time}</p>
+                <p><strong>Expiry:</strong> ${booking.leaving_time}</p>
+                <p><strong>Paid Cost:</strong> ₹${booking.parking_cost}</p>
+                <hr>
+            `;
+        } else if (spot.status === 'O') {
+            // scenario: spot is 'O' in DB but no active booking found (e.g., just expired, or inconsistency)
+            htmlContent += `<p class="text-center text-danger">Spot is physically occupied but no active booking details found.</p><hr>`;
+        } else {
+            // scenario: spot is 'A' in DB (truly available or booked for future)
+            htmlContent += `<p class="text-center text-success">Spot is currently Available.</p>`;
+            if (spot.future_booked) {
+                // if it's 'A' but has future bookings, clarify this
+                htmlContent += `<p class="text-center text-muted">(Booked for future periods)</p>`;
+            }
+            htmlContent += `<hr>`; // add hr for separation
+        }
+
+        // --- future bookings are loaded below if there are any ---
+        if (spot.future_booked) {
+            htmlContent += `<div id="upcoming-bookings"><p class="text-center text-muted">Loading upcoming bookings...</p></div>`;
+        } else if (!spot.current_booking) { // only show "no upcoming" if not currently occupied
+            htmlContent += `<p class="text-center text-muted">No upcoming bookings for this spot.</p>`;
+        }
 
+        // --- add delete button based on 'deletable' flag from backend ---
+        if (spot.deletable) { 
+            htmlContent += `
+                <div class="text-center mt-3">
+                    <button class="btn btn-danger" onclick="deleteSpot(${spotId})">Delete Spot</button>
+                </div>
+            `;
+        } else {
+            htmlContent += `
+                <div class="text-center mt-3 text-muted">
+                    Spot cannot be deleted while it has active or future bookings.
+                </div>
+            `;
+        }
+        
+        htmlContent += `<div class="text-center mt-3"><button class="btn btn-secondary" onclick="clearDetails()">Close</button></div>`;
+
+        panel.innerHTML = htmlContent;
+
+        if (spot.future_booked) {
+            loadUpcomingBookings(spotId);
+        }
+    }
+
+    function loadUpcomingBookings(spotId) {
         fetch(`/admin/spot-details/${spotId}`)
             .then(response => {
                 if (!response.ok) {
@@ -11,91 +245,50 @@ document.addEventListener('DOMContentLoaded', function() {
                 return response.json();
             })
             .then(data => {
-                let htmlContent = '';
-
-                // --- display current status and details ---
-                if (data.current_occupied && data.current_booking_details) {
-                    // scenario: spot is currently physically occupied
-                    htmlContent += `
-                        <h6 class="text-center">Currently Occupied</h6>
-                        <p><strong>User:</strong> ${data.current_booking_details.user_name}</p>
-                        <p><strong>Email:</strong> ${data.current_booking_details.email}</p>
-                        <p><strong>Vehicle No:</strong> ${data.current_booking_details.vehicle_no}</p>
-                        <p><strong>Start:</strong> ${data.current_booking_details.parking_time}</p>
-                        <p><strong>Expiry:</strong> ${data.current_booking_details.leaving_time}</p>
-                        <p><strong>Paid Cost:</strong> ₹${data.current_booking_details.parking_cost}</p>
-                        <hr>
-                    `;
-                } else if (data.spot_status === 'O' && !data.current_occupied) {
-                    // scenario: spot is 'O' in DB but no active booking found (e.g., just expired, or inconsistency)
-                    htmlContent += `<p class="text-center text-danger">Spot is physically occupied but no active booking details found.</p><hr>`;
-                } else {
-                    // scenario: spot is 'A' in DB (truly available or booked for future)
-                    htmlContent += `<p class="text-center text-success">Spot is currently Available.</p>`;
-                    if (data.future_bookings_details.length > 0) {
-                        // if it's 'A' but has future bookings, clarify this
-                        htmlContent += `<p class="text-center text-muted">(Booked for future periods)</p>`;
-                    }
-                    htmlContent += `<hr>`; // add hr for separation
+                const container = document.getElementById("upcoming-bookings");
+                if (!container || selectedSpotId !== spotId) {
+                    return; // panel shows another spot by now
                 }
-
-                // --- display future bookings if available ---
-                if (data.future_bookings_details && data.future_bookings_details.length > 0) {
-                    htmlContent += `
-                        <h6 class="text-center mt-3">Upcoming Bookings</h6>
-                        <table class="future-bookings-table">
-                            <thead>
+                if (!data.future_bookings_details || data.future_bookings_details.length === 0) {
+                    container.innerHTML = `<p class="text-center text-muted">No upcoming bookings for this spot.</p>`;
+                    return;
+                }
+                container.innerHTML = `
+                    <h6 class="text-center mt-3">Upcoming Bookings</h6>
+                    <table class="future-bookings-table">
+                        <thead>
+                            <tr>
+                                <th>User</th>
+                                <th>Vehicle No</th>
+                                <th>From</th>
+                                <th>Until</th>
+                            </tr>
+                        </thead>
+                        <tbody>
+                            ${data.future_bookings_details.map(fb => `
                                 <tr>
-                                    <th>User</th>
-                                    <th>Vehicle No</th>
-                                    <th>From</th>
-                                    <th>Until</th>
+                                    <td>${escapeHtml(fb.user_name)}</td>
+                                    <td>${escapeHtml(fb.vehicle_no)}</td>
+                                    <td>${fb.parking_time}</td>
+                                    <td>${fb.leaving_time}</td>
                                 </tr>
-                            </thead>
-                            <tbody>
-                                ${data.future_bookings_details.map(fb => `
-                                    <tr>
-                                        <td>${fb.user_name}</td>
-                                        <td>${fb.vehicle_no}</td>
-                                        <td>${fb.parking_time}</td>
-                                        <td>${fb.leaving_time}</td>
-                                    </tr>
-                                `).join('')}
-                            </tbody>
-                        </table>
-                    `;
-                } else if (!data.current_occupied) { // only show "no upcoming" if not currently occupied
-                    htmlContent += `<p class="text-center text-muted">No upcoming bookings for this spot.</p>`;
-                }
-
-                // --- add delete button based on 'is_deletable' flag from backend ---
-                if (data.is_deletable) { 
-                    htmlContent += `
-                        <div class="text-center mt-3">
-                            <button class="btn btn-danger" onclick="deleteSpot(${spotId})">Delete Spot</button>
-                        </div>
-                    `;
-                } else {
-                    htmlContent += `
-                        <div class="text-center mt-3 text-muted">
-                            Spot cannot be deleted while it has active or future bookings.
-                        </div>
-                    `;
-                }
-                
-                htmlContent += `<div class="text-center mt-3"><button class="btn btn-secondary" onclick="clearDetails()">Close</button></div>`;
-
-                panel.innerHTML = htmlContent;
-
+                            `).join('')}
+                        </tbody>
+                    </table>
+                `;
             })
             .catch(error => {
-                console.error('Error fetching spot details:', error);
-                panel.innerHTML = `<p class="text-danger">Error: ${error.message || 'Could not load details.'}</p>`;
+                console.error('Error fetching upcoming bookings:', error);
+                const container = document.getElementById("upcoming-bookings");
+                if (container) {
+                    container.innerHTML = `<p class="text-danger">Error: ${escapeHtml(error.message || 'Could not load upcoming bookings.')}</p>`;
+                }
             });
     }
 
     // clearDetails and deleteSpot functions) 
     function clearDetails() {
+        selectedSpotId = null;
         document.getElementById("details-content").innerHTML = "Click a parking spot to view details here.";
     }
 
@@ -0,0 +1,93 @@
+from datetime import datetime, timedelta
+import threading
+
+import pytest
+from sqlalchemy import insert, func
+from app import app
+from models.dbmodel import db, ParkingSpot, UserBookings, UserHistory, LotDailyRollup, UserLotRollup
+from controllers.archival import archive_expired_bookings
+from controllers.lot_counters import reconcile_lot_counters
+from controllers.rollups import history_bookings_count
+
+EXPIRED_PER_SPOT = 12
+
+
+@pytest.fixture
+def bookings(user):
+    """
+    EXPIRED_PER_SPOT expired bookings on every spot of the first lot, the last one of each still marked
+    occupied (not archived yet), plus a booking active now on the first spot and a future one on the second"""
+    first = ParkingSpot.query.order_by(ParkingSpot.spot_id).first()
+    spot_ids = [spot_id for spot_id, in db.session.query(ParkingSpot.spot_id)
+                .filter_by(lot_id=first.lot_id).order_by(ParkingSpot.spot_id)]
+    now = datetime.now().replace(microsecond=0)
+
+    def booking(spot_id, start, end):
+        return dict(user_id=user.user_id, spot_id=spot_id, parking_time=start, leaving_time=end,
+                    parking_cost=10, vehicle_no='MH01AB1234')
+
+    expired = [booking(spot_id, now - timedelta(hours=2 * i + 2), now - timedelta(hours=2 * i + 1))
+               for spot_id in spot_ids for i in range(EXPIRED_PER_SPOT)]
+    db.session.execute(insert(UserBookings), expired + [
+        booking(spot_ids[0], now - timedelta(minutes=30), now + timedelta(hours=1)),
+        booking(spot_ids[1], now + timedelta(hours=1), now + timedelta(hours=2)),
+    ])
+    ParkingSpot.query.filter(ParkingSpot.spot_id.in_(spot_ids)).update({'status': 'O'})
+    db.session.commit()
+    reconcile_lot_counters(repair=True)
+    db.session.commit()
+    return {'lot_id': first.lot_id, 'spot_ids': spot_ids, 'expired': len(expired)}
+
+
+def assert_archived_once(bookings):
+    expired = bookings['expired']
+    assert UserHistory.query.count() == expired
+    assert UserBookings.query.count() == 2
+    assert history_bookings_count() == expired
+    assert db.session.query(func.sum(LotDailyRollup.bookings)).scalar() == expired
+    assert db.session.query(func.sum(UserLotRollup.bookings)).scalar() == expired
+    # the spot with a booking active now stays occupied, the others are free again
+    occupied = {spot_id for spot_id, in db.session.query(ParkingSpot.spot_id).filter_by(status='O')}
+    assert occupied == {bookings['spot_ids'][0]}
+    assert reconcile_lot_counters(repair=False) == []
+
+
+def test_archival_moves_each_booking_once(bookings):
+    assert archive_expired_bookings()['moved'] == bookings['expired']
+    assert archive_expired_bookings()['moved'] == 0
+    assert_archived_once(bookings)
+
+
+def test_concurrent_archival_moves_each_booking_once(bookings, monkeypatch):
+    monkeypatch.setitem(app.config, 'ARCHIVE_CHUNK_SIZE', 10)
+    moved, errors = [], []
+
+    def archive():
+        with app.app_context():
+            try:
+                moved.append(archive_expired_bookings()['moved'])
+            except Exception as error:
+                errors.append(error)
+
+    threads = [threading.Thread(target=archive) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    assert sum(moved) == bookings['expired']
+    db.session.expire_all()
+    assert_archived_once(bookings)
+
+
+def test_archival_of_given_bookings_skips_unexpired(bookings):
+    now = datetime.now()
+    expired_ids = [booking.id for booking in UserBookings.query.filter(UserBookings.leaving_time <= now).limit(3)]
+    kept_ids = [booking.id for booking in UserBookings.query.filter(UserBookings.leaving_time > now)]
+
+    assert archive_expired_bookings(booking_ids=expired_ids + kept_ids)['moved'] == 3
+    assert archive_expired_bookings(booking_ids=expired_ids)['moved'] == 0
+    assert UserHistory.query.count() == history_bookings_count() == 3
+    assert UserBookings.query.filter(UserBookings.id.in_(kept_ids)).count() == len(kept_ids)
+    assert reconcile_lot_counters(repair=False) == []
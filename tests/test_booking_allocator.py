@@ -0,0 +1,114 @@
+from datetime import datetime, timedelta
+import threading
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+from app import app
+from models.dbmodel import db, ParkingSpot, UserBookings, LotCounters
+from controllers.booking_allocator import booking_allocator
+
+
+def at(hours):
+    return datetime.now().replace(microsecond=0) + timedelta(hours=hours)
+
+
+def lot_spots():
+    spot = ParkingSpot.query.order_by(ParkingSpot.spot_id).first()
+    return spot.lot_id, [s.spot_id for s in ParkingSpot.query.filter_by(lot_id=spot.lot_id).order_by(ParkingSpot.spot_id)]
+
+
+def add_booking(user, spot_id, start, end):
+    booking = UserBookings(user_id=user.user_id, spot_id=spot_id, parking_time=start, leaving_time=end,
+                           parking_cost=10, vehicle_no='MH01AB1234')
+    db.session.add(booking)
+    db.session.commit()
+    return booking
+
+
+def booked_count(lot_id):
+    return db.session.query(LotCounters.booked_spots).filter_by(lot_id=lot_id).scalar()
+
+
+def test_database_rejects_overlapping_bookings(user):
+    _, spot_ids = lot_spots()
+    add_booking(user, spot_ids[0], at(1), at(3))
+
+    with pytest.raises(IntegrityError):
+        add_booking(user, spot_ids[0], at(2), at(4))
+    db.session.rollback()
+
+    add_booking(user, spot_ids[0], at(3), at(5))    # back to back is fine
+    add_booking(user, spot_ids[1], at(2), at(4))    # so is another spot
+    assert UserBookings.query.count() == 3
+
+
+def test_database_rejects_moving_a_booking_onto_another(user):
+    _, spot_ids = lot_spots()
+    add_booking(user, spot_ids[0], at(1), at(3))
+    other = add_booking(user, spot_ids[1], at(2), at(4))
+
+    other.spot_id = spot_ids[0]
+    with pytest.raises(IntegrityError):
+        db.session.commit()
+    db.session.rollback()
+
+
+def test_allocator_takes_the_first_free_candidate(user):
+    lot_id, spot_ids = lot_spots()
+    add_booking(user, spot_ids[0], at(1), at(3))
+    before = booked_count(lot_id)
+
+    booking = booking_allocator.allocate(lot_id, spot_ids[:3], user.user_id, at(2), at(4), 20, 'MH01AB1234')
+    assert booking.spot_id == spot_ids[1]
+    assert booked_count(lot_id) == before + 1
+
+
+def test_allocator_retries_when_the_database_rejects_a_spot(user, monkeypatch):
+    # another process booked the first candidate after this one read it as free: the insert is rejected by
+    # the overlap guard and the next candidate is booked instead
+    lot_id, spot_ids = lot_spots()
+    monkeypatch.setattr(booking_allocator, '_free_spots', lambda lot_id, spot_ids, *period: spot_ids)
+    add_booking(user, spot_ids[0], at(1), at(3))
+    before = booked_count(lot_id)
+
+    booking = booking_allocator.allocate(lot_id, spot_ids[:3], user.user_id, at(2), at(4), 20, 'MH01AB1234')
+    assert booking.spot_id == spot_ids[1]
+    assert booked_count(lot_id) == before + 1     # the rejected attempt left nothing behind
+    assert UserBookings.query.filter_by(spot_id=spot_ids[0]).count() == 1
+
+
+def test_allocator_gives_up_when_no_candidate_is_free(user, monkeypatch):
+    lot_id, spot_ids = lot_spots()
+    monkeypatch.setattr(booking_allocator, '_free_spots', lambda lot_id, spot_ids, *period: spot_ids)
+    for spot_id in spot_ids[:2]:
+        add_booking(user, spot_id, at(1), at(3))
+    before = booked_count(lot_id)
+
+    assert booking_allocator.allocate(lot_id, spot_ids[:2], user.user_id, at(2), at(4), 20, 'MH01AB1234') is None
+    assert booked_count(lot_id) == before
+
+
+def test_concurrent_confirms_never_share_a_spot(user):
+    lot_id, spot_ids = lot_spots()
+    user_id = user.user_id
+    results, errors = [], []
+
+    def confirm():
+        with app.app_context():
+            try:
+                booking = booking_allocator.allocate(lot_id, spot_ids, user_id, at(2), at(4), 20, 'MH01AB1234')
+                results.append(booking.spot_id if booking else None)
+            except Exception as error:
+                errors.append(error)
+
+    threads = [threading.Thread(target=confirm) for _ in range(len(spot_ids) + 3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    booked = [spot_id for spot_id in results if spot_id is not None]
+    assert sorted(booked) == spot_ids      # every spot once, the extra confirms found none free
+    assert results.count(None) == 3
+    assert booked_count(lot_id) == len(spot_ids)
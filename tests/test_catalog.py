@@ -0,0 +1,67 @@
+import threading
+import time
+
+from app import app
+from models.dbmodel import db
+from controllers.catalog import lot_catalog
+
+
+def add_lot(admin_client, name, address):
+    admin_client.post('/admin/add_parking_lot', data={
+        'area_type': 'Open', 'address': address, 'primelocation_name': name, 'price_per_hr': '40',
+        'city': 'Mumbai', 'pincode': '400001', 'capacity': '2'})
+
+
+def names(lots):
+    return [lot.primelocation_name for lot in lots]
+
+
+def test_new_lot_is_searchable_after_an_admin_adds_it(admin_client):
+    lot_catalog.all_lots()
+    add_lot(admin_client, 'Colaba Causeway Garage', '1 Causeway Rd, Mumbai')
+    assert 'Colaba Causeway Garage' in names(lot_catalog.find(text='colaba'))
+
+
+def test_concurrent_reloads_load_once(admin_client, monkeypatch):
+    lot_catalog.all_lots()
+    add_lot(admin_client, 'Colaba Causeway Garage', '1 Causeway Rd, Mumbai')
+    loads = []
+    load = lot_catalog._load
+
+    def slow_load(version, previous=None):
+        loads.append(version)
+        time.sleep(0.05)
+        return load(version, previous)
+    monkeypatch.setattr(lot_catalog, '_load', slow_load)
+
+    # the add already reloaded this process's copy, bump once more so the threads find it stale
+    with app.app_context():
+        lot_catalog.invalidate()
+        db.session.commit()
+    found = []
+
+    def search():
+        with app.app_context():
+            found.append(names(lot_catalog.find(text='colaba')))
+
+    threads = [threading.Thread(target=search) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(loads) == 1
+    assert found == [['Colaba Causeway Garage']] * 4
+
+
+def test_an_older_snapshot_never_rolls_the_catalog_back(admin_client, monkeypatch):
+    lot_catalog.all_lots()
+    add_lot(admin_client, 'Colaba Causeway Garage', '1 Causeway Rd, Mumbai')
+    lot_catalog.all_lots()
+    loaded = lot_catalog.stats()['version']
+
+    # a request whose transaction started before the add still reads the previous version
+    monkeypatch.setattr(lot_catalog, '_db_version', lambda: loaded - 1)
+    lot_catalog._checked_at = 0
+    assert 'Colaba Causeway Garage' in names(lot_catalog.find(text='colaba'))
+    assert lot_catalog.stats()['version'] == loaded
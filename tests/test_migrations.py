@@ -0,0 +1,115 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import inspect, insert, text, func
+from models.dbmodel import db, ParkingLot, ParkingSpot, UserHistory, LotDailyRollup, UserLotRollup, RollupTotal
+from models.migrations import MIGRATIONS, run_migrations, current_schema_version, verify_index_usage
+from models.setup import init_db
+from controllers.rollups import history_bookings_count
+
+
+INDEXES = {
+    'user_bookings': {'ix_user_bookings_spot_period', 'ix_user_bookings_user_leaving', 'ix_user_bookings_leaving'},
+    'booking_history': {'ix_booking_history_user_id', 'ix_booking_history_spot'},
+    'parkinglot': {'ix_parkinglot_city_pincode'},
+    'parking_spot': {'ix_parking_spot_lot_status'},
+    'rollup_lot_day': {'ix_rollup_lot_day_bookings'},
+    'spot_event': {'ix_spot_event_created'},
+}
+ADDED_COLUMNS = {'lot_counters': ['version'], 'parkinglot': ['spot_assignment', 'latitude', 'longitude']}
+SQLITE_TRIGGERS = {'trg_user_bookings_no_overlap_insert', 'trg_user_bookings_no_overlap_update'}
+
+
+def dialect():
+    return db.engine.dialect.name
+
+
+def indexes(table):
+    return {index['name'] for index in inspect(db.engine).get_indexes(table)}
+
+
+def columns(table):
+    return {column['name'] for column in inspect(db.engine).get_columns(table)}
+
+
+def overlap_guards():
+    if dialect() == 'sqlite':
+        return set(db.session.execute(text("SELECT name FROM sqlite_master WHERE type = 'trigger'")).scalars())
+    return set(db.session.execute(text(
+        "SELECT conname FROM pg_constraint WHERE conname = 'ex_user_bookings_no_overlap'")).scalars())
+
+
+def downgrade_to_first_release():
+    # what a database created before the migrations looks like: no indexes, triggers, added columns,
+    # rollups or schema_version
+    for table, names in INDEXES.items():
+        for name in names:
+            db.session.execute(text(f"DROP INDEX IF EXISTS {name}"))
+    if dialect() == 'sqlite':
+        for name in SQLITE_TRIGGERS:
+            db.session.execute(text(f"DROP TRIGGER IF EXISTS {name}"))
+    else:
+        db.session.execute(text("ALTER TABLE user_bookings DROP CONSTRAINT IF EXISTS ex_user_bookings_no_overlap"))
+    for table, names in ADDED_COLUMNS.items():
+        for name in names:
+            db.session.execute(text(f"ALTER TABLE {table} DROP COLUMN {name}"))
+    for model in (LotDailyRollup, UserLotRollup, RollupTotal):
+        db.session.query(model).delete()
+    db.session.execute(text("DELETE FROM schema_version"))
+    db.session.commit()
+    # an upgrade starts in a new process. pooled connections keep their prepared EXPLAIN statements, which
+    # sqlite doesn't re-plan after a schema change
+    db.session.remove()
+    db.engine.dispose()
+
+
+def add_history(user, count):
+    spot_ids = [spot_id for spot_id, in db.session.query(ParkingSpot.spot_id).limit(count)]
+    start = datetime.now().replace(microsecond=0) - timedelta(days=3)
+    db.session.execute(insert(UserHistory), [
+        dict(user_id=user.user_id, spot_id=spot_id, booking_time=start, leaving_time=start + timedelta(hours=2),
+             parking_cost=10, vehicle_no='MH01AB1234')
+        for spot_id in spot_ids
+    ])
+    db.session.commit()
+    return len(spot_ids)
+
+
+def test_fresh_database_is_at_latest_version(app_ctx):
+    assert current_schema_version(db) == MIGRATIONS[-1][0]
+    # starting again on an up to date database changes nothing
+    assert init_db() == (True, [])
+
+
+def test_migrations_upgrade_an_old_database(user):
+    history_rows = add_history(user, 12)
+    downgrade_to_first_release()
+    assert not indexes('user_bookings') & INDEXES['user_bookings']
+    assert 'version' not in columns('lot_counters')
+
+    assert run_migrations(db) == [version for version, _, _ in MIGRATIONS]
+
+    for table, names in INDEXES.items():
+        assert names <= indexes(table), table
+    for table, names in ADDED_COLUMNS.items():
+        assert set(names) <= columns(table), table
+    if dialect() == 'sqlite':
+        assert SQLITE_TRIGGERS <= overlap_guards()
+        assert all(uses_index for _, uses_index, _ in verify_index_usage(db))
+    else:
+        assert overlap_guards() == {'ex_user_bookings_no_overlap'}
+
+    # data migrations: rollups and the history total from the existing history, demo lots located
+    assert db.session.query(func.sum(LotDailyRollup.bookings)).scalar() == history_rows
+    assert db.session.query(func.sum(UserLotRollup.bookings)).scalar() == history_rows
+    assert history_bookings_count() == history_rows
+    assert db.session.query(ParkingLot).filter(ParkingLot.latitude.is_(None)).count() == 0
+
+
+def test_migrations_run_once(user):
+    add_history(user, 5)
+    downgrade_to_first_release()
+    run_migrations(db)
+
+    assert run_migrations(db) == []
+    assert current_schema_version(db) == MIGRATIONS[-1][0]
+    assert history_bookings_count() == 5      # not counted twice
@@ -0,0 +1,56 @@
+from sqlalchemy.exc import DataError
+from werkzeug.security import generate_password_hash, check_password_hash
+from app import app
+from models.dbmodel import db, User
+from controllers.passwords import password_hasher
+
+
+def register_and_login(email, password='secret'):
+    client = app.test_client()
+    client.post('/register', data={'name': 'Alice', 'email': email, 'password': password, 'confirm_password': password})
+    response = client.post('/login', data={'email': email, 'password': password})
+    return client, response
+
+
+def test_default_hash_method_fits_the_column(app_ctx):
+    _, response = register_and_login('alice@example.com')
+    assert response.status_code == 302 and '/home' in response.headers['Location']
+
+    stored = User.query.filter_by(email_id='alice@example.com').one().pass_wd
+    assert stored.startswith(app.config['PASSWORD_HASH_METHOD'])
+    assert len(stored) <= User.__table__.c.pass_wd.type.length
+
+
+def test_login_upgrades_a_legacy_hash(app_ctx):
+    register_and_login('legacy@example.com')
+    user = User.query.filter_by(email_id='legacy@example.com').one()
+    user.pass_wd = generate_password_hash('secret', 'pbkdf2:sha256:260000')    # made by an older release
+    db.session.commit()
+    assert password_hasher.needs_rehash(user.pass_wd)
+
+    response = app.test_client().post('/login', data={'email': 'legacy@example.com', 'password': 'secret'})
+    assert response.status_code == 302 and '/home' in response.headers['Location']
+
+    db.session.expire_all()
+    stored = User.query.filter_by(email_id='legacy@example.com').one().pass_wd
+    assert stored.startswith(app.config['PASSWORD_HASH_METHOD'] + '$')
+    assert not password_hasher.needs_rehash(stored)
+    assert check_password_hash(stored, 'secret')
+
+
+def test_failed_hash_upgrade_still_logs_in(app_ctx, monkeypatch):
+    register_and_login('narrow@example.com')
+    user = User.query.filter_by(email_id='narrow@example.com').one()
+    legacy = generate_password_hash('secret', 'pbkdf2:sha256:260000')
+    user.pass_wd = legacy
+    db.session.commit()
+
+    def rejected(*args):
+        raise DataError("UPDATE user", {}, Exception("value too long for type character varying(100)"))
+    monkeypatch.setattr(db.session, 'commit', rejected)    # what a server db with the old column does
+
+    response = app.test_client().post('/login', data={'email': 'narrow@example.com', 'password': 'secret'})
+    monkeypatch.undo()
+    assert response.status_code == 302 and '/home' in response.headers['Location']
+    db.session.expire_all()
+    assert User.query.filter_by(email_id='narrow@example.com').one().pass_wd == legacy
@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta
+
+from app import app
+from models.dbmodel import db, ParkingSpot, UserBookings, UserHistory, LotCounters, User
+from controllers.lot_counters import reconcile_lot_counters
+
+
+def logged_in(email, name):
+    client = app.test_client()
+    client.post('/register', data={'name': name, 'email': email, 'password': 'p', 'confirm_password': 'p'})
+    client.post('/login', data={'email': email, 'password': 'p'})
+    return client, User.query.filter_by(email_id=email).one()
+
+
+def add_booking(user, spot_id, start, end):
+    booking = UserBookings(user_id=user.user_id, spot_id=spot_id, parking_time=start, leaving_time=end,
+                           parking_cost=10, vehicle_no='MH01AB1234')
+    db.session.add(booking)
+    db.session.commit()
+    return booking.id
+
+
+def release(client, user, booking_id):
+    return client.post(f'/{user.user_id}-{user.user_name.lower()}/release_booking/{booking_id}')
+
+
+def occupied(lot_id):
+    return db.session.query(LotCounters.occupied_spots).filter_by(lot_id=lot_id).scalar()
+
+
+def setup_spot(user):
+    # a booking active now on the first spot, which the scheduler already marked occupied
+    spot = ParkingSpot.query.order_by(ParkingSpot.spot_id).first()
+    now = datetime.now().replace(microsecond=0)
+    active_id = add_booking(user, spot.spot_id, now - timedelta(minutes=30), now + timedelta(hours=1))
+    spot.status = 'O'
+    db.session.commit()
+    return spot.spot_id, spot.lot_id, active_id, now
+
+
+def sync_counters():
+    reconcile_lot_counters(repair=True)
+    db.session.commit()
+
+
+def test_cancelling_a_future_booking_keeps_the_active_one_occupied(app_ctx):
+    alice_client, alice = logged_in('alice@example.com', 'Alice')
+    bob_client, bob = logged_in('bob@example.com', 'Bob')
+    spot_id, lot_id, _, now = setup_spot(alice)
+    future_id = add_booking(bob, spot_id, now + timedelta(hours=2), now + timedelta(hours=3))
+    sync_counters()
+
+    release(bob_client, bob, future_id)
+
+    db.session.expire_all()
+    assert db.session.get(UserBookings, future_id) is None
+    assert db.session.get(ParkingSpot, spot_id).status == 'O'
+    assert occupied(lot_id) == 1
+    assert reconcile_lot_counters(repair=False) == []
+
+
+def test_releasing_the_active_booking_frees_the_spot(app_ctx):
+    alice_client, alice = logged_in('alice@example.com', 'Alice')
+    bob_client, bob = logged_in('bob@example.com', 'Bob')
+    spot_id, lot_id, active_id, now = setup_spot(alice)
+    add_booking(bob, spot_id, now + timedelta(hours=2), now + timedelta(hours=3))
+    sync_counters()
+
+    release(alice_client, alice, active_id)
+
+    db.session.expire_all()
+    assert UserHistory.query.filter_by(user_id=alice.user_id).count() == 1
+    assert db.session.get(ParkingSpot, spot_id).status == 'A'
+    assert occupied(lot_id) == 0
+    assert reconcile_lot_counters(repair=False) == []
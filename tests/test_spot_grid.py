@@ -0,0 +1,96 @@
+from datetime import datetime, timedelta
+
+from models.dbmodel import db, ParkingLot, ParkingSpot, UserBookings, UserHistory
+from controllers.archival import archive_expired_bookings
+from controllers.lot_counters import reconcile_lot_counters
+
+
+def first_lot_id():
+    return ParkingLot.query.order_by(ParkingLot.lot_id).first().lot_id
+
+
+def test_grid_answers_304_until_the_lot_changes(admin_client):
+    lot_id = first_lot_id()
+    url = f'/admin/parking_spots/{lot_id}/grid'
+
+    first = admin_client.get(url)
+    assert first.status_code == 200
+    assert first.headers['ETag']
+    assert len(first.json['spots']) == first.json['counts']['total']
+    assert 'no-cache' in first.headers['Cache-Control']
+
+    unchanged = admin_client.get(url, headers={'If-None-Match': first.headers['ETag']})
+    assert unchanged.status_code == 304
+    assert unchanged.headers['ETag'] == first.headers['ETag']
+    assert not unchanged.data
+
+    admin_client.post(f'/admin/add_spot/{lot_id}', data={'count': 2})
+    changed = admin_client.get(url, headers={'If-None-Match': first.headers['ETag']})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != first.headers['ETag']
+    assert changed.json['counts']['total'] == first.json['counts']['total'] + 2
+
+
+def test_grid_of_another_lot_keeps_its_etag(admin_client):
+    lot_ids = [lot.lot_id for lot in ParkingLot.query.order_by(ParkingLot.lot_id).limit(2)]
+    other = admin_client.get(f'/admin/parking_spots/{lot_ids[1]}/grid')
+
+    admin_client.post(f'/admin/add_spot/{lot_ids[0]}', data={'count': 1})
+    again = admin_client.get(f'/admin/parking_spots/{lot_ids[1]}/grid', headers={'If-None-Match': other.headers['ETag']})
+    assert again.status_code == 304
+
+
+def test_grid_of_unknown_lot(admin_client):
+    assert admin_client.get('/admin/parking_spots/999999/grid').status_code == 404
+
+
+def test_grid_needs_admin(app_ctx):
+    from app import app
+    response = app.test_client().get(f'/admin/parking_spots/{first_lot_id()}/grid')
+    assert response.status_code in (302, 401, 403)
+
+
+def test_spot_with_unarchived_booking_is_deleted_only_after_archival(admin_client, user):
+    lot_id = first_lot_id()
+    spot_id = ParkingSpot.query.filter_by(lot_id=lot_id).order_by(ParkingSpot.spot_id).first().spot_id
+    start = datetime.now() - timedelta(hours=3)
+    db.session.add(UserBookings(user_id=user.user_id, spot_id=spot_id, parking_time=start,
+                                leaving_time=start + timedelta(hours=1), parking_cost=10, vehicle_no='MH01AB1234'))
+    db.session.commit()
+    reconcile_lot_counters(repair=True)
+    db.session.commit()
+
+    def grid_spot():
+        spots = admin_client.get(f'/admin/parking_spots/{lot_id}/grid').json['spots']
+        return next(spot for spot in spots if spot['spot_id'] == spot_id)
+
+    assert not grid_spot()['deletable']
+    assert not admin_client.get(f'/admin/spot-details/{spot_id}').json['is_deletable']
+    admin_client.post(f'/admin/delete_spot/{spot_id}')
+    assert db.session.get(ParkingSpot, spot_id) is not None
+
+    archive_expired_bookings()
+    assert grid_spot()['deletable']
+    admin_client.post(f'/admin/delete_spot/{spot_id}')
+    db.session.expire_all()
+    assert db.session.get(ParkingSpot, spot_id) is None
+    assert UserHistory.query.one().spot_id is None       # SET NULL once the spot is gone
+    assert reconcile_lot_counters(repair=False) == []
+
+
+def test_lot_with_unarchived_booking_is_kept(admin_client, user):
+    lot_id = first_lot_id()
+    spot_id = ParkingSpot.query.filter_by(lot_id=lot_id).first().spot_id
+    start = datetime.now() - timedelta(hours=3)
+    db.session.add(UserBookings(user_id=user.user_id, spot_id=spot_id, parking_time=start,
+                                leaving_time=start + timedelta(hours=1), parking_cost=10, vehicle_no='MH01AB1234'))
+    db.session.commit()
+
+    admin_client.get(f'/admin/delete_parking_lot/{lot_id}')
+    assert db.session.get(ParkingLot, lot_id) is not None
+
+    archive_expired_bookings()
+    admin_client.get(f'/admin/delete_parking_lot/{lot_id}')
+    db.session.expire_all()
+    assert db.session.get(ParkingLot, lot_id) is None
+    assert UserHistory.query.one().spot_id is None
@@ -0,0 +1,64 @@
+from datetime import datetime, timedelta
+
+from models.dbmodel import db, ParkingLot, ParkingSpot, LotCounters, UserBookings
+from controllers import spot_provisioning
+from controllers.spot_provisioning import provision_spots, remove_free_spots, SPOTS_PER_INSERT
+from controllers.lot_counters import reconcile_lot_counters
+
+
+def first_lot_id():
+    return ParkingLot.query.order_by(ParkingLot.lot_id).first().lot_id
+
+
+def spot_count(lot_id):
+    return ParkingSpot.query.filter_by(lot_id=lot_id).count()
+
+
+def test_add_spots_in_bounded_statements(app_ctx, monkeypatch):
+    lot_id = first_lot_id()
+    before = spot_count(lot_id)
+    statements = []
+    execute = db.session.execute
+    monkeypatch.setattr(db.session, 'execute', lambda statement, *args, **kwargs:
+                        statements.append(statement) or execute(statement, *args, **kwargs))
+
+    count = 2 * SPOTS_PER_INSERT + 7
+    assert provision_spots(lot_id, count) == count
+    monkeypatch.undo()
+    db.session.commit()
+
+    inserts = [statement for statement in statements if statement.is_insert and statement.table.name == 'parking_spot']
+    assert len(inserts) == 3
+    assert spot_count(lot_id) == before + count
+    assert db.session.get(LotCounters, lot_id).total_spots == before + count
+
+
+def test_add_spots_below_one_batch(app_ctx, monkeypatch):
+    monkeypatch.setattr(spot_provisioning, 'SPOTS_PER_INSERT', 4)
+    lot_id = first_lot_id()
+    before = spot_count(lot_id)
+    assert spot_provisioning.provision_spots(lot_id, 10) == 10
+    db.session.commit()
+    assert spot_count(lot_id) == before + 10
+
+
+def test_remove_spots_keeps_spots_with_unarchived_bookings(user):
+    lot_id = first_lot_id()
+    spot_ids = [spot.spot_id for spot in ParkingSpot.query.filter_by(lot_id=lot_id).order_by(ParkingSpot.spot_id.desc())]
+    now = datetime.now()
+    # expired but not archived yet on the newest spot, a future booking on the next one
+    for spot_id, start in ((spot_ids[0], now - timedelta(hours=3)), (spot_ids[1], now + timedelta(hours=1))):
+        db.session.add(UserBookings(user_id=user.user_id, spot_id=spot_id, parking_time=start,
+                                    leaving_time=start + timedelta(hours=1), parking_cost=10, vehicle_no='MH01AB1234'))
+    db.session.commit()
+    reconcile_lot_counters(repair=True)
+    db.session.commit()
+
+    assert remove_free_spots(lot_id, 3) == 3
+    db.session.commit()
+
+    left = {spot_id for spot_id, in db.session.query(ParkingSpot.spot_id).filter_by(lot_id=lot_id)}
+    assert {spot_ids[0], spot_ids[1]} <= left
+    assert not left & set(spot_ids[2:5])
+    assert UserBookings.query.count() == 2
+    assert reconcile_lot_counters(repair=False) == []